@@ -0,0 +1,481 @@
+# Copyright© 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Benchmarks of the QiCode compiler.
+
+Each benchmark generates a representative `QiJob` and compiles it into an experiment
+for a QiController. The hardware is replaced by the mocks in `tests/mocks`, so the
+benchmarks run offline. The time spent in each phase of the compilation is measured
+separately:
+
+- ``describe``: Describing the job within the `QiJob` context manager
+- ``resolve``: Resolving the cell properties using the sample
+- ``analyses``: Dataflow analyses inserting memory stores
+  (`replace_variable_assignment_with_store_commands`)
+- ``simulate``: Simulation of the recording order
+- ``build``: Generating the sequencer programs (`ProgramBuilderVisitor`)
+- ``encode``: Encoding the sequencer instructions (`Sequencer.executable`)
+- ``protobuf``: Remaining parts of converting the experiment to its protobuf message
+
+The time of nested phases is only accounted to the innermost phase. In a separate run,
+the peak memory of the whole compilation is determined using `tracemalloc`.
+
+Usage::
+
+    python benchmarks/compile_benchmark.py
+    python benchmarks/compile_benchmark.py --json results.json
+    python benchmarks/compile_benchmark.py --compare results.json
+
+The JSON file contains the median timings of the current version of qiclib. Comparing
+against a file from an earlier version reports the relative change and exits with a
+non-zero status if a benchmark got slower than the given threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tests"))
+
+import mocks
+from mocks import (
+    digital_trigger,
+    pimc,
+    pulse_gen,
+    recording,
+    rfdc,
+    sequencer,
+    servicehub_control,
+    storage,
+    taskrunner,
+    unit_cell,
+)
+
+import qiclib
+import qiclib.code.qi_jobs as qi_jobs
+import qiclib.packages.qiskit.QiGates as gates
+from qiclib import QiController
+from qiclib.code import *
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_types import QiType
+
+PHASES = (
+    "describe",
+    "resolve",
+    "analyses",
+    "simulate",
+    "build",
+    "encode",
+    "protobuf",
+)
+
+Generator = Callable[[int], tuple[QiJob, QiSample]]
+"""Creates the job of a benchmark with the given size together with its sample."""
+
+
+def _sample(cells: int) -> QiSample:
+    sample = QiSample(cells)
+    for cell in range(cells):
+        sample[cell].update(
+            pi=40e-9,
+            manip_frequency=80e6 + cell * 1e6,
+            rec_frequency=60e6,
+            rec_pulse=400e-9,
+            rec_length=400e-9,
+            rec_offset=200e-9,
+            gauss_on_pulse_length=20e-9,
+            rectangular_pulse_length=100e-9,
+            gauss_off_pulse_length=20e-9,
+            pulse_frequency=50e6,
+        )
+    return sample
+
+
+def _readout(cell: QiCell, save_to: str | None = None):
+    PlayReadout(cell, QiPulse(cell["rec_pulse"], frequency=cell["rec_frequency"]))
+    Recording(cell, cell["rec_length"], cell["rec_offset"], save_to=save_to)
+
+
+def nested_for_range(depth: int) -> tuple[QiJob, QiSample]:
+    """Loops nested into each other with integer and amplitude sweeps."""
+    with QiJob() as job:
+        q = QiCells(1)
+        with contextlib.ExitStack() as loops:
+            for level in range(depth):
+                if level % 2:
+                    var = QiIntVariable()
+                    loops.enter_context(ForRange(var, 0, 5))
+                    Wait(q[0], 20e-9)
+                else:
+                    var = QiAmplitudeVariable()
+                    loops.enter_context(ForRange(var, 0, 1, 0.25))
+                    Play(
+                        q[0],
+                        QiPulse(
+                            q[0]["pi"], amplitude=var, frequency=q[0]["manip_frequency"]
+                        ),
+                    )
+        # Outside of the loops to stay below the maximum number of recordings
+        _readout(q[0], "result")
+    return job, _sample(1)
+
+
+def large_parallel(pulses: int) -> tuple[QiJob, QiSample]:
+    """Parallel blocks with many overlapping pulses and waits.
+
+    Only a few different pulse shapes are used, as the number of pulses which can be
+    loaded into a signal generator is limited.
+    """
+    with QiJob() as job:
+        q = QiCells(1)
+        for block in range(4):
+            with Parallel():
+                for pulse in range(pulses):
+                    Play(
+                        q[0],
+                        QiPulse(
+                            24e-9 + 4e-9 * (pulse % 5),
+                            frequency=q[0]["manip_frequency"],
+                        ),
+                    )
+            with Parallel():
+                for pulse in range(pulses):
+                    Wait(q[0], 12e-9 + 4e-9 * ((pulse + block) % 3))
+                    PlayReadout(
+                        q[0],
+                        QiPulse(
+                            16e-9,
+                            amplitude=1 / (pulse % 3 + 1),
+                            frequency=q[0]["rec_frequency"],
+                        ),
+                    )
+        _readout(q[0], "result")
+    return job, _sample(1)
+
+
+def many_cells(cells: int) -> tuple[QiJob, QiSample]:
+    """Independent operations on many cells which are synchronized repeatedly."""
+    with QiJob() as job:
+        q = QiCells(cells)
+        length = QiTimeVariable()
+        with ForRange(length, 0, 200e-9, 20e-9):
+            for cell in q:
+                Play(cell, QiPulse(cell["pi"], frequency=cell["manip_frequency"]))
+                Wait(cell, length)
+            Sync(*q)
+            for cell in q:
+                _readout(cell, "result")
+    return job, _sample(cells)
+
+
+@QiGate
+def _sx_gate(cell: QiCell):
+    Play(
+        cell,
+        QiPulse(
+            40e-9,
+            shape=ShapeLib.gauss,
+            amplitude=0.5,
+            frequency=cell["manip_frequency"],
+        ),
+    )
+
+
+@QiGate
+def _cz_gate(control: QiCell, target: QiCell):
+    Sync(control, target)
+    for cell in (control, target):
+        Play(cell, QiPulse(100e-9, frequency=cell["manip_frequency"]))
+    Sync(control, target)
+
+
+def gate_sequence(gate_count: int) -> tuple[QiJob, QiSample]:
+    """Long random sequences of gates, e.g. from `qiclib.packages.qiskit.QiGates`.
+
+    The pulse based gates in `QiGates` take their length from cell properties, which is
+    only supported for rectangular pulses. They are replaced by gates with fixed length.
+    """
+    rng = random.Random(42)
+    single_qubit = [gates.Z_gate, gates.S_gate, gates.T_gate, _sx_gate]
+    with QiJob() as job:
+        q = QiCells(2)
+        for _ in range(gate_count):
+            choice = rng.random()
+            if choice < 0.15:
+                _cz_gate(q[0], q[1])
+            elif choice < 0.4:
+                # Each angle requires its own pulse, so only a few different are used
+                angle = rng.choice([np.pi / 8, np.pi / 3, 3 * np.pi / 4])
+                gates.Rz_gate(q[rng.randrange(2)], angle)
+            else:
+                rng.choice(single_qubit)(q[rng.randrange(2)])
+        for cell in q:
+            _readout(cell, "result")
+    return job, _sample(2)
+
+
+def array_variables(size: int) -> tuple[QiJob, QiSample]:
+    """Sweeps over large arrays stored in the sequencer memory."""
+    with QiJob() as job:
+        q = QiCells(1)
+        frequencies = QiVariable(
+            type=QiType.ARRAY(element_type=QiType.FREQUENCY, shape=(size,)),
+            value=np.linspace(50e6, 100e6, size).tolist(),
+        )
+        index = QiIntVariable(0)
+        with ForRange(index, 0, size):
+            Play(q[0], QiPulse(q[0]["pi"], frequency=frequencies[index]))
+            _readout(q[0], "result")
+    return job, _sample(1)
+
+
+BENCHMARKS: dict[str, tuple[Generator, int]] = {
+    "nested_for_range": (nested_for_range, 6),
+    "large_parallel": (large_parallel, 60),
+    "many_cells": (many_cells, 16),
+    "gate_sequence": (gate_sequence, 300),
+    "array_variables": (array_variables, 500),
+}
+"""Available benchmarks with their default size."""
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    timings: dict[str, list[float]] = field(
+        default_factory=lambda: {phase: [] for phase in PHASES}
+    )
+    peak_memory: int = 0
+
+    @property
+    def totals(self) -> list[float]:
+        return [sum(values) for values in zip(*self.timings.values())]
+
+    def medians(self) -> dict[str, float]:
+        medians = {
+            phase: statistics.median(values) for phase, values in self.timings.items()
+        }
+        medians["total"] = statistics.median(self.totals)
+        return medians
+
+
+class _PhaseTimer:
+    """Accounts the time spent in a phase, excluding the time of nested phases."""
+
+    def __init__(self):
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self._stack: list[list] = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.times[outer[0]] += now - outer[1]
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.times[name] += now - self._stack.pop()[1]
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+
+def _instrument(timer: _PhaseTimer) -> contextlib.ExitStack:
+    """Patches the compiler so the time spent in each phase is measured."""
+    stack = contextlib.ExitStack()
+    for target, attribute, phase in [
+        (QiJob, "_resolve_properties", "resolve"),
+        (QiJob, "_run_analyses", "analyses"),
+        (QiJob, "_simulate_recordings", "simulate"),
+        (qi_jobs, "build_program", "build"),
+        (Sequencer, "executable", "encode"),
+    ]:
+        stack.enter_context(
+            mock.patch.object(
+                target, attribute, timer.wrap(phase, getattr(target, attribute))
+            )
+        )
+    return stack
+
+
+def _compile(generator: Generator, size: int, controller, timer: _PhaseTimer):
+    with timer.phase("describe"):
+        job, sample = generator(size)
+    with timer.phase("protobuf"):
+        exp = job.create_experiment(controller, sample)
+        exp.to_protobuf()
+
+
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+def run_benchmark(
+    name: str, size: int | None = None, repeat: int = 5
+) -> BenchmarkResult:
+    """Runs a single benchmark.
+
+    :param name: The name of the benchmark, see `BENCHMARKS`.
+    :param size: The size of the generated job, by default the size from `BENCHMARKS`.
+    :param repeat: How often the compilation is timed.
+    :return: The timings of each phase and the peak memory usage.
+    """
+    generator, default_size = BENCHMARKS[name]
+    if size is None:
+        size = default_size
+    result = BenchmarkResult(name, size)
+    controller = QiController("IP")
+
+    # Warm up caches which are independent of the compiled job, e.g. imports
+    _compile(generator, size, controller, _PhaseTimer())
+
+    for _ in range(repeat):
+        timer = _PhaseTimer()
+        with _instrument(timer):
+            _compile(generator, size, controller, timer)
+        for phase, value in timer.times.items():
+            result.timings[phase].append(value)
+
+    tracemalloc.start()
+    try:
+        _compile(generator, size, controller, _PhaseTimer())
+        result.peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result
+
+
+def _print_results(results: list[BenchmarkResult], baseline: dict | None):
+    print("Median time of each phase in ms")
+    header = f"{'benchmark':<24}" + "".join(f"{p:>10}" for p in (*PHASES, "total"))
+    print(header + f"{'peak MiB':>10}" + ("    change" if baseline else ""))
+    for result in results:
+        medians = result.medians()
+        line = f"{f'{result.name}[{result.size}]':<24}"
+        line += "".join(f"{1e3 * medians[p]:>10.2f}" for p in (*PHASES, "total"))
+        line += f"{result.peak_memory / 2**20:>10.2f}"
+        reference = _baseline_total(baseline, result)
+        if reference:
+            line += f"{medians['total'] / reference - 1:>+10.1%}"
+        print(line)
+
+
+def _baseline_total(baseline: dict | None, result: BenchmarkResult) -> float | None:
+    if baseline is None:
+        return None
+    entry = baseline["benchmarks"].get(result.name)
+    if entry is None or entry["size"] != result.size:
+        return None
+    return entry["timings"]["total"]
+
+
+def to_json(results: list[BenchmarkResult]) -> dict:
+    """Returns the results in the format used for comparisons between versions."""
+    return {
+        "qiclib": qiclib.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {
+            result.name: {
+                "size": result.size,
+                "timings": result.medians(),
+                "peak_memory": result.peak_memory,
+            }
+            for result in results
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument("--size", type=int, help="size of the generated jobs")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions")
+    parser.add_argument("--json", type=Path, help="store the results in this file")
+    parser.add_argument("--compare", type=Path, help="results of an earlier version")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown which is reported as regression (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - BENCHMARKS.keys()
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    results = [
+        run_benchmark(name, args.size, args.repeat)
+        for name in args.benchmarks or BENCHMARKS
+    ]
+    _print_results(results, baseline)
+
+    if args.json:
+        args.json.write_text(json.dumps(to_json(results), indent=2))
+
+    regressions = [
+        result.name
+        for result in results
+        if (reference := _baseline_total(baseline, result))
+        and result.medians()["total"] > reference * (1 + args.threshold)
+    ]
+    if regressions:
+        print(f"Regressions compared to {args.compare}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -36,6 +36,15 @@ from qiclib._version import __version__, __version_tuple__
 from qiclib.experiment import collection as exp
 from qiclib.experiment.qicode import collection as jobs
 from qiclib.experiment.qicode import init_readout as init
+from qiclib.hardware.async_controller import AsyncQiController
 from qiclib.hardware.controller import QiController
 
-__all__ = ["QiController", "__version__", "__version_tuple__", "exp", "init", "jobs"]
+__all__ = [
+    "AsyncQiController",
+    "QiController",
+    "__version__",
+    "__version_tuple__",
+    "exp",
+    "init",
+    "jobs",
+]
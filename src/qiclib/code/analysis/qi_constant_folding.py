@@ -0,0 +1,436 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module contains a constant propagation and folding pass over the commands of a QiJob.
+
+Calculations whose operands are known at compile time would otherwise be computed by the
+sequencer at run time, each costing at least one instruction (see `Sequencer.add_qi_calc`).
+
+The entry point is `fold_constants`. It performs the following steps:
+
+1. For every program point (_CFGNode), determine which variables hold a value known at
+   compile time, represented by a FlatLatticeValue for each variable.
+   (see ConstantPropagationAnalysis)
+
+2. Replace calculations within the value of Assign commands, the length of Wait commands and
+   the operands of If conditions by the constant they evaluate to, given the variable values
+   before the command.
+
+Only anonymous, non-static and non-array variables are propagated. Named variables can be
+initialized externally, static variables and arrays live in the memory of the sequencer.
+QiCellProperty values are never folded, so programs can still be patched when only the
+sample changes (see `QiJob._patch_compiled`).
+
+The folding is done on the integer representation the sequencer computes with, so the folded
+constant is exactly the value the sequencer would have calculated.
+Recording offsets and pulse parameters are left untouched, as they are inserted into the
+recording module by `qi_insert_mem_parameters` based on their physical values.
+"""
+
+from __future__ import annotations
+
+import operator
+from copy import copy
+from dataclasses import dataclass
+
+from qiclib.code.qi_command import (
+    AssignCommand,
+    IfCommand,
+    RecordingCommand,
+    WaitCommand,
+)
+from qiclib.code.qi_dataflow import (
+    _CFG,
+    DataflowValue,
+    DataflowVisitor,
+    FlatLatticeValue,
+    _CFGNode,
+    forward_dataflow,
+)
+from qiclib.code.qi_jobs import QiCommand, QiJob
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_types import QiType
+from qiclib.code.qi_var_definitions import (
+    QiCondition,
+    QiExpression,
+    QiOp,
+    _QiCalcBase,
+    _QiConstValue,
+    _QiFoldedValue,
+    _QiStaticVariable,
+    _QiVariableBase,
+)
+from qiclib.code.qi_visitor import QiCommandVisitor
+
+_ANALYSIS_NAME = "constants"
+
+_FOLDABLE_TYPES = (
+    QiType.NORMAL,
+    QiType.TIME,
+    QiType.FREQUENCY,
+    QiType.PHASE,
+    QiType.AMPLITUDE,
+)
+
+_OPERATIONS = {
+    QiOp.PLUS: operator.add,
+    QiOp.MINUS: operator.sub,
+    QiOp.MULT: operator.mul,
+    QiOp.AND: operator.and_,
+    QiOp.OR: operator.or_,
+    QiOp.XOR: operator.xor,
+    QiOp.LSH: operator.lshift,
+    QiOp.RSH: operator.rshift,
+}
+
+
+@dataclass
+class ConstantFoldingStatistics:
+    """Summary of the changes made by `fold_constants`."""
+
+    folded_expressions: int = 0
+    """Number of expressions that were replaced."""
+    saved_instructions: int = 0
+    """Lower bound for the number of sequencer instructions saved."""
+    saved_cycles: int = 0
+    """Lower bound for the number of sequencer cycles saved."""
+
+
+class VariableValues(DataflowValue):
+    """DataflowValue which holds a FlatLatticeValue for every variable."""
+
+    def __init__(self, values: dict[int, FlatLatticeValue] | None = None):
+        # Variables overload the comparison operators, so they are keyed by their id.
+        self.values: dict[int, FlatLatticeValue] = copy(values or {})
+
+    def merge(self, other):
+        assert isinstance(other, VariableValues)
+
+        result = VariableValues(self.values)
+
+        for var_id, value in other.values.items():
+            if var_id in result.values:
+                result.values[var_id] = result.values[var_id].merge(value)
+            else:
+                result.values[var_id] = value
+
+        return result
+
+    def set_variable_value(self, var: _QiVariableBase, value: FlatLatticeValue):
+        result = copy(self)
+        result.values[var.id] = value
+        return result
+
+    def invalidate_variables(self, variables):
+        result = copy(self)
+        for var in variables:
+            result.values[var.id] = FlatLatticeValue.no_const()
+        return result
+
+    def invalidate_all(self):
+        result = copy(self)
+        for var_id in result.values:
+            result.values[var_id] = FlatLatticeValue.no_const()
+        return result
+
+    def __copy__(self):
+        return VariableValues(self.values)
+
+    def __getitem__(self, var: _QiVariableBase) -> FlatLatticeValue:
+        return self.values.get(var.id, FlatLatticeValue.undefined())
+
+    def __eq__(self, other):
+        if not isinstance(other, VariableValues):
+            return False
+
+        for var_id in self.values.keys() | other.values.keys():
+            value = self.values.get(var_id, FlatLatticeValue.undefined())
+            other_value = other.values.get(var_id, FlatLatticeValue.undefined())
+            if value != other_value:
+                return False
+
+        return True
+
+
+def _is_propagated(var: _QiVariableBase) -> bool:
+    return (
+        not isinstance(var, _QiStaticVariable)
+        and var.name is None
+        and var.type in _FOLDABLE_TYPES
+    )
+
+
+def _evaluate(
+    calc: _QiCalcBase, val1: QiExpression, val2: QiExpression | None
+) -> _QiFoldedValue | None:
+    """Calculates `calc` with the already folded operands, if they are constant."""
+    if calc.type not in _FOLDABLE_TYPES:
+        return None
+
+    if not isinstance(val1, _QiConstValue) or not isinstance(val1.value, int):
+        return None
+
+    if calc.op == QiOp.NOT:
+        result = ~val1.value
+    else:
+        if not isinstance(val2, _QiConstValue) or not isinstance(val2.value, int):
+            return None
+
+        if calc.op in (QiOp.LSH, QiOp.RSH) and not 0 <= val2.value < 32:
+            return None
+
+        result = _OPERATIONS[calc.op](val1.value, val2.value)
+
+    # The sequencer computes with 32 bit registers, leave overflows to it.
+    if not -(2**31) <= result < 2**31:
+        return None
+
+    return _QiFoldedValue(result, calc.type)
+
+
+class _ExpressionFolder:
+    """Folds expressions given the values of variables at a program point."""
+
+    def __init__(self, values: VariableValues):
+        self.values = values
+        # Operations of the calculations which were removed by folding.
+        self.removed_operations: list[QiOp] = []
+
+    def fold(self, expr, replace_variables=False):
+        """
+        Returns the folded expression, or `expr` itself if nothing changed.
+
+        Variables are only replaced by their value if `replace_variables` is set or they are
+        part of a calculation that can be folded. On their own, variables are already in a
+        register, while a constant might need an additional instruction to be loaded.
+        """
+        if isinstance(expr, _QiVariableBase):
+            value = self.values[expr]
+            if replace_variables and value.type == FlatLatticeValue.Type.VALUE:
+                return value.value
+            return expr
+        elif isinstance(expr, _QiCalcBase):
+            return self._fold_calc(expr)
+        else:
+            return expr
+
+    def _fold_calc(self, calc: _QiCalcBase):
+        val1 = self.fold(calc.val1, replace_variables=True)
+        val2 = (
+            None if calc.val2 is None else self.fold(calc.val2, replace_variables=True)
+        )
+
+        result = _evaluate(calc, val1, val2)
+        if result is not None:
+            self.removed_operations.append(calc.op)
+            return result
+
+        # Keep variables as operands, see `fold`.
+        if not isinstance(calc.val1, _QiCalcBase):
+            val1 = calc.val1
+        if not isinstance(calc.val2, _QiCalcBase):
+            val2 = calc.val2
+
+        if val1 is calc.val1 and val2 is calc.val2:
+            return calc
+
+        return _QiCalcBase(val1, calc.op, val2)
+
+
+class _DefinedVariablesVisitor(QiCommandVisitor):
+    """Collects the variables which might be changed by the visited commands."""
+
+    def __init__(self):
+        self.variables: list[_QiVariableBase] = []
+
+    def visit_context_manager(self, context_manager, *args, **kwargs):
+        for command in context_manager.body:
+            command.accept(self)
+
+    def visit_if(self, if_cm, *args, **kwargs):
+        for command in if_cm.body:
+            command.accept(self)
+
+        for command in if_cm._else_body:
+            command.accept(self)
+
+    def visit_parallel(self, parallel_cm, *args, **kwargs):
+        for command in parallel_cm.body:
+            command.accept(self)
+
+        for entry in parallel_cm.entries:
+            for command in entry:
+                command.accept(self)
+
+    def visit_for_range(self, for_range_cm, *args, **kwargs):
+        self.variables.append(for_range_cm.var)
+        self.visit_context_manager(for_range_cm)
+
+    def visit_cell_command(self, cell_cmd, *args, **kwargs):
+        if isinstance(cell_cmd, RecordingCommand) and cell_cmd.var is not None:
+            self.variables.append(cell_cmd.var)
+
+    def visit_variable_command(self, variable_cmd, *args, **kwargs):
+        self.variables.append(variable_cmd.var)
+
+
+def _defined_variables(command: QiCommand) -> list[_QiVariableBase]:
+    visitor = _DefinedVariablesVisitor()
+    command.accept(visitor)
+    return visitor.variables
+
+
+class ConstantPropagationAnalysis(DataflowVisitor):
+    """Determines which variables hold a value known at compile time after every node."""
+
+    def visit_cell_command(self, cell_cmd, values: VariableValues, node):
+        if isinstance(cell_cmd, RecordingCommand) and cell_cmd.var is not None:
+            return values.invalidate_variables([cell_cmd.var])
+        return values
+
+    def visit_parallel(self, parallel_cm, values: VariableValues, node):
+        return values.invalidate_variables(_defined_variables(parallel_cm))
+
+    def visit_for_range(self, for_range_cm, values: VariableValues, node):
+        return values.invalidate_variables([for_range_cm.var])
+
+    def visit_while(self, while_cm, values: VariableValues, node):
+        # The body of while loops is not part of the CFG.
+        return values.invalidate_variables(_defined_variables(while_cm))
+
+    def visit_assign_command(self, assign_cmd, values: VariableValues, node):
+        var = assign_cmd.var
+        value = _ExpressionFolder(values).fold(assign_cmd.value, replace_variables=True)
+
+        if _is_propagated(var) and isinstance(value, _QiConstValue):
+            return values.set_variable_value(var, FlatLatticeValue.of_value(value))
+        return values.invalidate_variables([var])
+
+    def visit_declare_command(self, declare_cmd, values: VariableValues, node):
+        # Registers are not cleared, so declared variables hold an arbitrary value.
+        return values.invalidate_variables([declare_cmd.var])
+
+    def visit_asm_command(self, asm_command, values: VariableValues, node):
+        return values.invalidate_all()
+
+    def visit_mem_store_command(self, store_cmd, values: VariableValues, node):
+        return values
+
+
+class _ConstantFoldingVisitor(QiCommandVisitor):
+    """Replaces expressions by the constants they evaluate to."""
+
+    def __init__(self, cfg: _CFG, statistics: ConstantFoldingStatistics):
+        self.nodes: dict[int, _CFGNode] = {
+            id(node.command): node
+            for node in cfg.nodes
+            if node.type == _CFGNode.Type.COMMAND
+        }
+        self.statistics = statistics
+
+    def _folder(self, command: QiCommand) -> _ExpressionFolder:
+        """Returns a folder for the variable values right before `command` is executed."""
+        node = self.nodes.get(id(command))
+        values = VariableValues()
+
+        # Commands within while loops and parallel blocks are not part of the CFG,
+        # we can still fold calculations only consisting of constants.
+        if node is not None:
+            preds = list(node.predecessors)
+            if len(preds) != 0:
+                values = preds[0].node.value_map[_ANALYSIS_NAME]
+                for pred in preds[1:]:
+                    values = values.merge(pred.node.value_map[_ANALYSIS_NAME])
+
+        return _ExpressionFolder(values)
+
+    def _record(self, folder: _ExpressionFolder):
+        self.statistics.folded_expressions += 1
+        for op in folder.removed_operations:
+            self.statistics.saved_instructions += 1
+            self.statistics.saved_cycles += (
+                Sequencer.MULTIPLICATION_LENGTH if op == QiOp.MULT else 1
+            )
+
+    def visit_context_manager(self, context_manager, *args, **kwargs):
+        for command in context_manager.body:
+            command.accept(self)
+
+    def visit_if(self, if_cm: IfCommand, *args, **kwargs):
+        folder = self._folder(if_cm)
+        condition = if_cm.condition
+        val1 = folder.fold(condition.val1)
+        val2 = folder.fold(condition.val2)
+
+        if val1 is not condition.val1 or val2 is not condition.val2:
+            if_cm.condition = QiCondition(val1, condition.op, val2)
+            self._record(folder)
+
+        for command in if_cm.body:
+            command.accept(self)
+
+        for command in if_cm._else_body:
+            command.accept(self)
+
+    def visit_parallel(self, parallel_cm, *args, **kwargs):
+        # Parallel blocks need to know which commands use variables to schedule them.
+        pass
+
+    def visit_cell_command(self, cell_cmd, *args, **kwargs):
+        if isinstance(cell_cmd, WaitCommand) and isinstance(
+            cell_cmd._length, QiExpression
+        ):
+            folder = self._folder(cell_cmd)
+            length = folder.fold(cell_cmd._length, replace_variables=True)
+
+            if length is not cell_cmd._length:
+                cell_cmd._length = length
+                self._record(folder)
+
+    def visit_assign_command(self, assign_cmd: AssignCommand, *args, **kwargs):
+        folder = self._folder(assign_cmd)
+        value = folder.fold(assign_cmd.value)
+
+        if value is not assign_cmd.value:
+            assign_cmd._value = value
+            self._record(folder)
+
+
+def fold_constants(job: QiJob) -> ConstantFoldingStatistics:
+    """
+    Replaces expressions in the commands of `job` which are known at compile time by constants.
+    Returns statistics about the replaced expressions.
+    """
+    statistics = ConstantFoldingStatistics()
+
+    if len(job.commands) == 0:
+        return statistics
+
+    cfg = _CFG(job)
+
+    forward_dataflow(
+        cfg,
+        _ANALYSIS_NAME,
+        ConstantPropagationAnalysis(),
+        VariableValues(),
+    )
+
+    visitor = _ConstantFoldingVisitor(cfg, statistics)
+    for command in job.commands:
+        command.accept(visitor)
+
+    return statistics
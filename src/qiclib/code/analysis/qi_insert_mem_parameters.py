@@ -27,8 +27,9 @@ increasing performance overhead unnecessarily.
 The following is a description of the used algorithm, specialized for the recording offset
 memory parameter part of the RecordingCommand command, but generalizes to the other memory parameters.
 
-The entry point of the algorithm is in `insert_recording_offset_store_commands`.
-It performs roughly the following steps:
+The entry point of the algorithm is in `replace_variable_assignment_with_store_commands`.
+All memory parameters are analysed on a single CFG of the job. For each of them it performs
+roughly the following steps:
 
 1. For every program point (_CFGNode), determine the next offset needed by a Recording
    instruction, represented by a FlatLatticeValue for each cell.
@@ -93,6 +94,7 @@ Notes:
 
 from __future__ import annotations
 
+from collections.abc import Sequence
 from copy import copy
 
 from qiclib.code.qi_command import (
@@ -637,32 +639,32 @@ class InsertMemoryParameterConfiguration:
         setattr(cell, self.initial_cell_attr_name, value)
 
 
-def _insert_memory_parameter_store_commands(
-    job: QiJob, configuration: InsertMemoryParameterConfiguration
+def _collect_memory_parameter_store_commands(
+    job: QiJob,
+    cfg: _CFG,
+    configuration: InsertMemoryParameterConfiguration,
+    analysis_suffix: str,
+    command_insertions: dict[int, tuple[list, list]],
 ):
     """
-    Inserts MemStoreCommand commands into the QiJob needed for a memory parameter.
+    Runs the anticipated and available analyses of a memory parameter on `cfg` and
+    collects the MemStoreCommand commands needed for it in `command_insertions`.
 
-    'get_memory_param' is a function which extracts a memory parameter from a QiCellCommand, if it exists.
-    (see '_get_recording_offset' for an example)
-
-    'if_memory_param_is_constant' is called if the memory parameter of a cell is constant.
-    This can be used to ellide store instructions altogether and simply initialize the value correctly.
+    The results are stored under analysis names ending in `analysis_suffix`, so
+    several memory parameters can be analysed on the same CFG.
     """
-
-    cfg = _CFG(job)
-
-    _add_pseudo_store_instructions(cfg, configuration)
+    anticipated = f"anticipated{analysis_suffix}"
+    available = f"available{analysis_suffix}"
 
     # Figures out what memory parameter values are anticipated before every node.
     reverse_dataflow(
         cfg,
-        "anticipated",
+        anticipated,
         configuration.anticipated_analysis(configuration),
         CellValues(),
     )
 
-    cfg.start.value_map["available"] = CellValues.default(
+    cfg.start.value_map[available] = CellValues.default(
         job.cells, FlatLatticeValue.no_const()
     )
 
@@ -670,19 +672,16 @@ def _insert_memory_parameter_store_commands(
     # anticipated values are loaded as early as possible.
     forward_dataflow(
         cfg,
-        "available",
-        configuration.available_analysis("anticipated"),
+        available,
+        configuration.available_analysis(anticipated),
         CellValues(),
     )
 
-    # Find locations in job.commands where to insert which MemStoreCommand commands.
-    command_insertions: dict[int, tuple[list, list]] = {}
-
     for cell in job.cells:
         if _has_cell_constant_recording_offset(job, cell, configuration):
             # Anticipated value is the only (constant) value used for this memory parameter for this cell.
             mem_param = (
-                cfg.start.value_map["anticipated"][cell] or FlatLatticeValue.undefined()
+                cfg.start.value_map[anticipated][cell] or FlatLatticeValue.undefined()
             )
             if mem_param.type == FlatLatticeValue.Type.VALUE:
                 mem_param = mem_param.value
@@ -696,13 +695,13 @@ def _insert_memory_parameter_store_commands(
             continue
 
         for node in cfg.node_iterator():
-            if cell not in node.value_map["anticipated"].values:
+            if cell not in node.value_map[anticipated].values:
                 continue
 
-            antic_value = node.value_map["anticipated"][cell]
+            antic_value = node.value_map[anticipated][cell]
 
             for pred in node.predecessors:
-                avail_value = pred.node.value_map["available"][cell]
+                avail_value = pred.node.value_map[available][cell]
 
                 # Is a specific value anticipated and not currently available
                 #   => load value to make it available
@@ -723,8 +722,41 @@ def _insert_memory_parameter_store_commands(
                     lists[0].append((idx, command))
                     command_insertions[id(instruction_list)] = lists
 
+
+def _insert_memory_parameter_store_commands(
+    job: QiJob, configurations: Sequence[InsertMemoryParameterConfiguration]
+):
+    """
+    Inserts MemStoreCommand commands into the QiJob needed for the given memory parameters.
+
+    'get_memory_param' is a function which extracts a memory parameter from a QiCellCommand, if it exists.
+    (see '_get_recording_offset' for an example)
+
+    'if_memory_param_is_constant' is called if the memory parameter of a cell is constant.
+    This can be used to ellide store instructions altogether and simply initialize the value correctly.
+
+    The CFG is only built once and shared by all memory parameters. This is possible because
+    the analyses of one memory parameter pass over the (pseudo) store commands of the other ones,
+    and the insertions are only applied to the QiJob after every memory parameter was analysed.
+    """
+
+    cfg = _CFG(job)
+
+    for configuration in configurations:
+        _add_pseudo_store_instructions(cfg, configuration)
+
+    # Find locations in job.commands where to insert which MemStoreCommand commands.
+    command_insertions: dict[int, tuple[list, list]] = {}
+
+    for index, configuration in enumerate(configurations):
+        _collect_memory_parameter_store_commands(
+            job, cfg, configuration, f"_{index}", command_insertions
+        )
+
     # Insert collected MemStoreCommand commands in the descending index order.
     # Otherwise, we would invalidate higher indices.
+    # Commands for the same index are inserted in the order they were collected, so the
+    # stores of later memory parameters end up in front of the ones of earlier parameters.
     for _, data in command_insertions.items():
         insertions, instruction_list = data
 
@@ -889,8 +921,4 @@ def replace_variable_assignment_with_store_commands(job: QiJob):
             transform=lambda ampl: ampl | (ampl << 16),
         ),
     )
-    for config in configs:
-        _insert_memory_parameter_store_commands(
-            job,
-            config,
-        )
+    _insert_memory_parameter_store_commands(job, configs)
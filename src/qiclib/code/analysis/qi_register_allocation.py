@@ -0,0 +1,473 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+This module contains the register allocation for the variables of a QiJob.
+
+Without it, every variable occupies one of the `Sequencer.AVAILABLE_REGISTERS` registers from its
+declaration until the end of the program, so jobs with many variables fail to compile.
+
+The entry point is `allocate_registers`. It performs the following steps:
+
+1. Number the commands in program order and compute the live interval of every variable, from its
+   first to its last use. Variables used within a loop they were declared before stay live until the
+   end of the loop. Also estimate the number of temporary registers the commands of every cell need,
+   once with every variable in a register and once with every variable spilled.
+   (see _LiveIntervalVisitor)
+
+2. For every cell whose variables do not fit into the registers left for temporary values, run a
+   linear scan over the intervals, reserving the temporaries needed if variables are spilled (at least
+   `TEMPORARY_REGISTERS`). If more variables are live at the same time than registers are
+   available, the variable with the lowest spill cost is kept in the memory of the sequencer
+   (see `Sequencer.MEMORY_ADDRESS`) instead. The spill cost is the number of uses, weighted by
+   the loop nesting depth, so variables used in hot loops are spilled last.
+
+The ProgramBuilderVisitor then releases the register of a variable after the command containing its
+last use (see `RegisterAllocation.last_used_by`), so variables whose intervals do not overlap share
+registers. The temporaries of an If condition are released once its branch is built. Cells whose
+variables fit into the registers are built exactly as before.
+
+Named variables can be read and written by the host, so they are live until the end of the program
+and never spilled. Only variables whose uses are all evaluated by an expression (Assign, If
+conditions and memory stores) are spilled, all other uses need the value in a register for the
+whole duration of the command, e.g. as loop counter or as length of a Wait.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from qiclib.code.qi_command import (
+    AssignCommand,
+    DeclareCommand,
+    ForRangeCommand,
+    IfCommand,
+    MemStoreCommand,
+    ParallelCommand,
+    RecordingCommand,
+    WhileCommand,
+)
+from qiclib.code.qi_jobs import QiCell, QiCommand
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_types import QiArrayType
+from qiclib.code.qi_var_definitions import (
+    QiExpression,
+    QiIndexed,
+    QiVariableSet,
+    _QiCalcBase,
+    _QiStaticVariable,
+    _QiVariableBase,
+)
+from qiclib.code.qi_visitor import QiCommandVisitor
+
+TEMPORARY_REGISTERS = 6
+"""Minimal number of registers left for the evaluation of expressions when variables are spilled."""
+
+_LOOP_HEAD_REGISTERS = 2
+"""Registers the head of a loop may hold while its body is built, e.g. the end value of a ForRange."""
+
+_LOOP_WEIGHT = 10
+"""Estimated number of iterations of a loop, by which uses within it are weighted."""
+
+
+@dataclass(eq=False)  # Variables overload the comparison operators
+class LiveInterval:
+    """Positions of the commands between the first and last use of a variable."""
+
+    var: _QiVariableBase
+    start: int
+    end: int
+    spill_cost: int = 0
+    """Number of uses, uses within loops weighted by `_LOOP_WEIGHT` per nesting level."""
+    spillable: bool = True
+    """Whether all uses of the variable can load it from memory."""
+
+
+@dataclass
+class RegisterAllocation:
+    """Register allocation of the variables of one cell."""
+
+    intervals: list[LiveInterval]
+    reserved: int = TEMPORARY_REGISTERS
+    """Registers left for temporary values, estimated from the command needing the most."""
+    spilled: list[_QiVariableBase] = field(default_factory=list)
+    """Variables kept in memory instead of a register."""
+    _last_uses: dict[int, list[_QiVariableBase]] = field(default_factory=dict)
+
+    def last_used_by(self, command: QiCommand) -> list[_QiVariableBase]:
+        """Returns the variables whose registers can be released after `command` was built."""
+        return self._last_uses.get(id(command), [])
+
+
+def _is_register_variable(var: _QiVariableBase) -> bool:
+    """Static variables and arrays always live in the memory of the sequencer."""
+    return not isinstance(var, _QiStaticVariable) and not isinstance(
+        var.type, QiArrayType
+    )
+
+
+def _variables(value) -> list[_QiVariableBase]:
+    if isinstance(value, QiExpression):
+        return list(value.contained_variables)
+    return []
+
+
+def _registers(values, spilled: bool) -> tuple[int, int]:
+    """Estimates the registers needed to evaluate values one after another.
+
+    Returns the maximal number of registers used at the same time and the number of registers still held
+    afterwards. Memory variables are loaded to a temporary register using a second one for the address,
+    both are only released after the command. If spilled is True, all variables are assumed to be in memory.
+    """
+    peak, held = 0, 0
+    for value in values:
+        if isinstance(value, _QiVariableBase):
+            loaded = spilled or not _is_register_variable(value)
+            value_peak = value_held = 2 if loaded else 0
+        elif isinstance(value, _QiCalcBase):
+            operands_peak, operands_held = _registers((value.val1, value.val2), spilled)
+            # The result and a register for immediates which do not fit into the instruction
+            value_peak = max(operands_peak, operands_held + 2)
+            value_held = operands_held + 1
+        elif isinstance(value, QiIndexed):
+            index_peak, index_held = _registers((value.index,), spilled)
+            # The address and the loaded element
+            value_peak = max(index_peak, index_held + 2)
+            value_held = index_held + 2
+        else:
+            # Constants might need to be loaded to a register
+            value_peak, value_held = 1, 1
+        peak = max(peak, held + value_peak)
+        held += value_held
+    return peak, held
+
+
+@dataclass(frozen=True)
+class _Temporaries:
+    """Estimated number of registers needed besides the registers of the variables."""
+
+    stack: int = 0
+    """If every variable has its own register, as without a register allocation."""
+    spilled: int = 0
+    """If every variable is kept in memory."""
+
+    def __add__(self, other: _Temporaries) -> _Temporaries:
+        return _Temporaries(self.stack + other.stack, self.spilled + other.spilled)
+
+
+def _evaluation(*values) -> tuple[_Temporaries, _Temporaries]:
+    """Returns the registers needed to evaluate values and the registers held afterwards, see `_registers`."""
+    stack_peak, stack_held = _registers(values, spilled=False)
+    spilled_peak, spilled_held = _registers(values, spilled=True)
+    return (
+        _Temporaries(stack_peak, spilled_peak),
+        _Temporaries(stack_held, spilled_held),
+    )
+
+
+def _store(value) -> _Temporaries:
+    """Returns the registers needed to write value to a variable or to memory."""
+    peak, held = _evaluation(value)
+    # The value and the address it is stored to
+    return _Temporaries(
+        max(peak.stack, held.stack + 2), max(peak.spilled, held.spilled + 2)
+    )
+
+
+_LOOP_HEAD = _Temporaries(_LOOP_HEAD_REGISTERS, _LOOP_HEAD_REGISTERS)
+
+
+class _LiveIntervalVisitor(QiCommandVisitor):
+    """Numbers the commands in program order and collects the live interval of every variable.
+
+    Simple commands occupy one position, context managers one position before and one after their body.
+    Variables used by the head of a context manager are used at both positions.
+
+    Additionally, the maximal number of temporary registers any command of a cell needs is estimated, including
+    the registers held by the heads of enclosing loops.
+    """
+
+    def __init__(self) -> None:
+        self.position = 0
+        self.loop_depth = 0
+        self.intervals: dict[int, LiveInterval] = {}
+        self.temporaries: dict[QiCell, _Temporaries] = {}
+        # Registers held by the heads of the loops around the current command
+        self.held = _Temporaries()
+        # Last position of every command, keyed by the id of the command
+        self.exits: dict[int, int] = {}
+        self.loops: list[tuple[int, int]] = []
+
+    def _next_position(self) -> int:
+        position = self.position
+        self.position += 1
+        return position
+
+    def _use(self, variables, position: int, spillable: bool = False):
+        used = QiVariableSet()
+        used.update(variables)
+        for var in used:
+            if not _is_register_variable(var):
+                continue
+
+            interval = self.intervals.get(var.id)
+            if interval is None:
+                interval = LiveInterval(var, position, position)
+                self.intervals[var.id] = interval
+            interval.start = min(interval.start, position)
+            interval.end = max(interval.end, position)
+            interval.spill_cost += _LOOP_WEIGHT**self.loop_depth
+            interval.spillable = interval.spillable and spillable
+
+    def _need(self, command: QiCommand, temporaries: _Temporaries):
+        needed = self.held + temporaries
+        for cell in command._relevant_cells:
+            current = self.temporaries.get(cell, _Temporaries())
+            self.temporaries[cell] = _Temporaries(
+                max(current.stack, needed.stack), max(current.spilled, needed.spilled)
+            )
+
+    def _visit_block(
+        self,
+        command: QiCommand,
+        variables,
+        bodies,
+        spillable=False,
+        loop=False,
+        temporaries=_Temporaries(),
+        held=_Temporaries(),
+    ):
+        entry = self._next_position()
+        self._use(variables, entry, spillable)
+        self._need(command, temporaries)
+
+        outer_held = self.held
+        self.held += held
+        if loop:
+            self.loop_depth += 1
+        for body in bodies:
+            for cmd in body:
+                cmd.accept(self)
+        if loop:
+            self.loop_depth -= 1
+        self.held = outer_held
+
+        end = self._next_position()
+        self._use(variables, end, spillable)
+        self.exits[id(command)] = end
+        if loop:
+            self.loops.append((entry, end))
+
+    def _visit_simple(
+        self,
+        command: QiCommand,
+        variables,
+        spillable=False,
+        temporaries=_Temporaries(),
+    ):
+        position = self._next_position()
+        self._use(variables, position, spillable)
+        self._need(command, temporaries)
+        self.exits[id(command)] = position
+
+    def _visit_cell_variables(self, command: QiCommand, variables):
+        # Variables of cell commands are never spilled, only variables in memory are loaded
+        memory_variables = [var for var in variables if not _is_register_variable(var)]
+        loads = 2 * len(memory_variables)
+        self._visit_simple(command, variables, temporaries=_Temporaries(loads, loads))
+
+    def visit_cell_command(self, cell_cmd, *args, **kwargs):
+        variables = list(cell_cmd._associated_variable_set)
+        if isinstance(cell_cmd, RecordingCommand):
+            variables += _variables(cell_cmd._offset)
+            if cell_cmd.var is not None:
+                variables.append(cell_cmd.var)
+        self._visit_cell_variables(cell_cmd, variables)
+
+    def visit_context_manager(self, context_manager, *args, **kwargs):
+        self._visit_block(
+            context_manager,
+            context_manager._associated_variable_set,
+            [context_manager.body],
+        )
+
+    def visit_if(self, if_cm: IfCommand, *args, **kwargs):
+        variables = list(if_cm._associated_variable_set)
+        variables += _variables(if_cm.condition)
+        # The temporaries of the condition are released before the bodies are built
+        temporaries, _ = _evaluation(if_cm.condition.val1, if_cm.condition.val2)
+        self._visit_block(
+            if_cm,
+            variables,
+            [if_cm.body, if_cm._else_body],
+            spillable=True,
+            temporaries=temporaries,
+        )
+
+    def visit_for_range(self, for_range_cm: ForRangeCommand, *args, **kwargs):
+        variables = list(for_range_cm._associated_variable_set)
+        variables.append(for_range_cm.var)
+        for value in (for_range_cm.start, for_range_cm.end, for_range_cm.step):
+            variables += _variables(value)
+        temporaries, _ = _evaluation(
+            for_range_cm.start, for_range_cm.end, for_range_cm.step
+        )
+        self._visit_block(
+            for_range_cm,
+            variables,
+            [for_range_cm.body],
+            loop=True,
+            temporaries=temporaries,
+            held=_LOOP_HEAD,
+        )
+
+    def visit_while(self, while_cm: WhileCommand, *args, **kwargs):
+        variables = list(while_cm._associated_variable_set)
+        variables += _variables(while_cm.condition)
+        # The registers of the condition are kept until the end of the loop
+        temporaries, held = _evaluation(
+            while_cm.condition.val1, while_cm.condition.val2
+        )
+        self._visit_block(
+            while_cm,
+            variables,
+            [while_cm.body],
+            loop=True,
+            temporaries=temporaries,
+            held=held,
+        )
+
+    def visit_parallel(self, parallel_cm: ParallelCommand, *args, **kwargs):
+        # The commands of a Parallel block are scheduled together, so it is treated as one command.
+        variables = list(parallel_cm._associated_variable_set)
+        for command in parallel_cm.body:
+            variables += command._associated_variable_set
+        for entry_commands in parallel_cm.entries:
+            for command in entry_commands:
+                variables += command._associated_variable_set
+        self._visit_cell_variables(parallel_cm, variables)
+
+    def visit_assign_command(self, assign_cmd: AssignCommand, *args, **kwargs):
+        variables = [assign_cmd.var, *assign_cmd._associated_variable_set]
+        variables += _variables(assign_cmd.value)
+        self._visit_simple(
+            assign_cmd,
+            variables,
+            spillable=True,
+            temporaries=_store(assign_cmd.value),
+        )
+
+    def visit_declare_command(self, declare_cmd: DeclareCommand, *args, **kwargs):
+        self._visit_simple(declare_cmd, [declare_cmd.var], spillable=True)
+
+    def visit_sync_command(self, sync_cmd, *args, **kwargs):
+        self._visit_simple(sync_cmd, [])
+
+    def visit_asm_command(self, asm_cmd, *args, **kwargs):
+        self._visit_simple(asm_cmd, [])
+
+    def visit_mem_store_command(self, store_cmd: MemStoreCommand, *args, **kwargs):
+        self._visit_simple(
+            store_cmd,
+            _variables(store_cmd.value),
+            spillable=True,
+            temporaries=_store(store_cmd.value),
+        )
+
+    def finish(self) -> list[LiveInterval]:
+        """Extends the intervals over the loops they are used in."""
+        intervals = list(self.intervals.values())
+
+        for interval in intervals:
+            if interval.var.name is not None:
+                # Named variables can be accessed by the host at any time
+                interval.end = self.position
+                interval.spillable = False
+
+        # The value of a variable declared before a loop is needed again in the next iteration
+        for start, end in self.loops:
+            for interval in intervals:
+                if interval.start < start <= interval.end:
+                    interval.end = max(interval.end, end)
+
+        return intervals
+
+
+def _linear_scan(intervals: list[LiveInterval], registers: int) -> list[LiveInterval]:
+    """Returns the intervals to spill, so no more than `registers` intervals overlap."""
+    spilled = []
+    active: list[LiveInterval] = []
+
+    for interval in sorted(intervals, key=lambda i: (i.start, i.end)):
+        active = [other for other in active if other.end >= interval.start]
+        active.append(interval)
+
+        if len(active) > registers:
+            candidates = [other for other in active if other.spillable]
+            if len(candidates) == 0:
+                # Compiling fails with the same error as before if the registers are exhausted
+                continue
+            # Prefer cheap variables, and of those the one blocking its register the longest
+            victim = min(candidates, key=lambda i: (i.spill_cost, -i.end))
+            active.remove(victim)
+            spilled.append(victim)
+
+    return spilled
+
+
+def allocate_registers(
+    commands: list[QiCommand], cells: list[QiCell]
+) -> dict[QiCell, RegisterAllocation]:
+    """Computes the register allocation of all cells which would otherwise run out of registers.
+
+    The variables need to be assigned to their cells already (see `_assign_variables_to_cell`).
+
+    :param commands: the commands of the job
+    :param cells: the cells of the job
+    :return: the register allocation for every cell which needs one
+    """
+    visitor = _LiveIntervalVisitor()
+    for command in commands:
+        command.accept(visitor)
+    intervals = visitor.finish()
+
+    commands_by_exit = {end: command_id for command_id, end in visitor.exits.items()}
+
+    allocations: dict[QiCell, RegisterAllocation] = {}
+    for cell in cells:
+        cell_intervals = [i for i in intervals if cell in i.var._relevant_cells]
+        temporaries = visitor.temporaries.get(cell, _Temporaries())
+        stack_registers = Sequencer.AVAILABLE_REGISTERS - max(
+            TEMPORARY_REGISTERS, temporaries.stack
+        )
+        if len(cell_intervals) <= stack_registers:
+            continue
+
+        # Spilled variables need more temporaries, which are reserved for all commands
+        reserved = max(TEMPORARY_REGISTERS, temporaries.spilled)
+        registers = Sequencer.AVAILABLE_REGISTERS - reserved
+
+        allocation = RegisterAllocation(cell_intervals, reserved)
+        allocation.spilled = [i.var for i in _linear_scan(cell_intervals, registers)]
+
+        for interval in cell_intervals:
+            command_id = commands_by_exit.get(interval.end)
+            if interval.var.name is None and command_id is not None:
+                allocation._last_uses.setdefault(command_id, []).append(interval.var)
+
+        allocations[cell] = allocation
+
+    return allocations
@@ -20,6 +20,7 @@ Classes found herein are usable as API, for example when lowering from a higher-
 
 from __future__ import annotations
 
+import itertools
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Protocol
@@ -791,22 +792,24 @@ class ParallelCommand(QiCommand):
     def _create_time_slots(
         self, annotated_bodies: list[list[CmdTuple]], max_end: int
     ) -> list[ParallelCommand.TimeSlot]:
+        # Commands within one body start one after the other, so sorting the start events (stable, by body)
+        # yields the commands starting at the same cycle in the order of their bodies
+        events = sorted(
+            (
+                (cmd_tuple.start, body_index, cmd_tuple)
+                for body_index, cmd_list in enumerate(annotated_bodies)
+                for cmd_tuple in cmd_list
+                if 0 <= cmd_tuple.start < max_end
+            ),
+            key=lambda event: event[:2],
+        )
+
         time_slots: list[ParallelCommand.TimeSlot] = []
-        for start in range(max_end):
+        for start, group in itertools.groupby(events, key=lambda event: event[0]):
             time_slot = ParallelCommand.TimeSlot([], start, start)
-
-            # find tuples with start time == start
-            for cmd_list in annotated_bodies:
-                for cmd_tuple in cmd_list:
-                    if cmd_tuple.start == start:
-                        time_slot.cmd_tuples.append(cmd_tuple)
-                        time_slot.end = max(cmd_tuple.end, time_slot.end)
-                        cmd_list.remove(cmd_tuple)
-                        break  # next cmd_list
-
-            # next start value, if nothing was found
-            if len(time_slot.cmd_tuples) == 0:
-                continue
+            for _, _, cmd_tuple in group:
+                time_slot.cmd_tuples.append(cmd_tuple)
+                time_slot.end = max(cmd_tuple.end, time_slot.end)
 
             time_slot.cmd_tuples = self._clear_wait_commands(time_slot.cmd_tuples)
             time_slot.cmd_tuples = self._clear_choke_commands(time_slot.cmd_tuples)
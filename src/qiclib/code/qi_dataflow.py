@@ -20,6 +20,8 @@ This module provides basic infrastructure to perform dataflow analyses on qicode
 Dataflow analyses are computed on the control flow graph (CFG) of a QiJob which should be created when necessary.
 
 The dataflow analysis itself is performed in using a standard worklist algorithm.
+Nodes are visited in reverse postorder for forward analyses and in postorder for reverse analyses,
+so most nodes see the final values of their predecessors the first time they are visited.
 
 The abstract domain is modeled using DataflowValue. Its merge function represents the supremum calculation.
 It is recommended to treat DataflowValues as immutable.
@@ -28,6 +30,8 @@ It is recommended to treat DataflowValues as immutable.
 from __future__ import annotations
 
 from abc import abstractmethod
+from collections import deque
+from collections.abc import Callable, Iterable
 from copy import copy
 from dataclasses import dataclass, field, replace
 from enum import Enum
@@ -203,6 +207,30 @@ class _CFG:
                 if successor not in visited:
                     stack.append(successor)
 
+    def postorder(self) -> list[_CFGNode]:
+        """Returns the nodes reachable from the start node in depth-first postorder.
+        Successors are visited in the order of their node ids, so the result is deterministic.
+        """
+        order = []
+        visited = {self.start}
+        stack = [(self.start, _sorted_neighbors(self.start.successors))]
+
+        while len(stack) > 0:
+            node, successors = stack[-1]
+
+            for successor in successors:
+                if successor.node not in visited:
+                    visited.add(successor.node)
+                    stack.append(
+                        (successor.node, _sorted_neighbors(successor.node.successors))
+                    )
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+
+        return order
+
     def add_value(self, key, initial):
         for node in self.node_iterator():
             if key not in node.value_map:
@@ -271,6 +299,10 @@ class _CFG:
             f.write("}")
 
 
+def _sorted_neighbors(neighbors: Iterable[_CFGNode.Neighbor]):
+    return iter(sorted(neighbors, key=lambda neighbor: neighbor.node.id))
+
+
 def recursive_build_sub_cfg(
     commands: list[QiCommand], nodes: set[_CFGNode]
 ) -> tuple[_CFGNode, list[_CFGNode.Neighbor]]:
@@ -418,19 +450,32 @@ class DataflowVisitor:
         return input
 
 
+@dataclass
+class DataflowStatistics:
+    """Information about the convergence of a single dataflow analysis."""
+
+    iterations: int = 0
+    """Number of times a node was taken from the worklist and visited."""
+    updates: int = 0
+    """Number of times the value of a node changed."""
+
+
 def forward_dataflow(
     cfg: _CFG,
     name,
     visitor: DataflowVisitor,
     initial: DataflowValue,
-):
-    dataflow(
+    trace: Callable[[_CFGNode, DataflowValue], None] | None = None,
+) -> DataflowStatistics:
+    return dataflow(
         cfg,
         name,
         visitor,
         initial,
         lambda x: x.predecessors,
         lambda x: x.successors,
+        reversed(cfg.postorder()),
+        trace,
     )
 
 
@@ -439,14 +484,17 @@ def reverse_dataflow(
     name,
     visitor: DataflowVisitor,
     initial: DataflowValue,
-):
-    dataflow(
+    trace: Callable[[_CFGNode, DataflowValue], None] | None = None,
+) -> DataflowStatistics:
+    return dataflow(
         cfg,
         name,
         visitor,
         initial,
         lambda x: x.successors,
         lambda x: x.predecessors,
+        cfg.postorder(),
+        trace,
     )
 
 
@@ -457,16 +505,31 @@ def dataflow(
     initial: DataflowValue,
     predecessors,
     successors,
-):
-    """Implementation of (a fairly naive) worklist algorithm which performs the dataflow analysis,
-    with the given visitor."""
+    order: Iterable[_CFGNode] | None = None,
+    trace: Callable[[_CFGNode, DataflowValue], None] | None = None,
+) -> DataflowStatistics:
+    """Implementation of a worklist algorithm which performs the dataflow analysis,
+    with the given visitor.
+
+    The worklist is initialised with all nodes of the CFG in the given `order` and never
+    contains a node more than once. `trace` is called with the node and its new value
+    every time the value of a node changes.
+    """
+
+    order = [node for node in order or () if node in cfg.nodes]
+    seeded = set(order)
+    order += sorted(cfg.nodes - seeded, key=lambda node: node.id)
 
-    queue = list(cfg.nodes)
+    queue = deque(order)
+    queued = set(order)
+    statistics = DataflowStatistics()
 
     cfg.add_value(name, initial)
 
     while len(queue) != 0:
-        next = queue.pop(0)
+        next = queue.popleft()
+        queued.remove(next)
+        statistics.iterations += 1
 
         preds = list(predecessors(next))
         if len(preds) != 0:
@@ -486,9 +549,17 @@ def dataflow(
 
         if output != original:
             next.value_map[name] = output
+            statistics.updates += 1
+
+            if trace is not None:
+                trace(next, output)
 
             for succ in successors(next):
-                queue.append(succ.node)
+                if succ.node not in queued:
+                    queue.append(succ.node)
+                    queued.add(succ.node)
+
+    return statistics
 
 
 class FlatLatticeValue(DataflowValue):
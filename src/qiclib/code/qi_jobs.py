@@ -22,9 +22,13 @@ Here, all important commands write QiPrograms are defined.
 from __future__ import annotations
 
 import functools
+import hashlib
 import warnings
 from abc import ABC, abstractmethod
-from collections.abc import Callable, Iterable
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Generic, TypeVar
 
 import numpy as np
@@ -49,8 +53,13 @@ from qiclib.code.qi_command import (
     WaitCommand,
     WhileCommand,
 )
-from qiclib.code.qi_prog_builder import build_program, get_all_variables
+from qiclib.code.qi_prog_builder import (
+    build_program,
+    get_all_variables,
+    patch_program,
+)
 from qiclib.code.qi_pulse import QiPulse
+from qiclib.code.qi_recording_order import RecordingOrder
 from qiclib.code.qi_result import QiResult
 from qiclib.code.qi_sample import QiSample
 from qiclib.code.qi_seq_instructions import SequencerInstruction
@@ -79,6 +88,8 @@ from qiclib.hardware.taskrunner import TaskRunner
 from qiclib.hardware.unitcell import DataCollection
 
 if TYPE_CHECKING:
+    from qiclib.code.analysis.qi_constant_folding import ConstantFoldingStatistics
+    from qiclib.code.qi_sequencer import Sequencer
     from qiclib.experiment.qicode.base import QiCodeExperiment
 
 
@@ -118,7 +129,7 @@ class QiCell:
         self.readout_pulses: list[QiPulse] = []
         self._result_container: dict[str, QiResult] = {}
         # The order in which recorded values are assigned to which result container
-        self._result_recording_order: list[QiResult] = []
+        self._result_recording_order: Sequence[QiResult] = []
         self._unresolved_property: set[QiCellProperty] = set()
         if job is None:
             self._job_ref = QiJob.current()
@@ -777,6 +788,75 @@ class SubmittedJob:
         self._process_results(results)
 
 
+@dataclass
+class _CompiledProgram:
+    """Everything produced by :meth:`QiJob._build_program` that is needed to run the job again."""
+
+    cell_seq_dict: dict[QiCell, Sequencer]
+    recording_order: dict[QiCell, Sequence[QiResult]]
+    var_reg_map: dict[_QiVariableBase, dict[QiCell, int]]
+    sequencer_codes: list[list[int]] | None = None
+    initial_memory: list[list[int]] | None = None
+    structure_key: str = ""
+    # How often each (cell, property name) was resolved during compilation and the values used
+    property_reads: Counter[tuple[QiCell, str]] = field(default_factory=Counter)
+    property_values: dict[tuple[QiCell, str], str] = field(default_factory=dict)
+
+
+class _CompileCache:
+    """
+    Least recently used cache of compiled programs of a single :class:`QiJob`.
+
+    Entries are keyed by a hash over the job structure and the resolved sample properties,
+    see :meth:`QiJob._compile_key`.
+
+    :param maxsize: maximum number of programs kept, 0 disables caching
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # Misses served by patching the previous program instead of compiling
+        self.patches = 0
+        self._entries: OrderedDict[str, _CompiledProgram] = OrderedDict()
+
+    def get(self, key: str) -> _CompiledProgram | None:
+        program = self._entries.get(key)
+        if program is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return program
+
+    def put(self, key: str, program: _CompiledProgram):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = program
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+
+    def info(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "patches": self.patches,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class QiJob:
     """
     Container holding program, cells and qi_result containers for execution of program.
@@ -784,26 +864,37 @@ class QiJob:
 
     :param skip_nco_sync: if the NCO synchronization at the beginning should be skipped
     :param nco_sync_length: how long to wait after the nco synchronization
+    :param compile_cache_size: how many compiled programs (for different samples or cell maps)
+        are kept to skip recompilation on subsequent runs, 0 disables the cache
+    :param optimize_program: if the generated sequencer programs should be shortened by a peephole optimization,
+        which keeps their timing (see :meth:`Sequencer.optimize`)
     """
 
     def __init__(
         self,
         skip_nco_sync: bool = False,
         nco_sync_length: int = 0,
+        compile_cache_size: int = 8,
+        optimize_program: bool = False,
     ) -> None:
         self.qi_results: list[QiResult] = []
         self.cells: list[QiCell] = []
         self.couplers: list[QiCoupler] = []
         self.skip_nco_sync = skip_nco_sync
         self.nco_sync_length = nco_sync_length
+        self.optimize_program = optimize_program
 
         self._description = _JobDescription()
 
         # Build
         self._performed_analyses = False
+        # Savings of the constant folding pass, available after the program was built
+        self.constant_folding_statistics: ConstantFoldingStatistics | None = None
         self._build_done = False
         self._arranged_cells: list[QiCell | None] = []
         self._var_reg_map: dict[_QiVariableBase, dict[QiCell, int]] = {}
+        self.compile_cache = _CompileCache(compile_cache_size)
+        self._compiled: _CompiledProgram | None = None
 
         # Run
         self._custom_processing = None
@@ -867,16 +958,18 @@ class QiJob:
         These mutate the commands in QiJob by inserting additional instructions, therefore
         they should only run once, in order to avoid duplicate instructions.
         """
+        from .analysis.qi_constant_folding import fold_constants
         from .analysis.qi_insert_mem_parameters import (
             replace_variable_assignment_with_store_commands,
         )
 
         if not self._performed_analyses:
+            self.constant_folding_statistics = fold_constants(self)
             replace_variable_assignment_with_store_commands(self)
 
         self._performed_analyses = True
 
-    def _simulate_recordings(self) -> dict[Any, list[RecordingCommand]]:
+    def _simulate_recordings(self) -> dict[Any, RecordingOrder[RecordingCommand]]:
         """
         Simulates the order RecordingCommand executions.
         The result of this simulation is used to disentangle the recordings buffer
@@ -892,7 +985,7 @@ class QiJob:
             cmd.accept(visitor)
 
         if len(visitor.found_qi_results) == 0:
-            return {cell: [] for cell in self.cells}
+            return {cell: RecordingOrder([], 0) for cell in self.cells}
         elif visitor.recording_in_if:
             raise RuntimeError("Recording command within If-Else statement.")
 
@@ -925,29 +1018,149 @@ class QiJob:
 
         self._run_analyses()
 
-        sim_result = self._simulate_recordings()
+        structure_key = self._structure_key(cell_map)
+        key = self._compile_key(structure_key)
+        compiled = self.compile_cache.get(key)
+        if compiled is None:
+            compiled = self._patch_compiled(structure_key)
+            if compiled is None:
+                compiled = self._compile(cell_map, structure_key)
+            self.compile_cache.put(key, compiled)
+
         for cell in self.cells:
-            cell._result_recording_order = [
-                x.result_box
-                for x in filter(lambda x: x.result_box is not None, sim_result[cell])
-            ]
+            # Clear results of previous executions, like build_program does
+            cell.reset()
+            cell._result_recording_order = compiled.recording_order[cell]
 
-        self.cell_seq_dict = build_program(
-            self.cells,
-            cell_map,
-            self._description._commands.copy(),
-            self.skip_nco_sync,
-            self.nco_sync_length,
+        self._compiled = compiled
+        self.cell_seq_dict = compiled.cell_seq_dict
+        self._var_reg_map = compiled.var_reg_map
+        self._build_done = True
+
+    def _compile(self, cell_map: list[int], structure_key: str) -> _CompiledProgram:
+        # Trace which properties influence the program, so it can be patched when only their values change
+        property_reads: Counter[tuple[QiCell, str]] = Counter()
+        QiCellProperty._resolve_observer = lambda prop: property_reads.update(
+            [(prop.cell, prop.name)]
+        )
+        try:
+            sim_result = self._simulate_recordings()
+            # The simulation only contains recordings with a result box
+            recording_order = {
+                cell: sim_result[cell].map(lambda x: x.result_box)
+                for cell in self.cells
+            }
+            for cell in self.cells:
+                cell._result_recording_order = recording_order[cell]
+
+            cell_seq_dict = build_program(
+                self.cells,
+                cell_map,
+                self._description._commands.copy(),
+                self.skip_nco_sync,
+                self.nco_sync_length,
+                self.optimize_program,
+            )
+        finally:
+            QiCellProperty._resolve_observer = None
+
+        return _CompiledProgram(
+            cell_seq_dict,
+            recording_order,
+            get_all_variables(cell_seq_dict),
+            structure_key=structure_key,
+            property_reads=property_reads,
+            property_values=self._property_values(),
         )
 
-        self._var_reg_map = get_all_variables(self.cell_seq_dict)
-        self._build_done = True
+    def _patch_compiled(self, structure_key: str) -> _CompiledProgram | None:
+        """
+        Derives the program from the last compiled one if only property values changed that are used
+        as plain immediates, re-encoding just the instructions depending on them.
+        """
+        base = self._compiled
+        if base is None or base.structure_key != structure_key:
+            return None
+
+        values = self._property_values()
+        changed = {
+            key
+            for key in values.keys() | base.property_values.keys()
+            if values.get(key) != base.property_values.get(key)
+        }
+        patched = patch_program(base.cell_seq_dict, base.property_reads, changed)
+        if patched is None:
+            return None
+
+        sequencer_codes = None
+        if base.sequencer_codes is not None:
+            # Only re-emit the patched instruction words
+            sequencer_codes = [list(code) for code in base.sequencer_codes]
+            for code, cell in zip(sequencer_codes, self.cells):
+                for index, instruction in patched[cell][1].items():
+                    code[index] = instruction.get_riscv_instruction()
+
+        self.compile_cache.patches += 1
+        return _CompiledProgram(
+            {cell: sequencer for cell, (sequencer, _) in patched.items()},
+            base.recording_order,
+            base.var_reg_map,
+            sequencer_codes,
+            base.initial_memory,
+            structure_key,
+            base.property_reads,
+            values,
+        )
+
+    def _property_values(self) -> dict[tuple[QiCell, str], str]:
+        return {
+            (cell, str(name)): repr(value)
+            for cell in self.cells
+            for name, value in cell._properties.items()
+        }
+
+    def _structure_key(self, cell_map: list[int]) -> str:
+        """
+        Hashes everything the compiled program depends on apart from the sample properties:
+        the command tree (via its string representation), the cell map, the NCO sync settings
+        and whether the program is optimized.
+        """
+        hasher = hashlib.sha256(str(self).encode())
+        hasher.update(
+            repr(
+                (
+                    list(cell_map),
+                    self.skip_nco_sync,
+                    self.nco_sync_length,
+                    self.optimize_program,
+                )
+            ).encode()
+        )
+        return hasher.hexdigest()
+
+    def _compile_key(self, structure_key: str) -> str:
+        """Extends the structure key by the values of all properties the cells have resolved."""
+        hasher = hashlib.sha256(structure_key.encode())
+        for cell in self.cells:
+            properties = sorted(
+                (str(key), repr(value)) for key, value in cell._properties.items()
+            )
+            hasher.update(repr(properties).encode())
+        return hasher.hexdigest()
 
     def _get_sequencer_codes(self):
-        return [self.cell_seq_dict[cell].executable() for cell in self.cells]
+        if self._compiled.sequencer_codes is None:
+            self._compiled.sequencer_codes = [
+                self.cell_seq_dict[cell].executable() for cell in self.cells
+            ]
+        return self._compiled.sequencer_codes
 
     def _get_initial_memory(self):
-        return [self.cell_seq_dict[cell].static_region for cell in self.cells]
+        if self._compiled.initial_memory is None:
+            self._compiled.initial_memory = [
+                self.cell_seq_dict[cell].static_region for cell in self.cells
+            ]
+        return self._compiled.initial_memory
 
     def create_experiment(
         self,
@@ -1136,11 +1349,133 @@ class QiJob:
         job_id = exp.submit()
         return SubmittedJob(job_id, exp)
 
-    def run_with_data_callback(self, on_new_data: Callable[[dict], None]):
-        pass
+    @staticmethod
+    def submit_many(
+        jobs: Iterable[QiJob],
+        controller,
+        sample: QiSample | None = None,
+        averages: int = 1,
+        cell_map: list[int] | None = None,
+        coupling_map: list[int] | None = None,
+        data_collection=None,
+        max_in_flight: int = 4,
+    ) -> Iterator[QiJob]:
+        """Submits multiple jobs to the QiController and yields each job as soon as
+        its results are available.
 
-    def run_streamed(self):
-        pass
+        Up to `max_in_flight` jobs are queued on the QiController at the same time, so
+        the network round trip of a job overlaps with the execution of the previous
+        ones. The jobs are only compiled shortly before they are submitted. This
+        makes it suitable for workloads consisting of many short jobs, e.g.
+        randomized benchmarking.
+
+        .. warning::
+            This method builds upon :meth:`submit` and shares its experimental state.
+
+        :param jobs: the jobs which should be executed
+        :param controller: the QiController on which the jobs should be executed
+        :param sample: the QiSample object used for execution of pulses and extracts parameters for the experiment
+        :param averages: the number of executions that should be averaged, by default 1
+        :param cell_map: A list containing the indices of the cells
+        :param coupling_map: A list containing the indices of the couplers
+        :param data_collection: the data_collection mode for the result, by default "average"
+        :param max_in_flight: the maximum number of jobs queued at once, by default 4
+        :return: an iterator over the jobs in the order they finished. The results
+            can be accessed as after :meth:`run`, e.g. using :meth:`QiCell.data`.
+        """
+        jobs = list(jobs)
+        experiments: dict[int, QiCodeExperiment] = {}
+
+        def prepared_jobs():
+            for index, job in enumerate(jobs):
+                exp = job.create_experiment(
+                    controller,
+                    sample,
+                    averages,
+                    cell_map,
+                    coupling_map,
+                    data_collection,
+                )
+                experiments[index] = exp
+                yield exp.prepare_submission()
+
+        for index, job_id, results in controller.cell.submit_batch(
+            prepared_jobs(), max_in_flight
+        ):
+            SubmittedJob(job_id, experiments.pop(index))._process_results(results)
+            yield jobs[index]
+
+    def run_with_data_callback(
+        self,
+        on_new_data: Callable[[dict[QiResult, Any]], None],
+        controller,
+        sample: QiSample | None = None,
+        averages: int = 1,
+        cell_map: list[int] | None = None,
+        coupling_map: list[int] | None = None,
+        data_collection: DataCollection | None = None,
+    ) -> Future:
+        """executes the job in a background thread and passes the results to a callback while the job is running
+
+        :param on_new_data: called from the background thread with the data of each chunk, see :meth:`run_streamed`
+        :param controller: the QiController on which the job should be executed
+        :param sample: the QiSample object used for execution of pulses and extracts parameters for the experiment
+        :param averages: the number of executions that should be averaged, by default 1
+        :param cell_map: A list containing the indices of the cells
+        :param coupling_map: A list containing the indices of the couplers
+        :param data_collection: the data_collection mode for the result, one of "iqcloud", "states" and
+            "quantum_jumps", see :meth:`run_streamed`. Other modes, including the default "average", make the
+            returned `Future` raise a NotImplementedError.
+        :return: a `Future` which is done once the job finished and raises any error that occurred.
+        """
+        updates = self.run_streamed(
+            controller, sample, averages, cell_map, coupling_map, data_collection
+        )
+
+        def consume():
+            for update in updates:
+                on_new_data(update)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(consume)
+        executor.shutdown(wait=False)
+        return future
+
+    def run_streamed(
+        self,
+        controller,
+        sample: QiSample | None = None,
+        averages: int = 1,
+        cell_map: list[int] | None = None,
+        coupling_map: list[int] | None = None,
+        data_collection: DataCollection | None = None,
+    ) -> Iterator[dict[QiResult, Any]]:
+        """executes the job and yields the results while the job is running
+
+        Each element maps the `QiResult` objects which received new data to the data of one streamed chunk.
+        In contrast to :meth:`run`, the data is not accumulated in the QiResults of the cells, so the memory does not
+        grow with the number of shots. Streaming is supported for the data collection modes "iqcloud", "states" and
+        "quantum_jumps". For "iqcloud", the data of each chunk has the shape (2, n) for the I and Q values.
+
+        :param controller: the QiController on which the job should be executed
+        :param sample: the QiSample object used for execution of pulses and extracts parameters for the experiment
+        :param averages: the number of executions that should be averaged, by default 1
+        :param cell_map: A list containing the indices of the cells
+        :param coupling_map: A list containing the indices of the couplers
+        :param data_collection: the data_collection mode for the result, one of "iqcloud", "states" and
+            "quantum_jumps". Other modes, including the default "average", can not be streamed and raise a
+            NotImplementedError once the iterator is advanced.
+        :return: an iterator over the data of each chunk. Closing it early stops the execution.
+        """
+        exp = self.create_experiment(
+            controller,
+            sample,
+            averages,
+            cell_map,
+            coupling_map,
+            data_collection,
+        )
+        return exp.stream()
 
     def set_custom_data_processing(
         self,
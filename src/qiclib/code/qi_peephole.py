@@ -0,0 +1,546 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Peephole optimization of the instructions generated by a :class:`~qiclib.code.qi_sequencer.Sequencer`.
+
+The sequencer emits instructions command by command. This leaves consecutive waits, copies of temporary results,
+immediates which are loaded to registers already containing them and repeated loads of the same memory word.
+The optimization runs on the finished program and removes such instructions, fixing the offsets of branches and jumps.
+
+The timing of the program is never changed: while building, cells are implicitly synchronized based on the cycles
+of the generated instructions (see :meth:`ProgramBuilderVisitor.sync_cells`). The cycles of a removed instruction are
+added to an immediate wait of the same basic block instead, which may only be separated from it by register operations,
+as their exact timing is not observable. Instructions for which no such wait exists are kept.
+"""
+
+from __future__ import annotations
+
+import copy
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from qiclib.code.qi_seq_instructions import (
+    SeqAwaitQubitState,
+    SeqBranch,
+    SeqCellRegReceive,
+    SeqCellRegSend,
+    SeqCellSync,
+    SeqEnd,
+    SeqJump,
+    SeqLoad,
+    SeqLoadUpperImm,
+    SeqRegImmediateInst,
+    SeqRegImmFunct3,
+    SeqRegRegFunct7,
+    SeqRegRegInst,
+    SeqStore,
+    SeqTrigger,
+    SeqTriggerWaitRegister,
+    SequencerInstruction,
+    SeqWaitImm,
+    SeqWaitRegister,
+)
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_var_definitions import QiOp
+
+_WAIT_IMM_MAX = 0xFFFFF
+_WORD_MASK = 0xFFFFFFFF
+_ALL_REGISTERS = (1 << (Sequencer.AVAILABLE_REGISTERS + 1)) - 1
+
+_REGISTER_OPERATIONS = (SeqRegImmediateInst, SeqRegRegInst, SeqLoadUpperImm)
+_RETARGETABLE = (*_REGISTER_OPERATIONS, SeqLoad)
+
+
+@dataclass
+class PeepholeStatistics:
+    """Instructions removed by :func:`optimize_instructions`."""
+
+    merged_waits: int = 0
+    removed_moves: int = 0
+    removed_immediates: int = 0
+    removed_loads: int = 0
+    removed_dead_instructions: int = 0
+
+    @property
+    def removed_instructions(self) -> int:
+        return (
+            self.merged_waits
+            + self.removed_moves
+            + self.removed_immediates
+            + self.removed_loads
+            + self.removed_dead_instructions
+        )
+
+
+def _mask(*registers: int) -> int:
+    mask = 0
+    for register in registers:
+        mask |= 1 << register
+    return mask
+
+
+def _uses_and_defs(instruction: SequencerInstruction) -> tuple[int, int] | None:
+    """Returns the registers read and written by instruction as bit masks, or None if they are unknown."""
+    if isinstance(instruction, SeqRegImmediateInst | SeqLoad):
+        uses, defs = _mask(instruction.register), _mask(instruction.dst_reg)
+    elif isinstance(instruction, SeqRegRegInst):
+        uses = _mask(instruction.reg1, instruction.reg2)
+        defs = _mask(instruction.dst_reg)
+    elif isinstance(
+        instruction, SeqLoadUpperImm | SeqAwaitQubitState | SeqCellRegReceive
+    ):
+        uses, defs = 0, _mask(instruction.dst_reg)
+    elif isinstance(instruction, SeqBranch | SeqStore | SeqCellRegSend):
+        uses, defs = _mask(instruction.reg1, instruction.reg2), 0
+    elif isinstance(instruction, SeqWaitRegister | SeqTriggerWaitRegister):
+        uses, defs = _mask(instruction.dst_reg), 0
+    elif isinstance(
+        instruction, SeqWaitImm | SeqTrigger | SeqCellSync | SeqJump | SeqEnd
+    ):
+        uses, defs = 0, 0
+    else:
+        return None
+    # Writes to register 0 have no effect
+    return uses, defs & ~1
+
+
+def _removable_cycles(instruction: SequencerInstruction) -> int | None:
+    """Returns the cycles of instruction if its only effect is writing its destination register, else None."""
+    if isinstance(instruction, SeqRegRegInst):
+        if instruction.funct7 == SeqRegRegFunct7.MUL:
+            return Sequencer.MULTIPLICATION_LENGTH
+        return 1
+    if isinstance(instruction, SeqRegImmediateInst | SeqLoadUpperImm):
+        return 1
+    if isinstance(instruction, SeqLoad):
+        return Sequencer.LOAD_STORE_LENGTH
+    return None
+
+
+def _is_addition(instruction: SequencerInstruction) -> bool:
+    return (
+        isinstance(instruction, SeqRegImmediateInst)
+        and instruction.funct3 == SeqRegImmFunct3.ADD
+    )
+
+
+def _is_move(instruction: SequencerInstruction) -> bool:
+    return _is_addition(instruction) and _lower_immediate(instruction.immediate) == 0
+
+
+def _lower_immediate(immediate: int) -> int:
+    """Returns the value an immediate instruction operates with, i.e. its sign extended lower 12 bits."""
+    return ((immediate & 0xFFF) ^ 0x800) - 0x800
+
+
+class _Program:
+    """The instruction list being optimized, together with its control flow.
+
+    :param instructions: the instructions of the program
+    :param fixed: indices of instructions which must neither be removed nor changed
+    :param live_at_end: registers whose values are still used after the program ended
+    """
+
+    def __init__(
+        self,
+        instructions: list[SequencerInstruction],
+        fixed: Iterable[int],
+        live_at_end: Iterable[int],
+    ):
+        self.instructions = list(instructions)
+        self.fixed = set(fixed)
+        self.live_at_end = _mask(*live_at_end) & ~1
+        # Maps the original indices (and the program length) to the current ones
+        self.index_map = list(range(len(instructions) + 1))
+        self._update_control_flow()
+
+    def _target(self, index: int) -> int | None:
+        instruction = self.instructions[index]
+        if isinstance(instruction, SeqBranch):
+            target = index + instruction.immediate
+        elif isinstance(instruction, SeqJump):
+            target = index + instruction.jump_val
+        else:
+            return None
+        return target if 0 <= target <= len(self.instructions) else None
+
+    def _update_control_flow(self):
+        length = len(self.instructions)
+        self.successors: list[list[int]] = []
+        self.leaders = {0}
+        for index, instruction in enumerate(self.instructions):
+            target = self._target(index)
+            if isinstance(instruction, SeqEnd):
+                successors = [length]
+            elif isinstance(instruction, SeqJump):
+                successors = [length if target is None else target]
+            elif isinstance(instruction, SeqBranch):
+                successors = [index + 1, length if target is None else target]
+            else:
+                successors = [index + 1]
+            self.successors.append(successors)
+
+            if isinstance(instruction, SeqBranch | SeqJump | SeqEnd):
+                self.leaders.add(index + 1)
+            if target is not None:
+                self.leaders.add(target)
+
+    def _live_out(self) -> list[int]:
+        """Returns the registers which are read later on, for each instruction."""
+        length = len(self.instructions)
+        effects = [
+            _uses_and_defs(instruction) or (_ALL_REGISTERS, 0)
+            for instruction in self.instructions
+        ]
+        live_in = [0] * length + [self.live_at_end]
+        live_out = [0] * length
+        changed = True
+        while changed:
+            changed = False
+            for index in reversed(range(length)):
+                out = 0
+                for successor in self.successors[index]:
+                    out |= live_in[successor]
+                live_out[index] = out
+                uses, defs = effects[index]
+                value = uses | (out & ~defs)
+                if value != live_in[index]:
+                    live_in[index] = value
+                    changed = True
+        return live_out
+
+    def _passable(self, index: int, rewrites: dict) -> bool:
+        """Whether the timing of the instruction at index is not observable."""
+        return index in rewrites or isinstance(
+            self.instructions[index], _REGISTER_OPERATIONS
+        )
+
+    def _can_absorb(
+        self, index: int, cycles: int, rewrites: dict, extra: dict[int, int]
+    ) -> bool:
+        instruction = self.instructions[index]
+        return (
+            isinstance(instruction, SeqWaitImm)
+            and index not in self.fixed
+            and index not in rewrites
+            and instruction.immediate + extra.get(index, 0) + cycles <= _WAIT_IMM_MAX
+        )
+
+    def _absorb(
+        self, index: int, cycles: int, rewrites: dict, extra: dict[int, int]
+    ) -> bool:
+        """Adds cycles to a wait which can take over the time of the instruction at index. Returns False if there is none."""
+        position = index
+        while position not in self.leaders:
+            position -= 1
+            if self._can_absorb(position, cycles, rewrites, extra):
+                extra[position] = extra.get(position, 0) + cycles
+                return True
+            if not self._passable(position, rewrites):
+                break
+
+        position = index
+        while (
+            position + 1 < len(self.instructions) and position + 1 not in self.leaders
+        ):
+            position += 1
+            if self._can_absorb(position, cycles, rewrites, extra):
+                extra[position] = extra.get(position, 0) + cycles
+                return True
+            if not self._passable(position, rewrites):
+                break
+        return False
+
+    def _apply(
+        self,
+        rewrites: dict[int, SequencerInstruction | None],
+        extra: dict[int, int],
+    ):
+        """Replaces (or removes if None) the instructions in rewrites, lengthens the waits in extra
+        and fixes the offsets of branches and jumps."""
+        instructions: list[SequencerInstruction] = []
+        new_index: list[int] = []
+        for index, instruction in enumerate(self.instructions):
+            new_index.append(len(instructions))
+            if index in rewrites:
+                instruction = rewrites[index]
+            elif index in extra:
+                instruction = SeqWaitImm(instruction.immediate + extra[index])
+            if instruction is not None:
+                instructions.append(instruction)
+        new_index.append(len(instructions))
+
+        for index, instruction in enumerate(self.instructions):
+            target = self._target(index)
+            if target is None or index in rewrites:
+                continue
+            offset = new_index[target] - new_index[index]
+            # Instructions might be shared with other sequencers, so they are not changed in place
+            relocated = copy.copy(instruction)
+            if isinstance(relocated, SeqBranch):
+                if relocated.immediate == offset:
+                    continue
+                relocated.set_jump_value(offset)
+            else:
+                if relocated.jump_val == offset:
+                    continue
+                relocated.jump_val = offset
+            instructions[new_index[index]] = relocated
+
+        self.instructions = instructions
+        self.fixed = {new_index[index] for index in self.fixed}
+        self.index_map = [new_index[index] for index in self.index_map]
+        self._update_control_flow()
+
+    def _is_lower_immediate_of(self, index: int, register: int) -> bool:
+        """Whether the instruction at index completes loading an immediate to register, see :meth:`Sequencer._encode_immediate`."""
+        if index >= len(self.instructions) or index in self.leaders:
+            return False
+        instruction = self.instructions[index]
+        return (
+            _is_addition(instruction)
+            and instruction.dst_reg == instruction.register == register
+        )
+
+    def remove_redundant_values(self, statistics: PeepholeStatistics):
+        """Removes immediates loaded to registers which already contain them and reloads of memory words,
+        tracking known register contents within basic blocks."""
+        constants: dict[int, int] = {}
+        # Register -> address of the memory word the register contains
+        memory: dict[int, int] = {}
+        rewrites: dict[int, SequencerInstruction | None] = {}
+        extra: dict[int, int] = {}
+
+        def value_of(register: int) -> int | None:
+            return 0 if register == 0 else constants.get(register)
+
+        def forget(register: int):
+            constants.pop(register, None)
+            memory.pop(register, None)
+
+        # Lower immediates which were handled together with their upper immediate
+        skip: set[int] = set()
+
+        for index, instruction in enumerate(self.instructions):
+            if index in self.leaders:
+                constants.clear()
+                memory.clear()
+            if index in skip:
+                continue
+            fixed = index in self.fixed
+
+            if isinstance(instruction, SeqLoadUpperImm):
+                register = instruction.dst_reg
+                value = instruction.immediate & _WORD_MASK
+                length = 1
+                if self._is_lower_immediate_of(index + 1, register):
+                    following = self.instructions[index + 1]
+                    value = (value + _lower_immediate(following.immediate)) & _WORD_MASK
+                    length = 2
+                    fixed = fixed or index + 1 in self.fixed
+                    skip.add(index + 1)
+                if (
+                    not fixed
+                    and register != 0
+                    and constants.get(register) == value
+                    and self._absorb(index, length, rewrites, extra)
+                ):
+                    for position in range(index, index + length):
+                        rewrites[position] = None
+                    statistics.removed_immediates += length
+                    continue
+                forget(register)
+                if not fixed:
+                    constants[register] = value
+                continue
+
+            if _is_addition(instruction):
+                register = instruction.dst_reg
+                source = value_of(instruction.register)
+                value = (
+                    None
+                    if source is None
+                    else (source + _lower_immediate(instruction.immediate)) & _WORD_MASK
+                )
+                if (
+                    not fixed
+                    and register != 0
+                    and value is not None
+                    and constants.get(register) == value
+                    and self._absorb(index, 1, rewrites, extra)
+                ):
+                    rewrites[index] = None
+                    statistics.removed_immediates += 1
+                    continue
+                forget(register)
+                if value is not None and not fixed:
+                    constants[register] = value
+                continue
+
+            if isinstance(instruction, SeqLoad):
+                register = instruction.dst_reg
+                base = value_of(instruction.register)
+                address = (
+                    None
+                    if base is None
+                    else (base + _lower_immediate(instruction.immediate)) & _WORD_MASK
+                )
+                if address is not None and not fixed and register != 0:
+                    if memory.get(register) == address:
+                        if self._absorb(
+                            index, Sequencer.LOAD_STORE_LENGTH, rewrites, extra
+                        ):
+                            rewrites[index] = None
+                            statistics.removed_loads += 1
+                            continue
+                    else:
+                        source = next(
+                            (reg for reg, adr in memory.items() if adr == address),
+                            None,
+                        )
+                        if source is not None and self._absorb(
+                            index, Sequencer.LOAD_STORE_LENGTH - 1, rewrites, extra
+                        ):
+                            rewrites[index] = SeqRegImmediateInst(
+                                QiOp.PLUS, register, source, 0
+                            )
+                            statistics.removed_loads += 1
+                            forget(register)
+                            memory[register] = address
+                            continue
+                forget(register)
+                if address is not None and register != 0:
+                    memory[register] = address
+                continue
+
+            if isinstance(instruction, SeqStore):
+                base = value_of(instruction.base_reg)
+                if base is None:
+                    memory.clear()
+                    continue
+                address = (base + _lower_immediate(instruction.immediate)) & _WORD_MASK
+                for register in [reg for reg, adr in memory.items() if adr == address]:
+                    del memory[register]
+                if instruction.src_reg != 0:
+                    memory[instruction.src_reg] = address
+                continue
+
+            effects = _uses_and_defs(instruction)
+            if effects is None:
+                constants.clear()
+                memory.clear()
+                continue
+            for register in [*constants, *memory]:
+                if effects[1] & (1 << register):
+                    forget(register)
+            if not isinstance(
+                instruction, (*_REGISTER_OPERATIONS, SeqWaitImm, SeqTrigger)
+            ):
+                # Other cells or external synchronization might access the memory meanwhile
+                memory.clear()
+
+        self._apply(rewrites, extra)
+
+    def remove_dead_instructions(self, statistics: PeepholeStatistics) -> bool:
+        """Removes instructions whose result is never read and folds copies into the instruction computing the copied value.
+        Returns whether the program changed."""
+        live_out = self._live_out()
+        rewrites: dict[int, SequencerInstruction | None] = {}
+        extra: dict[int, int] = {}
+
+        for index, instruction in enumerate(self.instructions):
+            if index in self.fixed:
+                continue
+            cycles = _removable_cycles(instruction)
+            if cycles is None:
+                continue
+            effects = _uses_and_defs(instruction)
+            assert effects is not None
+            defs = effects[1]
+
+            if defs & live_out[index] == 0 or (
+                _is_move(instruction) and instruction.dst_reg == instruction.register
+            ):
+                if self._absorb(index, cycles, rewrites, extra):
+                    rewrites[index] = None
+                    if _is_move(instruction):
+                        statistics.removed_moves += 1
+                    else:
+                        statistics.removed_dead_instructions += 1
+                continue
+
+            if not _is_move(instruction) or index in self.leaders:
+                continue
+            source = instruction.register
+            previous = self.instructions[index - 1]
+            if (
+                source != 0
+                and live_out[index] & (1 << source) == 0
+                and index - 1 not in self.fixed
+                and index - 1 not in rewrites
+                and isinstance(previous, _RETARGETABLE)
+                and previous.dst_reg == source
+                and self._absorb(index, 1, rewrites, extra)
+            ):
+                retargeted = copy.copy(previous)
+                retargeted.dst_reg = instruction.dst_reg
+                rewrites[index - 1] = retargeted
+                rewrites[index] = None
+                statistics.removed_moves += 1
+
+        if len(rewrites) == 0:
+            return False
+        self._apply(rewrites, extra)
+        return True
+
+    def merge_waits(self, statistics: PeepholeStatistics):
+        """Merges immediate waits which are only separated by register operations."""
+        rewrites: dict[int, SequencerInstruction | None] = {}
+        extra: dict[int, int] = {}
+        for index, instruction in enumerate(self.instructions):
+            if not isinstance(instruction, SeqWaitImm) or index in self.fixed:
+                continue
+            cycles = instruction.immediate + extra.get(index, 0)
+            if self._absorb(index, cycles, rewrites, extra):
+                extra.pop(index, None)
+                rewrites[index] = None
+                statistics.merged_waits += 1
+        self._apply(rewrites, extra)
+
+
+def optimize_instructions(
+    instructions: list[SequencerInstruction],
+    fixed: Iterable[int] = (),
+    live_at_end: Iterable[int] = (),
+) -> tuple[list[SequencerInstruction], list[int], PeepholeStatistics]:
+    """Runs the peephole optimization on a finished program.
+
+    :param instructions: the program, which is not modified
+    :param fixed: indices of instructions which must neither be removed nor changed, e.g. because they are patched later
+    :param live_at_end: registers whose values are read after the program ended, i.e. the ones of variables
+    :return: the optimized program, the new index of each original instruction (removed instructions map to the
+        following one, the program length maps to the new length) and statistics of the removed instructions
+    """
+    program = _Program(instructions, fixed, live_at_end)
+    statistics = PeepholeStatistics()
+
+    program.remove_redundant_values(statistics)
+    while program.remove_dead_instructions(statistics):
+        pass
+    program.merge_waits(statistics)
+
+    return program.instructions, program.index_map, statistics
@@ -24,6 +24,7 @@ RISC-V assembly sequentially.
 from __future__ import annotations
 
 import copy
+from collections import Counter
 from typing import TYPE_CHECKING, Any
 
 import qiclib.packages.utility as util
@@ -40,7 +41,11 @@ from qiclib.code.qi_command import (
     RotateFrameCommand,
     WaitCommand,
 )
-from qiclib.code.qi_seq_instructions import SeqBranch, SeqCellSync
+from qiclib.code.qi_seq_instructions import (
+    SeqBranch,
+    SeqCellSync,
+    SequencerInstruction,
+)
 from qiclib.code.qi_var_definitions import (
     QiCellProperty,
     QiExpression,
@@ -59,6 +64,7 @@ from .qi_visitor import (
 )
 
 if TYPE_CHECKING:
+    from qiclib.code.analysis.qi_register_allocation import RegisterAllocation
     from qiclib.code.qi_jobs import QiCell, QiCommand
     from qiclib.code.qi_result import QiResult
 
@@ -253,8 +259,10 @@ class ProgramBuilderVisitor(QiCommandVisitor):
         self,
         cell_seq: dict[QiCell, Sequencer],
         job_cell_to_digital_unit_cell_map: list[int],
+        register_allocation: dict[QiCell, RegisterAllocation] | None = None,
     ) -> None:
         self.cell_seq = cell_seq
+        self.register_allocation = register_allocation or {}
         self.if_depth: int = 0  # Used to check if currently processing commands inside If-Context-Manager
         self.for_range_end_val_list: list[
             tuple[_QiVariableBase, QiExpression | int]
@@ -275,9 +283,24 @@ class ProgramBuilderVisitor(QiCommandVisitor):
         """Function used to build commands from body.
         end_of_body() is called afterwards to end possibly ongoing pulses"""
         for cmd in body:
-            cmd.accept(self)
+            self.build_command(cmd)
         self.end_of_body(relevant_cells)
 
+    def build_command(self, cmd: QiCommand):
+        """Builds cmd. Afterwards, registers no longer needed by cells with a register allocation are released."""
+        temporary = {
+            cell: self.cell_seq[cell].temporary_register_count
+            for cell in self.register_allocation
+        }
+
+        cmd.accept(self)
+
+        for cell, allocation in self.register_allocation.items():
+            sequencer = self.cell_seq[cell]
+            sequencer.release_temporary_registers(keep=temporary[cell])
+            for var in allocation.last_used_by(cmd):
+                sequencer.release_variable(var)
+
     def force_sync(
         self, relevant_cells: list[QiCell], sync_point: _ProgramCycles.SyncPoint
     ):
@@ -390,7 +413,12 @@ class ProgramBuilderVisitor(QiCommandVisitor):
         relevant_cells = self.get_relevant_cells(cell_cmd)
 
         for cell in relevant_cells:
-            if isinstance(cell_cmd, WaitCommand):
+            if isinstance(cell_cmd, WaitCommand) and isinstance(
+                cell_cmd._length, QiCellProperty
+            ):
+                # Remembered by the sequencer to patch it if only the property changes
+                self.cell_seq[cell].add_property_wait_cmd(cell_cmd)
+            elif isinstance(cell_cmd, WaitCommand):
                 # Ignore Wait command if it is of length less than a cycle.
                 length = cell_cmd.length
                 if (
@@ -444,7 +472,11 @@ class ProgramBuilderVisitor(QiCommandVisitor):
         self.if_depth += 1
 
         for cell in relevant_cells:
+            temporary = self.cell_seq[cell].temporary_register_count
             jump_over_if[cell] = self.cell_seq[cell].add_if_condition(if_cm.condition)
+            if cell in self.register_allocation:
+                # The condition is not needed within the bodies
+                self.cell_seq[cell].release_temporary_registers(keep=temporary)
 
             # conditional branching makes implicit sync by wait impossible
             self.cell_seq[cell]._prog_cycles.valid = False
@@ -1282,7 +1314,7 @@ class ProgramBuilderVisitor(QiCommandVisitor):
     def visit_asm_command(self, asm_cmd):
         relevant_cells = self.get_relevant_cells(asm_cmd)
         for cell in relevant_cells:
-            self.cell_seq[cell].add_instruction_to_list(
+            self.cell_seq[cell].add_asm_instruction(
                 asm_cmd.asm_instruction, asm_cmd.cycles
             )
 
@@ -1320,6 +1352,7 @@ def build_program(
     command_list: list[QiCommand],
     skip_nco_sync: bool = False,
     nco_sync_length: float = 0,
+    optimize: bool = False,
 ) -> dict[QiCell, Sequencer]:
     cell_seq_dict: dict[QiCell, Sequencer] = {}
     result_boxes: list[QiResult] = []
@@ -1339,17 +1372,53 @@ def build_program(
     _assign_cell_to_context_manager(command_list)
     _assign_variables_to_cell(command_list)
 
-    prog_builder = ProgramBuilderVisitor(cell_seq_dict, cell_map)
+    from .analysis.qi_register_allocation import allocate_registers
+
+    register_allocation = allocate_registers(command_list, cell_list)
+    for cell, allocation in register_allocation.items():
+        cell_seq_dict[cell].spill_variables(allocation.spilled)
+
+    prog_builder = ProgramBuilderVisitor(cell_seq_dict, cell_map, register_allocation)
 
     for command in command_list:
-        command.accept(prog_builder)
+        prog_builder.build_command(command)
 
     for sequencer in cell_seq_dict.values():
         sequencer.end_of_program()
+        if optimize:
+            sequencer.optimize()
 
     return cell_seq_dict
 
 
+def patch_program(
+    cell_seq_dict: dict[QiCell, Sequencer],
+    property_reads: Counter[tuple[QiCell, str]],
+    changed: set[tuple[QiCell, str]],
+) -> dict[QiCell, tuple[Sequencer, dict[int, SequencerInstruction]]] | None:
+    """Updates a program generated by `build_program` to changed property values without rebuilding it.
+
+    This is only possible if the changed properties are only used as immediates which can be re-encoded
+    (see `Sequencer.patch_properties`). All other uses resolve the property while building the program.
+
+    :param cell_seq_dict: the program to patch, which is not modified
+    :param property_reads: how often each (cell, property name) was resolved while building the program
+    :param changed: (cell, property name) of the properties whose values changed since the build
+    :return: the patched sequencers together with the replaced instructions by their index,
+        or None if the program needs to be rebuilt
+    """
+    if any(property_reads[key] > 0 for key in changed):
+        return None
+
+    patched = {}
+    for cell, sequencer in cell_seq_dict.items():
+        result = sequencer.patch_properties(changed)
+        if result is None:
+            return None
+        patched[cell] = result
+    return patched
+
+
 def get_all_variables(cell_seq_dict) -> dict[Any, dict[Any, int]]:
     vars: dict[Any, dict[Any, int]] = {}
     for cell, seq in cell_seq_dict.items():
@@ -15,8 +15,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
+import functools
 import logging
-from collections.abc import Callable
+import threading
+import warnings
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
 from typing import Any
 
 import numpy as np
@@ -35,14 +39,44 @@ class Shape(np.vectorize):
     """
     A vectorized function describing a possible shape
     defined on the standardized interval [0,1).
+
+    By default, `func` is called for every sample individually (like :class:`numpy.vectorize`).
+    If `func` already operates on whole arrays (e.g. it is composed of numpy ufuncs), pass `vectorized=True`,
+    so it is called once with the array of all samples.
+
+    :param name: name of the shape
+    :param func: function mapping the time fraction of a sample to its amplitude
+    :param vectorized: if `func` accepts and returns arrays
     """
 
-    def __init__(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any):
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        *args: Any,
+        vectorized: bool = False,
+        **kwargs: Any,
+    ):
         self.name = name
+        self.vectorized = vectorized
         super().__init__(func, *args, **kwargs)
 
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        if not self.vectorized:
+            return super().__call__(*args, **kwargs)
+        result = np.asarray(self.pyfunc(*args, **kwargs))
+        # Constant functions return a scalar, so bring it into the shape of the input
+        shape = np.broadcast_shapes(*(np.shape(arg) for arg in args))
+        if result.shape != shape:
+            result = np.broadcast_to(result, shape).copy()
+        return result
+
     def __mul__(self, other):
-        return Shape(self.name, lambda x: self.pyfunc(x) * other.pyfunc(x))
+        return Shape(
+            self.name,
+            lambda x: self.pyfunc(x) * other.pyfunc(x),
+            vectorized=self.vectorized and other.vectorized,
+        )
 
     def __str__(self) -> str:
         return f"Shape({self.name})"
@@ -55,29 +89,42 @@ class ShapeLibClass:
     """
 
     def __init__(self) -> None:
-        self.zero = Shape("", lambda x: 0)
-        self.rect = Shape("rect", lambda x: np.where(0 <= x < 1, 1, 0))
+        self.zero = Shape("", lambda x: 0.0, vectorized=True)
+        self.rect = Shape(
+            "rect", lambda x: np.where((0 <= x) & (x < 1), 1.0, 0.0), vectorized=True
+        )
         self.gauss = (
-            Shape("gauss", lambda x: np.exp(-0.5 * np.power((x - 0.5) / 0.166, 2.0)))
+            Shape(
+                "gauss",
+                lambda x: np.exp(-0.5 * np.power((x - 0.5) / 0.166, 2.0)),
+                vectorized=True,
+            )
             * self.rect
         )
-        self.ramp = Shape("ramp", lambda x: x) * self.rect
-        self.sqrfct = Shape("sqrfct", lambda x: x**2) * self.rect
+        self.ramp = Shape("ramp", lambda x: x, vectorized=True) * self.rect
+        self.sqrfct = Shape("sqrfct", lambda x: x**2, vectorized=True) * self.rect
 
         self.l_sphere: Shape = (
-            Shape("l_sphere", lambda x: np.sqrt(1 - x**2)) * self.rect
+            Shape("l_sphere", lambda x: np.sqrt(1 - x**2), vectorized=True) * self.rect
         )
         self.r_sphere: Shape = (
-            Shape("r_sphere", lambda x: np.sqrt(1 - (x - 1) ** 2)) * self.rect
+            Shape("r_sphere", lambda x: np.sqrt(1 - (x - 1) ** 2), vectorized=True)
+            * self.rect
         )
         self.gauss_up: Shape = (
             Shape(
-                "gauss_up", lambda x: np.exp(-0.5 * np.power((x - 1) / 2 / 0.166, 2.0))
+                "gauss_up",
+                lambda x: np.exp(-0.5 * np.power((x - 1) / 2 / 0.166, 2.0)),
+                vectorized=True,
             )
             * self.rect
         )
         self.gauss_down: Shape = (
-            Shape("gauss_down", lambda x: np.exp(-0.5 * np.power(x / 2 / 0.166, 2.0)))
+            Shape(
+                "gauss_down",
+                lambda x: np.exp(-0.5 * np.power(x / 2 / 0.166, 2.0)),
+                vectorized=True,
+            )
             * self.rect
         )
 
@@ -86,6 +133,104 @@ class ShapeLibClass:
 ShapeLib = ShapeLibClass()
 
 
+class _Envelope:
+    """
+    Samples of a pulse envelope together with the arrays derived from them.
+    All arrays are read-only, so they can be shared between pulses.
+
+    :param samples: the envelope as returned by :meth:`QiPulse.__call__`
+    :param hold: if the last value is held by the pulse generator
+    """
+
+    def __init__(self, samples: np.ndarray, hold: bool):
+        samples.flags.writeable = False
+        self.samples = samples
+        self.hold = hold
+
+    @functools.cached_property
+    def padded(self) -> np.ndarray:
+        padded = self.samples
+        if len(padded) % 4 != 0:
+            # adds fill values to the end of the pulse if its not multiple of 4
+            fill = padded[-1] if self.hold else 0.0
+            padded = np.concatenate((padded, np.full(4 - len(padded) % 4, fill)))
+            padded.flags.writeable = False
+        return padded
+
+    @functools.cached_property
+    def iq(self) -> tuple[np.ndarray, np.ndarray]:
+        pulseform_i = np.real(self.padded)
+        pulseform_q = np.imag(self.padded)
+        if not np.any(pulseform_q):
+            # No imaginary part present, so only real envelope
+            pulseform_q = np.zeros(0)
+        pulseform_i.flags.writeable = False
+        pulseform_q.flags.writeable = False
+        return pulseform_i, pulseform_q
+
+    @functools.cached_property
+    def max_amplitude(self) -> float:
+        return np.max(np.abs(self.samples))
+
+
+class _EnvelopeCache:
+    """
+    Thread-safe least recently used cache of pulse envelopes.
+
+    Entries are keyed by the shape, the resolved length and amplitude, the sample rate and if the pulse is held.
+    Shapes are compared by identity.
+
+    :param maxsize: maximum number of envelopes kept, 0 disables caching
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, _Envelope] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(
+        self, key: Hashable, create: Callable[[], _Envelope]
+    ) -> _Envelope:
+        with self._lock:
+            envelope = self._entries.get(key)
+            if envelope is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return envelope
+            self.misses += 1
+
+        # Create outside of the lock, so other pulses are not blocked in the meantime
+        envelope = create()
+        if self.maxsize <= 0:
+            return envelope
+        with self._lock:
+            envelope = self._entries.setdefault(key, envelope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return envelope
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class QiPulse:
     """
     Class to describe a single pulse.
@@ -97,6 +242,9 @@ class QiPulse:
     :param frequency: Frequency of your pulse, which is loaded to the PulseGen
     """
 
+    # Envelopes shared by all pulses, see :meth:`QiPulse.__call__`
+    envelope_cache = _EnvelopeCache()
+
     def __init__(
         self,
         length: float | QiExpression | str,
@@ -232,20 +380,45 @@ class QiPulse:
     def __call__(self, samplerate: float, **variables: Any) -> np.ndarray:
         """
         Returns the pulse envelope for a given frequency.
+        Envelopes are cached in :attr:`QiPulse.envelope_cache`, so the returned array is read-only.
+
         :param samplerate: sample rate for calculating the envelope
         :param variables: the variables for the length/amplitude function, if any; legacy of qup_pulses
 
         :return: envelope of the pulse as numpy array.
         """
+        return self._envelope(samplerate).samples
+
+    def _padded_envelope(self, samplerate: float) -> np.ndarray:
+        """
+        Returns the envelope as it is loaded into the pulse generator, i.e. padded to a multiple of 4 samples.
+        If the pulse is held, the last value is repeated, otherwise zeros are appended.
+
+        :param samplerate: sample rate for calculating the envelope
+        """
+        return self._envelope(samplerate).padded
+
+    def _iq_envelope(self, samplerate: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the real and imaginary part of the padded envelope, see :meth:`_padded_envelope`.
+        The imaginary part is empty if the envelope is real.
+
+        :param samplerate: sample rate for calculating the envelope
+        """
+        return self._envelope(samplerate).iq
+
+    def _envelope(self, samplerate: float) -> _Envelope:
         from qiclib.code.qi_jobs import QiCellProperty
 
         length = (
             self._length() if isinstance(self._length, QiCellProperty) else self._length
         )
+        # check if holding the last value of the amplitude array.
+        hold = self.is_variable_length or self.hold
 
         if isinstance(length, QiExpression) and length.is_dynamic():
             # variable pulses are hold till ended by another pulse, so no need to use correct length
-            return np.array([self.amplitude] * 4)
+            return _Envelope(np.array([self.amplitude] * 4), hold)
 
         if not isinstance(length, float | int):
             raise ValueError(
@@ -268,27 +441,21 @@ class QiPulse:
         else:
             amplitude = self.amplitude
 
-        timestep = 1.0 / samplerate
-
-        if length < timestep / 2.0:
-            if length != 0:
-                logging.warning(
-                    "A pulse is shorter than %f ns and thus is omitted.", length * 1e09
-                )
-
-            return np.zeros(0)
-
-        time_fractions = np.arange(0, length, timestep) / length
+        def create() -> _Envelope:
+            return _Envelope(self._sample(length, amplitude, samplerate), hold)
 
-        envelope = amplitude * self.shape(time_fractions)
+        if isinstance(amplitude, QiExpression) or not isinstance(amplitude, Hashable):
+            # QiExpressions overload __eq__ and cannot be used as key
+            envelope = create()
+        else:
+            key = (self.shape, length, amplitude, samplerate, hold)
+            envelope = self.envelope_cache.get_or_create(key, create)
 
         # Check if amplitude is too low and might vanish due to 16-bit quantization
-        if self.mode != "off" and len(envelope) > 0:
-            max_amplitude = np.max(np.abs(envelope))
+        if self.mode != "off" and len(envelope.samples) > 0:
+            max_amplitude = envelope.max_amplitude
             min_representable_amplitude = 1.0 / const.CONTROLLER_AMPLITUDE_MAX_VALUE
             if max_amplitude < min_representable_amplitude:
-                import warnings
-
                 warnings.warn(
                     f"Pulse amplitude ({max_amplitude:.2e}) is below the minimum representable value "
                     f"({min_representable_amplitude:.2e}) for 16-bit quantization and will vanish "
@@ -298,6 +465,21 @@ class QiPulse:
 
         return envelope
 
+    def _sample(self, length: float, amplitude: Any, samplerate: float) -> np.ndarray:
+        timestep = 1.0 / samplerate
+
+        if length < timestep / 2.0:
+            if length != 0:
+                logging.warning(
+                    "A pulse is shorter than %f ns and thus is omitted.", length * 1e09
+                )
+
+            return np.zeros(0)
+
+        time_fractions = np.arange(0, length, timestep) / length
+
+        return amplitude * self.shape(time_fractions)
+
     @property
     def length(self) -> QiExpression | float | str:
         return self._length
@@ -0,0 +1,140 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+Compact representation of the order in which recordings are executed.
+
+Recordings inside of loops are executed many times. Instead of listing every execution, each recording is described
+by the index of its first execution and a (stride, count) pair per enclosing loop (see :class:`RecordingPattern`).
+The indices of all executions of one recording can then be computed with numpy, without iterating over the loops.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from collections.abc import Callable, Hashable, Sequence
+from dataclasses import dataclass
+from typing import Generic, TypeVar, overload
+
+import numpy as np
+import numpy.typing as npt
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+@dataclass(frozen=True)
+class RecordingPattern(Generic[T]):
+    """
+    Executions of one recording within a loop nest.
+
+    The recording is executed at the indices `start + i_0 * stride_0 + i_1 * stride_1 + ...` for all `0 <= i_k < count_k`,
+    where `levels` contains the (stride, count) pairs from the outermost to the innermost loop.
+    """
+
+    item: T
+    start: int
+    levels: tuple[tuple[int, int], ...] = ()
+
+    @property
+    def count(self) -> int:
+        return math.prod(count for _, count in self.levels)
+
+    def repeated(self, stride: int, count: int) -> RecordingPattern[T]:
+        """Returns the pattern when it is repeated by another enclosing loop."""
+        return RecordingPattern(self.item, self.start, ((stride, count), *self.levels))
+
+    def indices(self) -> npt.NDArray[np.intp]:
+        """Returns the indices of all executions in ascending order."""
+        indices = np.array([self.start], dtype=np.intp)
+        for stride, count in self.levels:
+            indices = (
+                indices[:, np.newaxis] + stride * np.arange(count, dtype=np.intp)
+            ).ravel()
+        return indices
+
+
+class RecordingOrder(Sequence[T]):
+    """
+    The order of executed recordings, described by :class:`RecordingPattern`.
+
+    It behaves like a list with the item of each execution. The list is only created when individual elements are
+    accessed, while :meth:`indices_per_item` directly works on the patterns.
+
+    :param patterns: the patterns of all recordings, whose indices do not overlap
+    :param length: the total number of executions
+    """
+
+    def __init__(self, patterns: list[RecordingPattern[T]], length: int):
+        self.patterns = patterns
+        self._length = length
+        self._items: list[T] | None = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[T]: ...
+
+    def __getitem__(self, index):
+        return self._expand()[index]
+
+    def __repr__(self) -> str:
+        return f"RecordingOrder({self._expand()!r})"
+
+    def _expand(self) -> list[T]:
+        if self._items is None:
+            items: list = [None] * self._length
+            for pattern in self.patterns:
+                for index in pattern.indices():
+                    items[index] = pattern.item
+            self._items = items
+        return self._items
+
+    def map(self, function: Callable[[T], U]) -> RecordingOrder[U]:
+        """Returns the order with `function` applied to each item."""
+        return RecordingOrder(
+            [
+                RecordingPattern(function(p.item), p.start, p.levels)
+                for p in self.patterns
+            ],
+            self._length,
+        )
+
+    def indices_per_item(
+        self, limit: int | None = None
+    ) -> dict[Hashable, npt.NDArray[np.intp]]:
+        """
+        Returns the indices of the executions of each (distinct) item in ascending order.
+
+        :param limit: only indices below this value are returned
+        """
+        indices: dict[Hashable, list[npt.NDArray[np.intp]]] = defaultdict(list)
+        for pattern in self.patterns:
+            indices[pattern.item].append(pattern.indices())
+
+        result = {}
+        for item, arrays in indices.items():
+            merged = arrays[0] if len(arrays) == 1 else np.sort(np.concatenate(arrays))
+            if limit is not None:
+                merged = merged[: np.searchsorted(merged, limit)]
+            if len(merged) > 0:
+                result[item] = merged
+        # In the order of the first execution
+        return dict(sorted(result.items(), key=lambda entry: entry[1][0]))
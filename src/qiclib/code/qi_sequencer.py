@@ -22,11 +22,12 @@ provides helper functions to generate code for expressions and more.
 
 from __future__ import annotations
 
+import copy
 import warnings
 from collections.abc import Callable, Iterable
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import qiclib.packages.utility as util
 from qiclib.code.qi_command import (
@@ -72,8 +73,12 @@ from qiclib.code.qi_var_definitions import (
     _QiConstValue,
     _QiStaticVariable,
     _QiVariableBase,
+    _untraced_property_resolution,
 )
 
+if TYPE_CHECKING:
+    from qiclib.code.qi_peephole import PeepholeStatistics
+
 
 class _Register:
     """Class of Sequencer representing registers.
@@ -164,6 +169,25 @@ class Pointer:
     adr: int
 
 
+@dataclass
+class _PropertySlot:
+    """Instructions of a :class:`Sequencer` whose immediate is directly derived from a QiCellProperty.
+    They can be re-encoded if only the value of the property changes, see :meth:`Sequencer.patch_properties`.
+
+    :param prop: the property the immediate is derived from
+    :param indices: positions of the instructions in the instruction list
+    :param register: the register the immediate is loaded to, None if the instructions implement a wait
+    """
+
+    prop: QiCellProperty
+    indices: list[int]
+    register: int | None
+
+    @property
+    def key(self) -> tuple[Any, str]:
+        return self.prop.cell, self.prop.name
+
+
 class ForRangeEntry:
     def __init__(self, reg_addr, start_val, end_val, step_val) -> None:
         self.reg_addr = reg_addr
@@ -275,6 +299,17 @@ class Sequencer:
         self._trigger_mods = _TriggerModules()
         self._for_range_list: list[ForRangeEntry] = []
         self._for_range_stack: list[ForRangeEntry] = []
+        self._property_slots: list[_PropertySlot] = []
+        # Length of the instruction list when the program cycles were last read
+        self._timing_observed_at = 0
+        # Positions of instructions given by the user, which must not be changed by optimize
+        self._fixed_indices: set[int] = set()
+        self.peephole_statistics: PeepholeStatistics | None = None
+        # Ids of variables kept in memory and of variables whose register was released, see spill_variables
+        self._spilled_variables: set[int] = set()
+        self._released_variables: set[int] = set()
+        # Registers only needed while the current command is built, see release_temporary_registers
+        self._temporary_registers: list[_Register] = []
 
         # register 0 always contains 0, so is not in stack
         self.reg0 = _Register(0)
@@ -306,6 +341,7 @@ class Sequencer:
         """Program length is used for implicit synchs with Wait-Commands. If a program contains variable If/Else or loads to wait registers
         prog_length can not be determined. Invalid prog_cycles are some value less than 0.
         """
+        self._timing_observed_at = len(self.instruction_list)
         if self._prog_cycles.valid:
             return self._prog_cycles.cycles
 
@@ -363,16 +399,29 @@ class Sequencer:
                     f"Array size mismtach. Declared {array_size}, initial value: {len(post_processed)}"
                 )
                 reg = self.request_memory(post_processed)
+        elif var.id in self._spilled_variables:
+            reg = self.request_memory([0])
         else:
             reg = self.request_register()
         self._var_reg_dict[var.id] = reg
+        self._released_variables.discard(var.id)
         # Named variables can be initialized externally
         if var.name is not None and isinstance(reg, _Register):
             reg.valid = False
             reg.value = 0
 
+    def spill_variables(self, variables: Iterable[_QiVariableBase]):
+        """Keeps the given variables in memory instead of a register once they are added.
+        Their value is loaded to a temporary register on every use (see `qi_register_allocation`)."""
+        self._spilled_variables.update(var.id for var in variables)
+
     def release_variable(self, var):
-        reg_or_pointer = self.get_var_register(var)
+        """Releases the register of var after its last use. The variable keeps its destination,
+        so it is still listed by `get_all_variables`. Releasing it again does nothing."""
+        reg_or_pointer = self._var_reg_dict.get(var.id)
+        if reg_or_pointer is None or var.id in self._released_variables:
+            return
+        self._released_variables.add(var.id)
         if isinstance(reg_or_pointer, _Register):
             self.release_register(reg_or_pointer)
 
@@ -400,8 +449,10 @@ class Sequencer:
         # This is not correct, but at this point in the compilation chain,
         # we have no way to determine the value at some memory location.
         target.value = 0
-        target.valid = True
+        # Spilled variables are changed at run time, so their value is unknown
+        target.valid = var.id not in self._spilled_variables
         self.add_load_cmd(target, adr_reg)
+        self._temporary_registers += [adr_reg, target]
         return target
 
     def get_var_value(self, var) -> int | float | None:
@@ -419,6 +470,16 @@ class Sequencer:
             print(f"Not enough registers available, sequencer {self} error {e}")
             raise
 
+    @property
+    def temporary_register_count(self) -> int:
+        return len(self._temporary_registers)
+
+    def release_temporary_registers(self, keep: int = 0):
+        """Releases the registers used to load and store memory variables, except for the first `keep`.
+        Used by `ProgramBuilderVisitor.build_command` if registers are allocated for this cell."""
+        while len(self._temporary_registers) > keep:
+            self.release_register(self._temporary_registers.pop())
+
     def get_cycles_from_length(self, length) -> _Register | Pointer | int:
         """If length is QiVariable, return _Register, else return numbers of cycles ceiled"""
         from .qi_var_definitions import _QiVariableBase
@@ -459,9 +520,51 @@ class Sequencer:
             length_in_cycles, length_valid
         )  # Will be deprecated when external sync is possible.
 
+    def add_asm_instruction(
+        self, instruction: SequencerInstruction, length_in_cycles: int = 1
+    ):
+        """Adds an instruction given by the user, which is left untouched by :meth:`optimize`."""
+        self.add_instruction_to_list(instruction, length_in_cycles)
+        self._fixed_indices.add(len(self.instruction_list) - 1)
+
     def get_prog_size(self) -> int:
         return len(self.instruction_list)
 
+    def optimize(self) -> PeepholeStatistics:
+        """Runs the peephole optimization (see :mod:`qiclib.code.qi_peephole`) on the finished program.
+        The timing of the program, on which the implicit synchronization of cells relies, is not changed.
+        Instructions derived from properties are kept, so the program can still be patched.
+        """
+        from .qi_peephole import optimize_instructions
+
+        fixed = set(self._fixed_indices)
+        for slot in self._property_slots:
+            fixed.update(slot.indices)
+        variable_registers = [
+            reg.adr for reg in self._var_reg_dict.values() if isinstance(reg, _Register)
+        ]
+
+        instructions, index_map, statistics = optimize_instructions(
+            self.instruction_list, fixed, variable_registers
+        )
+        self.instruction_list = instructions
+        self._property_slots = [
+            replace(slot, indices=[index_map[index] for index in slot.indices])
+            for slot in self._property_slots
+        ]
+        self._fixed_indices = {index_map[index] for index in self._fixed_indices}
+        self._timing_observed_at = index_map[self._timing_observed_at]
+        self._remap_for_range_entries(self._for_range_list, index_map)
+        self.peephole_statistics = statistics
+        return statistics
+
+    @staticmethod
+    def _remap_for_range_entries(entries: list[ForRangeEntry], index_map: list[int]):
+        for entry in entries:
+            # end_addr is the last instruction of the loop, which might have been removed
+            entry.end_addr = index_map[entry.end_addr + 1] - 1
+            Sequencer._remap_for_range_entries(entry.contained_entries, index_map)
+
     def add_mov_command(self, dst_reg: _Register, src_reg: _Register):
         """Copies value of src_reg to dst_reg."""
         self.add_calculation(src_reg, QiOp.PLUS, 0, dst_reg)
@@ -489,21 +592,124 @@ class Sequencer:
         if isinstance(val, float):
             raise NotImplementedError("float not implemented yet")
 
-        if SequencerInstruction.is_value_in_lower_immediate(val):
-            self.add_instruction_to_list(
-                SeqRegImmediateInst(QiOp.PLUS, dst_reg.adr, 0, val)
-            )  # register_0 always contains 0
-        else:
-            upper_immediate = self.get_upper_immediate_value(val)
-            self.add_instruction_to_list(SeqLoadUpperImm(dst_reg.adr, upper_immediate))
-            if val & 0xFFF != 0:
-                self.add_instruction_to_list(
-                    SeqRegImmediateInst(QiOp.PLUS, dst_reg.adr, dst_reg.adr, val)
-                )
+        for instruction in self._encode_immediate(val, dst_reg.adr):
+            self.add_instruction_to_list(instruction)
 
         dst_reg.update_register_value(val, QiOp.PLUS, 0)
         return dst_reg
 
+    def _encode_immediate(self, val: int, adr: int) -> list[SequencerInstruction]:
+        """Returns the instructions loading immediate val to register adr."""
+        if SequencerInstruction.is_value_in_lower_immediate(val):
+            # register_0 always contains 0
+            return [SeqRegImmediateInst(QiOp.PLUS, adr, 0, val)]
+
+        upper_immediate = self.get_upper_immediate_value(val)
+        instructions: list[SequencerInstruction] = [
+            SeqLoadUpperImm(adr, upper_immediate)
+        ]
+        if val & 0xFFF != 0:
+            instructions.append(SeqRegImmediateInst(QiOp.PLUS, adr, adr, val))
+        return instructions
+
+    def property_to_register(
+        self, prop: QiCellProperty, dst_reg: _Register | None = None
+    ) -> _Register:
+        """Loads the value of prop to dst_reg like :meth:`immediate_to_register`.
+        The generated instructions are remembered, so they can be patched if only the value of the property changes.
+        """
+        start = len(self.instruction_list)
+        with _untraced_property_resolution():
+            register = self.immediate_to_register(prop.value, dst_reg)
+        self._add_property_slot(prop, start, register.adr)
+        return register
+
+    def add_property_wait_cmd(self, qi_wait: WaitCommand):
+        """Adds a wait whose length is given by a QiCellProperty.
+        Like for other waits, lengths shorter than a cycle are omitted.
+        The generated instructions are remembered, so they can be patched if only the value of the property changes.
+        """
+        length = qi_wait._length
+        assert isinstance(length, QiCellProperty)
+        start = len(self.instruction_list)
+        with _untraced_property_resolution():
+            if self._encode_property_wait(length()) != []:
+                self.add_wait_cmd(qi_wait)
+        self._add_property_slot(length, start, None)
+
+    @staticmethod
+    def _encode_property_wait(length: float) -> list[SequencerInstruction] | None:
+        """Returns the instructions of a wait with given length, or None if they depend on register allocation."""
+        if util.conv_time_to_cycles(length) == 0:
+            return []
+        cycles = util.conv_time_to_cycles(length, mode="ceil")
+        if SequencerInstruction.is_value_in_unsigned_upper_immediate(cycles):
+            return [SeqWaitImm(cycles)]
+        return None
+
+    def _add_property_slot(
+        self, prop: QiCellProperty, start: int, register: int | None
+    ):
+        # Skip choke pulses which might have been inserted in front of the instructions
+        indices = [
+            index
+            for index in range(start, len(self.instruction_list))
+            if not isinstance(self.instruction_list[index], SeqTrigger)
+        ]
+        self._property_slots.append(_PropertySlot(prop, indices, register))
+
+    def _encode_property_slot(
+        self, slot: _PropertySlot
+    ) -> list[SequencerInstruction] | None:
+        """Returns the instructions for slot with the current property value, or None if they can not be encoded in place."""
+        if slot.register is None:
+            return self._encode_property_wait(slot.prop())
+        value = slot.prop.value
+        if not isinstance(value, int):
+            return None
+        if slot.register == 0:
+            # Value 0 was loaded without instructions by using register 0
+            return [] if value == 0 else None
+        return self._encode_immediate(value, slot.register)
+
+    def patch_properties(
+        self, changed: Iterable[tuple[Any, str]]
+    ) -> tuple[Sequencer, dict[int, SequencerInstruction]] | None:
+        """Re-encodes the instructions derived from the changed properties with their current values.
+
+        Patching is only possible if the new values lead to the same instruction layout and, for wait times,
+        if the program length was not used afterwards (e.g. for implicit synchronization).
+        The caller needs to ensure that the properties did not influence the program in other ways,
+        i.e. that they were not resolved outside of the remembered instructions while building the program.
+
+        :param changed: (cell, property name) of the properties whose values changed
+        :return: A patched copy of this sequencer together with the replaced instructions by their index,
+            or None if the program needs to be rebuilt.
+        """
+        changed = set(changed)
+        patches: dict[int, SequencerInstruction] = {}
+        for slot in self._property_slots:
+            if slot.key not in changed:
+                continue
+            if slot.register is None and any(
+                index < self._timing_observed_at for index in slot.indices
+            ):
+                return None
+
+            instructions = self._encode_property_slot(slot)
+            if instructions is None or len(instructions) != len(slot.indices):
+                return None
+            for index, instruction in zip(slot.indices, instructions):
+                if type(self.instruction_list[index]) is not type(instruction):
+                    return None
+                patches[index] = instruction
+
+        patched = copy.copy(self)
+        patched.instruction_list = list(self.instruction_list)
+        for index, instruction in patches.items():
+            patched.instruction_list[index] = instruction
+        return patched, patches
+
     def assign_value_to_register(self, value, dst_reg: _Register, if_depth: int):
         if isinstance(value, _QiConstValue):
             self.immediate_to_register(val=value.value, dst_reg=dst_reg)
@@ -526,6 +732,7 @@ class Sequencer:
     def assign_value_to_memory(self, value: QiExpression, dst: Pointer):
         address_pointer = self.immediate_to_register(dst.adr)
         self.add_store_cmd(value, address_pointer)
+        self._temporary_registers.append(address_pointer)
 
     def add_calculation(
         self,
@@ -707,13 +914,16 @@ class Sequencer:
 
     def add_wait_cmd(self, qi_wait: WaitCommand):
         """Evaluates QiWait
-        If length attribute is int/float, calls _wait_cycles to add wait commands.
+        If length attribute is int/float or a constant, e.g. a folded QiCalc, calls _wait_cycles to add wait commands.
         If length attribute is _QiVariable, it's register is used for wait command.
         If attribute length is _QiCalcBase, QiCalc is evaluated and its final Register is used as wait time, after which the register is released again
         """
         from .qi_var_definitions import _QiCalcBase
 
-        if isinstance(qi_wait.length, QiExpression):
+        if isinstance(qi_wait.length, _QiConstValue):
+            # Constant lengths are already given in cycles
+            length = qi_wait.length.value
+        elif isinstance(qi_wait.length, QiExpression):
             length = self.__evaluate_qicalc_val(qi_wait.length)
             warnings.warn("Calculations inside wait might impede timing")
             # TODO decrease wait time depending on amount of calculations for length
@@ -967,11 +1177,16 @@ class Sequencer:
         """
 
         requested_registers = []
-        destination = self.__evaluate_qicalc_val(value)
-        if isinstance(destination, int):
-            value_register = self.immediate_to_register(destination)
+        if isinstance(value, QiCellProperty):
+            value_register = self.property_to_register(value)
         else:
-            value_register = destination
+            destination = self.__evaluate_qicalc_val(value)
+            if isinstance(destination, int):
+                value_register = self.immediate_to_register(destination)
+            else:
+                value_register = destination
+        if not isinstance(value, _QiVariableBase) and value_register is not self.reg0:
+            self._temporary_registers.append(value_register)
 
         base_register, offset, free = self._normalise_base_offset(base, offset)
 
@@ -1121,7 +1336,7 @@ class _ALU:
             and SequencerInstruction.is_value_in_lower_immediate(val2)
         ):
             self.seq.add_instruction_to_list(
-                SeqRegImmediateInst(QiOp.PLUS, dst_reg, val1.adr, -val2)
+                SeqRegImmediateInst(QiOp.PLUS, dst_reg.adr, val1.adr, -val2)
             )
         else:
             self.non_commutative_operation(QiOp.MINUS, dst_reg, val1, val2)
@@ -1131,7 +1346,7 @@ class _ALU:
         if isinstance(val1, _Register):
             if isinstance(val2, _Register):
                 self.seq.add_instruction_to_list(
-                    SeqRegRegInst(QiOp.MULT, dst_reg, val1.adr, val2.adr),
+                    SeqRegRegInst(QiOp.MULT, dst_reg.adr, val1.adr, val2.adr),
                     length_in_cycles=Sequencer.MULTIPLICATION_LENGTH,
                 )
             elif isinstance(val2, int):
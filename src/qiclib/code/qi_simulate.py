@@ -22,10 +22,13 @@ Currently, this is only used to figure out the order of recording commands.
 # (In the future we might want to create a real simulator with support for more complex programs)
 from __future__ import annotations
 
+from collections.abc import Iterator
+
 from qiclib.code.qi_command import (
     AssignCommand,
     DeclareCommand,
     ForRangeCommand,
+    IfCommand,
     ParallelCommand,
     PlayReadoutCommand,
     RecordingCommand,
@@ -34,6 +37,7 @@ from qiclib.code.qi_jobs import (
     QiCell,
     QiCommand,
 )
+from qiclib.code.qi_recording_order import RecordingOrder, RecordingPattern
 from qiclib.code.qi_var_definitions import (
     QiCellProperty,
     QiExpression,
@@ -56,6 +60,10 @@ class Simulator:
     Simulate a qicode program.
     Currently, this is only used to determine the execution order of recording commands.
     See :meth:`qiclib.code._simulate_recordings`
+
+    Loops are not executed iteration by iteration, if the recordings within their body do not depend on the
+    iteration. Then, the body is simulated once and its recordings are repeated using a :class:`RecordingPattern`.
+    This is the case unless the body changes variables which (indirectly) determine the bounds of a loop.
     """
 
     class _Unassigned:
@@ -67,10 +75,24 @@ class Simulator:
         # Current state of loop variables
         self.variables: dict[_QiVariableBase, int | Simulator._Unassigned] = {}
 
-        # The order of recordings for a cell
-        self.cell_recordings: dict[QiCell, list[RecordingCommand]] = {}
-        for cell in cells:
-            self.cell_recordings[cell] = []
+        # The executed recordings (with a result box) for each cell
+        self._patterns: dict[QiCell, list[RecordingPattern[RecordingCommand]]] = {
+            cell: [] for cell in cells
+        }
+        self._saved_count: dict[QiCell, int] = dict.fromkeys(cells, 0)
+        # Number of all executed recordings for each cell, including the ones without result box
+        self._recording_count: dict[QiCell, int] = dict.fromkeys(cells, 0)
+
+        # Variables whose values influence the bounds of loops
+        self._bound_variables: set[_QiVariableBase] = set()
+
+    @property
+    def cell_recordings(self) -> dict[QiCell, RecordingOrder[RecordingCommand]]:
+        """The order of recordings with a result box for each cell."""
+        return {
+            cell: RecordingOrder(patterns, self._saved_count[cell])
+            for cell, patterns in self._patterns.items()
+        }
 
     def _eval(self, expr: QiExpression) -> int | _Unassigned:
         if isinstance(expr, _QiConstValue | QiCellProperty):
@@ -111,17 +133,21 @@ class Simulator:
             raise AssertionError("Unknown QiExpression type")
 
     def _simulate(self, commands: list[QiCommand]):
+        self._bound_variables = _bound_variables(commands)
+        self._simulate_body(commands)
+
+    def _simulate_body(self, commands: list[QiCommand]):
         for cmd in commands:
             if isinstance(cmd, PlayReadoutCommand) and cmd.recording is not None:
                 cmd = cmd.recording
 
             if isinstance(cmd, RecordingCommand):
-                if len(self.cell_recordings[cmd.cell]) >= RECORDING_MAX_RAW_SAMPLES:
-                    raise RuntimeError(
-                        f"More than {RECORDING_MAX_RAW_SAMPLES} recordings during job execution."
+                self._add_recordings(cmd.cell, 1)
+                if cmd.result_box is not None:
+                    self._patterns[cmd.cell].append(
+                        RecordingPattern(cmd, self._saved_count[cmd.cell])
                     )
-
-                self.cell_recordings[cmd.cell].append(cmd)
+                    self._saved_count[cmd.cell] += 1
 
             elif isinstance(cmd, DeclareCommand):
                 self.variables[cmd.var] = Simulator.Unassigned
@@ -130,28 +156,113 @@ class Simulator:
                 self.variables[cmd.var] = self._eval(cmd.value)
 
             elif isinstance(cmd, ParallelCommand):
-                self._simulate(cmd.body)
+                self._simulate_body(cmd.body)
 
             elif isinstance(cmd, ForRangeCommand):
-                assert cmd.var in self.variables
-
-                if isinstance(cmd.start, _QiVariableBase):
-                    start_value = self.variables[cmd.start]
-                elif isinstance(cmd.start, _QiConstValue | QiCellProperty):
-                    start_value = cmd.start.value
-                else:
-                    raise AssertionError("unreacheable")
-
-                if isinstance(cmd.end, _QiVariableBase):
-                    end_value = self.variables[cmd.end]
-                elif isinstance(cmd.end, _QiConstValue | QiCellProperty):
-                    end_value = cmd.end.value
-                else:
-                    raise AssertionError("unreacheable")
-
-                assert isinstance(cmd.step, _QiConstValue | QiCellProperty)
-                step_value = cmd.step.value
-
-                for i in range(start_value, end_value, step_value):
-                    self.variables[cmd.var] = i
-                    self._simulate(cmd.body)
+                self._simulate_for_range(cmd)
+
+    def _simulate_for_range(self, cmd: ForRangeCommand):
+        assert cmd.var in self.variables
+
+        if isinstance(cmd.start, _QiVariableBase):
+            start_value = self.variables[cmd.start]
+        elif isinstance(cmd.start, _QiConstValue | QiCellProperty):
+            start_value = cmd.start.value
+        else:
+            raise AssertionError("unreacheable")
+
+        if isinstance(cmd.end, _QiVariableBase):
+            end_value = self.variables[cmd.end]
+        elif isinstance(cmd.end, _QiConstValue | QiCellProperty):
+            end_value = cmd.end.value
+        else:
+            raise AssertionError("unreacheable")
+
+        assert isinstance(cmd.step, _QiConstValue | QiCellProperty)
+        step_value = cmd.step.value
+
+        iterations = range(start_value, end_value, step_value)
+        if _changed_variables(cmd) & self._bound_variables:
+            # The recordings might differ between iterations
+            for i in iterations:
+                self.variables[cmd.var] = i
+                self._simulate_body(cmd.body)
+            return
+
+        if len(iterations) == 0:
+            return
+
+        # Simulate the first iteration and repeat its recordings
+        first_pattern = {
+            cell: len(patterns) for cell, patterns in self._patterns.items()
+        }
+        saved_before = self._saved_count.copy()
+        recordings_before = self._recording_count.copy()
+
+        self.variables[cmd.var] = iterations[0]
+        self._simulate_body(cmd.body)
+        self.variables[cmd.var] = iterations[-1]
+
+        for cell, patterns in self._patterns.items():
+            stride = self._saved_count[cell] - saved_before[cell]
+            patterns[first_pattern[cell] :] = [
+                pattern.repeated(stride, len(iterations))
+                for pattern in patterns[first_pattern[cell] :]
+            ]
+            self._saved_count[cell] = saved_before[cell] + stride * len(iterations)
+            recordings = self._recording_count[cell] - recordings_before[cell]
+            self._recording_count[cell] = recordings_before[cell]
+            self._add_recordings(cell, recordings * len(iterations))
+
+    def _add_recordings(self, cell: QiCell, count: int):
+        self._recording_count[cell] += count
+        if self._recording_count[cell] > RECORDING_MAX_RAW_SAMPLES:
+            raise RuntimeError(
+                f"More than {RECORDING_MAX_RAW_SAMPLES} recordings during job execution."
+            )
+
+
+def _nested_commands(commands: list[QiCommand]) -> Iterator[QiCommand]:
+    for cmd in commands:
+        yield cmd
+        yield from _nested_commands(getattr(cmd, "body", []))
+        if isinstance(cmd, IfCommand):
+            yield from _nested_commands(cmd._else_body)
+
+
+def _changed_variables(for_range: ForRangeCommand) -> set[_QiVariableBase]:
+    """Variables whose values can differ between the iterations of the loop."""
+    changed = {for_range.var}
+    for cmd in _nested_commands(for_range.body):
+        if isinstance(cmd, AssignCommand | DeclareCommand | ForRangeCommand):
+            changed.add(cmd.var)
+    return changed
+
+
+def _bound_variables(commands: list[QiCommand]) -> set[_QiVariableBase]:
+    """Variables which are used as loop bounds, or in the calculation of values assigned to them."""
+    assignments: list[AssignCommand] = []
+    bound: set[_QiVariableBase] = set()
+    loops: list[ForRangeCommand] = []
+    for cmd in _nested_commands(commands):
+        if isinstance(cmd, ForRangeCommand):
+            loops.append(cmd)
+            bound.update(
+                v for v in (cmd.start, cmd.end) if isinstance(v, _QiVariableBase)
+            )
+        elif isinstance(cmd, AssignCommand):
+            assignments.append(cmd)
+
+    changed = True
+    while changed:
+        size = len(bound)
+        for assignment in assignments:
+            if assignment.var in bound:
+                bound.update(assignment.value.contained_variables)
+        for loop in loops:
+            if loop.var in bound:
+                bound.update(
+                    v for v in (loop.start, loop.end) if isinstance(v, _QiVariableBase)
+                )
+        changed = len(bound) != size
+    return bound
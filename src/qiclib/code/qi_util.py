@@ -33,10 +33,7 @@ def _get_for_range_end_value(start, end, step):
     if isinstance(step, _QiConstValue | QiCellProperty):
         step = step.value
 
-    end_val = start
-    for _ in range(start, end, step):
-        end_val += step
-    return end_val
+    return start + len(range(start, end, step)) * step
 
 
 def _get_for_range_iterations(start, end, step):
@@ -59,7 +56,4 @@ def _get_for_range_iterations(start, end, step):
     if isinstance(step, _QiConstValue | QiCellProperty):
         step = step.value
 
-    iterations = 0
-    for _ in range(start, end, step):
-        iterations += 1
-    return iterations
+    return len(range(start, end, step))
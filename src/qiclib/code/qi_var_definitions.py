@@ -25,8 +25,10 @@ from __future__ import annotations
 
 import itertools
 from abc import abstractmethod
-from collections.abc import Iterable, Set
+from collections.abc import Callable, Iterable, Iterator, Set
+from contextlib import contextmanager
 from enum import Enum
+from typing import ClassVar
 
 import qiclib.packages.utility as util
 from qiclib.code.qi_visitor import QiExpressionVisitor
@@ -479,10 +481,41 @@ class QiAmplitudeValue(_QiConstValue):
         self._type_info.set_type(QiType.AMPLITUDE, _TypeDefiningUse.VALUE_DEFINITION)
 
 
+class _QiFoldedValue(_QiConstValue):
+    """Constant computed by constant folding (see :mod:`qiclib.code.analysis.qi_constant_folding`).
+    In contrast to other constants it already holds the integer representation used by the sequencer,
+    because converting it back to a float value of its type and again to an integer can be lossy.
+    """
+
+    def __init__(self, value: int, type: QiType):
+        super().__init__(value)
+        self._type_info.set_type(type, _TypeDefiningUse.VALUE_DEFINITION)
+
+    @property
+    def float_value(self):
+        if self.type == QiType.TIME:
+            return util.conv_cycles_to_time(self._given_value)
+        elif self.type == QiType.FREQUENCY:
+            return util.conv_nco_phase_inc_to_freq(self._given_value)
+        elif self.type == QiType.PHASE:
+            return util.conv_nco_phase_to_phase(self._given_value)
+        else:
+            assert self.type == QiType.AMPLITUDE
+            return self._given_value / (2**15 - 1)
+
+    @property
+    def value(self) -> int:
+        return int(self._given_value)
+
+
 class QiCellProperty(QiExpression):
     """When describing experiments, properties of cells might not yet be defined.Instead, a QiCellProperty object will be generated.
     This object can be used as length definition in WaitCommand and QiPulse"""
 
+    # Called whenever a property is resolved to its value.
+    # Used to trace which properties a compiled program depends on.
+    _resolve_observer: ClassVar[Callable[[QiCellProperty], None] | None] = None
+
     def __init__(self, cell, name: str):
         super().__init__()
         from .qi_jobs import QiCell
@@ -508,6 +541,9 @@ class QiCellProperty(QiExpression):
             return False  # At time of comparison, unresolved property is not equal to o
 
     def __call__(self):
+        if QiCellProperty._resolve_observer is not None:
+            QiCellProperty._resolve_observer(self)
+
         value = self.cell._properties.get(self.name)
 
         if isinstance(value, QiCellProperty) or value is None:
@@ -617,6 +653,17 @@ class QiCellProperty(QiExpression):
         return self
 
 
+@contextmanager
+def _untraced_property_resolution() -> Iterator[None]:
+    """Suspends `QiCellProperty._resolve_observer` for uses of properties which are tracked separately."""
+    observer = QiCellProperty._resolve_observer
+    QiCellProperty._resolve_observer = None
+    try:
+        yield
+    finally:
+        QiCellProperty._resolve_observer = observer
+
+
 class _QiCalcBase(QiExpression):
     """Represents binary and unary operations."""
 
@@ -15,10 +15,10 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """Module containing the ActiveCoolingT1 experiment for the QiController."""
 
-import time
-
 import numpy as np
 
+import qiclib.packages.utility as util
+
 from .t1 import T1
 
 
@@ -113,8 +113,11 @@ class ActiveCoolingT1(T1):
                 self.qic.taskrunner.start_task()
 
                 # Wait until result is available
-                while self.qic.taskrunner.busy:
-                    time.sleep(self.busy_sleep_delay)
+                util.wait_until(
+                    lambda: not self.qic.taskrunner.busy,
+                    timeout=self.wait_timeout,
+                    max_delay=self.busy_sleep_delay,
+                )
 
                 data = self.qic.taskrunner.get_databoxes_INT32()
                 compl = data[0] + 1j * data[1]
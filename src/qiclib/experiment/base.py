@@ -27,8 +27,8 @@ implementing the experiments. This also includes integration with Qkit.
 
 from __future__ import annotations
 
-import time
 import warnings
+from collections.abc import Callable
 from typing import TYPE_CHECKING
 
 import numpy as np
@@ -73,9 +73,13 @@ class BaseExperiment:
         Amount of experiment repetitions for averaging when `use_taskrunner`
         is `True` (defaults to 1, so no repetitions).
     :ivar sleep_delay_while_busy:
-        How long to wait between repeated queries of the experiment status from
-        the Taskrunner. Only relevant when `use_taskrunner = True`.
-        (defaults to 0.2, thus queries the status every 200ms)
+        Maximum time to wait between repeated queries of the experiment status.
+        The status is queried more often at the beginning of each wait, see
+        :func:`qiclib.packages.utility.wait_until`.
+        (defaults to 0.2, thus queries the status at least every 200ms)
+    :ivar wait_timeout:
+        Maximum time in seconds to wait for the QiController to finish an experiment
+        before a `TimeoutError` is raised (defaults to None, thus no limit).
     """
 
     def __init__(self, controller: QiController, cell=0):
@@ -95,6 +99,7 @@ class BaseExperiment:
         self.use_taskrunner = False
         self.iteration_averages = 1
         self.sleep_delay_while_busy = 0.2
+        self.wait_timeout: float | None = None
 
         # Internal attributes
         self._pc_dict: dict[str, int] = {}
@@ -108,7 +113,7 @@ class BaseExperiment:
 
         # If this experiment supports streaming of databoxes
         self._databox_streaming = False
-        self._databoxes: list[list[int]] = []  # Fetched databoxes
+        self._databoxes: list[np.ndarray] = []  # Fetched databoxes
 
         # check if configure was called
         self._configure_called = False
@@ -263,8 +268,7 @@ class BaseExperiment:
 
         # To prevent any further measurements before qubit is in ground state
         # we ensure we wait long enough
-        while self.cell.busy:
-            pass
+        self._wait_while_busy(lambda: self.cell.busy)
 
         # Check if some errors have been missed but do not raise an exception
         self.qic.check_errors(raise_exceptions=False)
@@ -741,8 +745,7 @@ class BaseExperiment:
                 sig_pha[idx] = pha
 
                 # Waiting until sequencer is finished
-                while self.cell.busy:
-                    pass
+                self._wait_while_busy(lambda: self.cell.busy)
 
                 self._iterate_progress(name)
 
@@ -763,12 +766,11 @@ class BaseExperiment:
             if start_callback is not None:
                 start_callback()
 
-            while self.qic.taskrunner.busy:
-                time.sleep(self.sleep_delay_while_busy)
-                # Test if errors happened during execution
-                self.qic.check_errors()
-                # Update the progress bar
-                self._set_progress(self.qic.taskrunner.task_progress, name)
+            self._wait_while_busy(
+                lambda: self.qic.taskrunner.busy,
+                lambda: self._set_progress(self.qic.taskrunner.task_progress, name),
+                check_errors=True,
+            )
 
             self._set_progress(count, name)
         except KeyboardInterrupt:
@@ -802,17 +804,18 @@ class BaseExperiment:
         try:
             if not self._databoxes:
                 # No remaining data from last call -> get new one
-                while self.qic.taskrunner.databoxes_available == 0:
+                def progress():
                     if self.qic.taskrunner.task_done:
                         raise Warning(
                             "Task already finished but no more data. Is Qkit Iteration count right?"
                         )
-                    # Test if errors happened during execution
-                    self.qic.check_errors()
-                    # Update the progress bar
                     self._set_progress(self.qic.taskrunner.task_progress, name)
-                    # Wait before retrying
-                    time.sleep(self.sleep_delay_while_busy)
+
+                self._wait_while_busy(
+                    lambda: self.qic.taskrunner.databoxes_available == 0,
+                    progress,
+                    check_errors=True,
+                )
                 # Retrieve new databoxes
                 self._databoxes = self.qic.taskrunner.get_databoxes_with_mode(
                     mode=data_mode, require_done=False
@@ -850,8 +853,7 @@ class BaseExperiment:
         # TODO shouldnt we also wait for RecModule here?
         if wait_for_ready:
             try:
-                while self.cell.busy:
-                    pass
+                self._wait_while_busy(lambda: self.cell.busy)
             except KeyboardInterrupt:
                 self.cell.sequencer.stop()
                 raise
@@ -867,6 +869,36 @@ class BaseExperiment:
 
         return [(sig_amp, sig_pha)]
 
+    def _wait_while_busy(
+        self,
+        busy: Callable[[], bool],
+        progress: Callable[[], None] | None = None,
+        check_errors: bool = False,
+    ):
+        """Waits until `busy` returns False, see :func:`qiclib.packages.utility.wait_until`.
+
+        :param busy: Function returning if the QiController is still busy.
+        :param progress: Called at each poll to update the progress.
+        :param check_errors:
+            If errors of the QiController should be checked at each poll (raising them).
+
+        :raises TimeoutError: if the QiController is still busy after `wait_timeout`.
+        """
+
+        def on_poll():
+            if check_errors:
+                # Test if errors happened during execution
+                self.qic.check_errors()
+            if progress is not None:
+                progress()
+
+        util.wait_until(
+            lambda: not busy(),
+            timeout=self.wait_timeout,
+            on_poll=on_poll,
+            max_delay=self.sleep_delay_while_busy,
+        )
+
     ################################################
     # Internal QKIT progress bar handling
     ################################################
@@ -16,9 +16,10 @@
 from __future__ import annotations
 
 import math
-import time
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, fields
+from typing import Any
 
 import numpy as np
 
@@ -31,16 +32,17 @@ import qiclib.packages.grpc.qic_unitcell_pb2 as unitcell_proto
 import qiclib.packages.grpc.sequencer_pb2 as sequencer_proto
 from qiclib.code.qi_jobs import QiCell, QiCoupler
 from qiclib.code.qi_pulse import QiPulse
+from qiclib.code.qi_result import QiResult
 from qiclib.code.qi_sequencer import ForRangeEntry, Sequencer
 from qiclib.code.qi_types import QiType
 from qiclib.code.qi_var_definitions import _QiVariableBase
 from qiclib.experiment.base import BaseExperiment, ExperimentReadout
-from qiclib.experiment.qicode.data_handler import DataHandler
+from qiclib.experiment.qicode.data_handler import DataHandler, StreamDataHandler
 from qiclib.experiment.qicode.data_provider import DataProvider
 from qiclib.hardware.controller import QiController
 from qiclib.hardware.pulsegen import TriggerSet
 from qiclib.hardware.taskrunner import TaskRunner
-from qiclib.hardware.unitcell import DataCollection
+from qiclib.hardware.unitcell import DataCollection, UnitCell
 from qiclib.packages import utility as util
 from qiclib.packages.constants import CONTROLLER_SAMPLE_FREQUENCY_IN_HZ as samplerate
 from qiclib.packages.qkit_polyfill import SampleObject
@@ -68,6 +70,26 @@ class _TaskrunnerSettings:
                 setattr(self, field.name, value)
 
 
+class CellConfigurationError(RuntimeError):
+    """Raised if the configuration of one or more digital unit cells failed while
+    configuring them concurrently.
+
+    :param errors:
+        A list of tuples containing the index of the digital unit cell, the name of the
+        configuration step and the raised exception, ordered by the cells of the job.
+    """
+
+    def __init__(self, errors: list[tuple[int, str, Exception]]):
+        self.errors = errors
+        super().__init__(
+            "Configuration failed for the following cells:\n"
+            + "\n".join(
+                f"  Cell {cell} ({step}): {type(error).__name__}: {error}"
+                for cell, step, error in errors
+            )
+        )
+
+
 class QiCodeExperiment(BaseExperiment):
     """Experiment generating Pulses after the pattern of a predefined QiCode instruction List.
 
@@ -108,6 +130,10 @@ class QiCodeExperiment(BaseExperiment):
 
         self._job_representation = "Unknown QiCodeExperiment"
 
+        # Number of cells configured concurrently by a pool of threads (opt-in).
+        # Failures are reported together as CellConfigurationError.
+        self.parallel_configuration = 1
+
         self._taskrunner: _TaskrunnerSettings | None = None
         self._update_taskrunner_settings_and_data_handler()
 
@@ -179,6 +205,13 @@ class QiCodeExperiment(BaseExperiment):
                 TaskRunner.DataMode.UINT32,
                 converter_pass_through,
             ),
+            "state_counts": _TaskrunnerSettings(
+                "qicode/state_collect.c",
+                "QiCode[States]",
+                params,
+                TaskRunner.DataMode.UINT32,
+                converter_pass_through,
+            ),
             "counts": _TaskrunnerSettings(
                 "qicode/state_count.c",
                 "QiCode[Counts]",
@@ -215,6 +248,37 @@ class QiCodeExperiment(BaseExperiment):
         for idx, sample_cell in enumerate(self.cell_list):
             yield idx, sample_cell, self.qic.cell[self.cell_map[idx]]
 
+    def _for_each_cell(
+        self, step: str, configure: Callable[[int, QiCell, UnitCell], None]
+    ):
+        """Calls `configure` with the entries of `cell_iterator`.
+
+        Depending on `parallel_configuration`, the cells are processed one after the
+        other or concurrently.
+
+        :param step: The name of the configuration step used for error reporting.
+        :param configure: The function configuring a single cell.
+        """
+        cells = list(self.cell_iterator())
+        workers = min(self.parallel_configuration, len(cells))
+        if workers <= 1:
+            for index, cell, qic_cell in cells:
+                configure(index, cell, qic_cell)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(configure, index, cell, qic_cell)
+                for index, cell, qic_cell in cells
+            ]
+        errors = [
+            (self.cell_map[index], step, future.exception())
+            for index, future in enumerate(futures)
+            if future.exception() is not None
+        ]
+        if errors:
+            raise CellConfigurationError(errors) from errors[0][2]
+
     def coupling_iterator(self):
         for idx, coupler in enumerate(self.couplers):
             yield coupler, self.qic.pulse_players[self.coupler_map[idx]]
@@ -227,7 +291,8 @@ class QiCodeExperiment(BaseExperiment):
 
         :raises Exception: if one uses more than 13 different readout pulses within the sequence.
         """
-        for _, cell, qic_cell in self.cell_iterator():
+
+        def configure(_, cell: QiCell, qic_cell: UnitCell):
             if len(cell.readout_pulses) > 13:
                 raise RuntimeError(
                     "Number of readouts exceeded 13. Your program uses too many different pulses."
@@ -256,13 +321,16 @@ class QiCodeExperiment(BaseExperiment):
             qic_cell.recording.recording_duration = cell.recording_length
             qic_cell.recording.trigger_offset = cell.initial_recording_offset
 
+        self._for_each_cell("readout", configure)
+
     def _configure_drive_pulses(self):
         """Overwrites the _configure_drive_pulses method of BaseExperiment class.
         loads manipulation pulses of the QiCell in successive manipulation triggersets.
 
         :raises Exception: if one uses more than 13 different manipulation pulses within the sequence.
         """
-        for _, cell, qic_cell in self.cell_iterator():
+
+        def configure(_, cell: QiCell, qic_cell: UnitCell):
             if len(cell.manipulation_pulses) > 13:
                 raise RuntimeError(
                     "Number of pulses exceeded 13. Your program uses too many different pulses."
@@ -285,14 +353,18 @@ class QiCodeExperiment(BaseExperiment):
             except AttributeError:
                 pass  # No manipulation pulses present -> just leave the current setting
 
+        self._for_each_cell("drive pulses", configure)
+
     def _configure_digital_triggers(self):
-        for _, cell, qic_cell in self.cell_iterator():
+        def configure(_, cell: QiCell, qic_cell: UnitCell):
             qic_cell.digital_trigger.clear_trigger_sets()
             for index, trig_set in enumerate(cell.digital_trigger_sets):
                 # In the array, triggers are indexed starting from 0. However, index 0 is reserved and cannot be used.
                 # Therefore, we start at index # 1. This is also accounted for in QiCell.add_digital_trigger()
                 qic_cell.digital_trigger.set_trigger_set(index + 1, trig_set)
 
+        self._for_each_cell("digital triggers", configure)
+
     def _configure_couplers(self):
         for coupler, pulse_player in self.coupling_iterator():
             pulse_player.reset()
@@ -304,11 +376,14 @@ class QiCodeExperiment(BaseExperiment):
         """Overwrites the _configure_sequences method of BaseExperiment class.
         This function generates the assembler code for the sequencer and loads it on the platform.
         """
-        for index, _, qic_cell in self.cell_iterator():
+
+        def configure(index: int, _, qic_cell: UnitCell):
             qic_cell.sequencer.load_program_code(self._seq_instructions[index])
             if len(self._initial_memory[index]) > 0:
                 qic_cell.storage.write_raw_memory(0, self._initial_memory[index])
 
+        self._for_each_cell("sequences", configure)
+
         # Update the string representation of the last job in the QiController
         self.qic._last_qijob = self._job_representation
 
@@ -415,16 +490,15 @@ class QiCodeExperiment(BaseExperiment):
             if start_callback is not None:
                 start_callback()
 
-            while self.qic.taskrunner.busy:
-                time.sleep(self.sleep_delay_while_busy)
-                # Test if errors happened during execution
-                self.qic.check_errors()
-
-                # Update the progress bar
+            def progress():
                 self._set_progress(self.qic.taskrunner.task_progress, "Averages")
                 if total > 1:
                     self._set_progress(self.get_current_loop(), name)
 
+            self._wait_while_busy(
+                lambda: self.qic.taskrunner.busy, progress, check_errors=True
+            )
+
             # Finish progress bar
             self._set_progress(count, "Averages")
             if total > 1:
@@ -497,15 +571,11 @@ class QiCodeExperiment(BaseExperiment):
         :raises Exception: if IQ_frequency is given. Thus it has to be modified in the pulse_generator
         """
 
-        envelope = pulse(samplerate)
+        # padded to a multiple of 4 samples
+        envelope = pulse._padded_envelope(samplerate)
         # check if holding the last value of the amplitude array.
         hold = pulse.is_variable_length or pulse.hold
 
-        if len(envelope) % 4 != 0:
-            # adds fill values to the end of the pulse if its not multiple of 4
-            fill = envelope[-1] if hold else 0.0
-            envelope = np.append(envelope, [fill] * (4 - len(envelope) % 4))
-
         # If phase is a constant phase = pulse.phase, otherwise phase = 0
         if isinstance(pulse.phase, _QiVariableBase):
             phase = 0
@@ -516,53 +586,108 @@ class QiCodeExperiment(BaseExperiment):
             envelope, hold=hold, shift_phase=pulse.shift_phase, phase=phase
         )
 
+    def _switch_local_oscillators(self, on: bool):
+        """Turns the output of every module on or off."""
+        try:
+            for _, _, qic_cell in self.cell_iterator():
+                if on:
+                    qic_cell.readout.local_oscillator.on()
+                    qic_cell.manipulation.local_oscillator.on()
+                else:
+                    qic_cell.readout.local_oscillator.off()
+                    qic_cell.manipulation.local_oscillator.off()
+        except AttributeError:
+            pass
+
     def run(self, start_lo: bool = True):
         self.configure()
 
         if start_lo:
-            # turn on the output for every module
-            try:
-                for _, _, qic_cell in self.cell_iterator():
-                    qic_cell.readout.local_oscillator.on()
-                    qic_cell.manipulation.local_oscillator.on()
-            except AttributeError:
-                pass
+            self._switch_local_oscillators(True)
 
         try:
             result = self.record()
         finally:
             if start_lo:
-                # turn off the output for every module
-                try:
-                    for _, _, qic_cell in self.cell_iterator():
-                        qic_cell.readout.local_oscillator.off()
-                        qic_cell.manipulation.local_oscillator.off()
-                except AttributeError:
-                    pass
+                self._switch_local_oscillators(False)
 
         return result
 
+    def stream(self, start_lo: bool = True) -> Iterator[dict[QiResult, Any]]:
+        """Runs the experiment and yields the result data while it is running.
+
+        Each element contains the data of one streamed chunk, already assigned to the
+        QiResult it belongs to. The data is not accumulated, neither here nor in the
+        QiResults of the cells, so arbitrarily long experiments can be streamed with
+        bounded memory. Closing the iterator early stops the experiment.
+
+        :param start_lo: If the local oscillators should be turned on during the run.
+
+        :raises NotImplementedError:
+            if the data collection mode does not support streaming or if the
+            experiment uses the Taskrunner.
+        """
+        handler_class = StreamDataHandler.get_factory_by_name(self._data_collection)
+        if handler_class is None or self.use_taskrunner:
+            options = ", ".join(StreamDataHandler.names())
+            raise NotImplementedError(
+                f"Streaming is not supported for data collection '{self._data_collection}'"
+                f"{' with the Taskrunner' if self.use_taskrunner else ''} "
+                f"(supported settings: {options})"
+            )
+        handler = handler_class(self.cell_list, self.averages)
+
+        self.configure()
+        if start_lo:
+            self._switch_local_oscillators(True)
+        try:
+            self.qic.clear_errors()
+            for _, _, qic_cell in self.cell_iterator():
+                qic_cell.readout.nco_enable(True)
+                qic_cell.manipulation.nco_enable(True)
+                qic_cell.sequencer.averages = 1
+                qic_cell.sequencer.start_address = 0
+
+            try:
+                for _, chunk in self.qic.cell.stream_experiment(
+                    averages=self.averages,
+                    cells=self.cell_map,
+                    recordings=[
+                        cell.get_number_of_recordings() for cell in self.cell_list
+                    ],
+                    data_collection=self._data_collection,
+                ):
+                    update = handler.process_chunk(chunk)
+                    if update:
+                        yield update
+            finally:
+                for _, _, qic_cell in self.cell_iterator():
+                    qic_cell.sequencer.stop()
+                    qic_cell.readout.nco_enable(False)
+                    qic_cell.manipulation.nco_enable(False)
+
+            # To prevent any further measurements before qubit is in ground state
+            # we ensure we wait long enough
+            self._wait_while_busy(lambda: self.qic.cell.busy)
+
+            # Check if some errors have been missed but do not raise an exception
+            self.qic.check_errors(raise_exceptions=False)
+        finally:
+            if start_lo:
+                self._switch_local_oscillators(False)
+
     def _pulse_to_grpc_pulse(self, triggerset, pulse):
-        envelope = pulse(samplerate)
+        # padded to a multiple of 4 samples, the Q part is empty for real envelopes
+        pulseform_i, pulseform_q = pulse._iq_envelope(samplerate)
         # check if holding the last value of the amplitude array.
         hold = pulse.is_variable_length or pulse.hold
 
-        if len(envelope) % 4 != 0:
-            # adds fill values to the end of the pulse if its not multiple of 4
-            fill = envelope[-1] if hold else 0.0
-            envelope = np.append(envelope, [fill] * (4 - len(envelope) % 4))
-
         # If phase is a constant phase = pulse.phase, otherwise phase = 0
         if isinstance(pulse.phase, _QiVariableBase):
             phase = 0
         else:
             phase = pulse.phase
 
-        pulseform_i = np.real(envelope)
-        pulseform_q = np.imag(envelope)
-        if not np.any(pulseform_q):
-            # No imaginary part present, so only real envelope
-            pulseform_q = []
         return pulsegen_proto.Pulse(
             index=pulsegen_proto.IndexSet(
                 cindex=dt.EndpointIndex(value=0),
@@ -681,6 +806,18 @@ class QiCodeExperiment(BaseExperiment):
 
         return job
 
+    def prepare_submission(self) -> unitcell_proto.Job:
+        """Returns the job description including all experiment parameters so it
+        can be submitted, e.g. using `qiclib.hardware.unitcell.UnitCells.submit_batch`.
+        """
+        return self.qic.cell.prepare_job(
+            self.to_protobuf(),
+            averages=self.averages,
+            cells=self.cell_map,
+            recordings=[cell.get_number_of_recordings() for cell in self.cell_list],
+            data_collection=self._data_collection,
+        )
+
     def submit(self):
         return self.qic.cell.submit(
             self.to_protobuf(),
@@ -728,8 +865,7 @@ class QiCodeExperiment(BaseExperiment):
 
         # To prevent any further measurements before qubit is in ground state
         # we ensure we wait long enough
-        while self.qic.cell.busy:
-            pass
+        self._wait_while_busy(lambda: self.qic.cell.busy)
 
         # Check if some errors have been missed but do not raise an exception
         self.qic.check_errors(raise_exceptions=False)
@@ -16,12 +16,14 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from collections.abc import Callable, Iterator
 from typing import TYPE_CHECKING, Any, Protocol
 
 import numpy as np
+import numpy.typing as npt
 
+from ...code.qi_recording_order import RecordingOrder
+from ...packages.utility import count_states, unpack_states
 from .data_provider import DataProvider
 
 if TYPE_CHECKING:
@@ -66,12 +68,15 @@ class DataHandler(ABC):
                 data_provider, cell_list
             ),
             "states": _StateDataHandler,
+            "state_counts": lambda data_provider, cell_list, averages: (
+                _StateDataHandler(data_provider, cell_list, averages, counts_only=True)
+            ),
             "counts": lambda data_provider, cell_list, _: _CountDataHandler(
                 data_provider, cell_list
             ),
-            "quantum_jumps": lambda data_provider,
-            cell_list,
-            _: _QuantumJumpsDataHandler(data_provider, cell_list),
+            "quantum_jumps": lambda data_provider, cell_list, _: (
+                _QuantumJumpsDataHandler(data_provider, cell_list)
+            ),
             "custom": lambda data_provider, cell_list, _: _NotImplementedDataHandler(
                 data_provider, cell_list
             ),
@@ -121,48 +126,58 @@ class _StandardDataHandler(DataHandler):
         """
 
 
-class _DefaultDataHandler(_StandardDataHandler):
-    def process_cell_results(self, cell_index: int, cell: QiCell, count: int):
-        distributed_result: dict[QiResult, tuple[list[Any], list[Any]]] = defaultdict(
-            lambda: ([], [])
-        )
-        for i in range(count):
-            box: QiResult = cell._result_recording_order[i]
+def _recordings_per_box(
+    cell: QiCell, count: int
+) -> dict[QiResult, slice | npt.NDArray[np.intp]]:
+    """
+    Groups the recordings of a cell by the QiResult they are stored in.
 
-            distributed_result[box][0].append(
-                self.data_provider.get_default_i(cell_index, i)
-            )
-            distributed_result[box][1].append(
-                self.data_provider.get_default_q(cell_index, i)
-            )
+    The indices of each box are returned as slice if they are evenly spaced, so indexing the result data with them
+    creates a view instead of a copy.
+    """
+    order = cell._result_recording_order
+    if isinstance(order, RecordingOrder):
+        return {
+            box: _as_slice(indices)
+            for box, indices in order.indices_per_item(count).items()
+        }
 
-        for box, values in distributed_result.items():
-            box.data = [
-                np.array(values[0], dtype=np.float64),
-                np.array(values[1], dtype=np.float64),
-            ]
+    order = order[:count]
+    box_ids: dict[QiResult, int] = {}
+    index = np.fromiter(
+        (box_ids.setdefault(box, len(box_ids)) for box in order),
+        dtype=np.intp,
+        count=len(order),
+    )
+    sorter = np.argsort(index, kind="stable")
+    bounds = np.searchsorted(index[sorter], np.arange(len(box_ids) + 1))
+    return {
+        box: _as_slice(sorter[bounds[box_id] : bounds[box_id + 1]])
+        for box, box_id in box_ids.items()
+    }
+
+
+def _as_slice(indices: npt.NDArray[np.intp]) -> slice | npt.NDArray[np.intp]:
+    if len(indices) == 1:
+        return slice(indices[0], indices[0] + 1)
+    step = indices[1] - indices[0]
+    if np.all(np.diff(indices) == step):
+        return slice(indices[0], indices[-1] + 1, step)
+    return indices
 
 
-class _AmplitudePhaseDataHandler(_StandardDataHandler):
+class _DefaultDataHandler(_StandardDataHandler):
     def process_cell_results(self, cell_index: int, cell: QiCell, count: int):
-        distributed_result: dict[QiResult, tuple[list[Any], list[Any]]] = defaultdict(
-            lambda: ([], [])
-        )
-        for i in range(count):
-            box: QiResult = cell._result_recording_order[i]
+        i_values, q_values = self.data_provider.get_default(cell_index, count)
+        for box, recordings in _recordings_per_box(cell, count).items():
+            box.data = [i_values[recordings], q_values[recordings]]
 
-            distributed_result[box][0].append(
-                self.data_provider.get_amp_pha_i(cell_index, i)
-            )
-            distributed_result[box][1].append(
-                self.data_provider.get_amp_pha_q(cell_index, i)
-            )
 
-        for box, values in distributed_result.items():
-            box.data = [
-                np.array(values[0], dtype=np.float64),
-                np.array(values[1], dtype=np.float64),
-            ]
+class _AmplitudePhaseDataHandler(_StandardDataHandler):
+    def process_cell_results(self, cell_index: int, cell: QiCell, count: int):
+        i_values, q_values = self.data_provider.get_amp_pha(cell_index, count)
+        for box, recordings in _recordings_per_box(cell, count).items():
+            box.data = [i_values[recordings], q_values[recordings]]
 
 
 class _RawDataHandler(_StandardDataHandler):
@@ -177,40 +192,33 @@ class _RawDataHandler(_StandardDataHandler):
 
 class _IQCloudDataHandler(_StandardDataHandler):
     def process_cell_results(self, cell_index: int, cell: QiCell, count: int):
-        distributed_result: dict[QiResult, list] = defaultdict(list)
-        for i in range(count):
-            box: QiResult = cell._result_recording_order[i]
-
-            distributed_result[box].append(
-                np.stack(
-                    (
-                        self.data_provider.get_iq_cloud_i(cell_index, i, count),
-                        self.data_provider.get_iq_cloud_q(cell_index, i, count),
-                    ),
-                )
-            )
-
-        for box, values in distributed_result.items():
-            box.data = np.asarray(values).swapaxes(0, 1).squeeze()
+        # Shape (2, count, shots)
+        clouds = self.data_provider.get_iq_cloud(cell_index, count)
+        for box, recordings in _recordings_per_box(cell, count).items():
+            box.data = clouds[:, recordings].squeeze()
 
 
 class _StateDataHandler(_StandardDataHandler):
+    """Stores the state of each shot, or only how often each state occurred if `counts_only` is set.
+    Counting skips unpacking the states of all shots and is used by the data collection mode "state_counts"."""
+
     def __init__(
-        self, data_provider: DataProvider, cell_list: list[QiCell], averages: int
+        self,
+        data_provider: DataProvider,
+        cell_list: list[QiCell],
+        averages: int,
+        counts_only: bool = False,
     ):
         super().__init__(data_provider, cell_list)
         self.averages = averages
+        self.counts_only = counts_only
 
     def process_cell_results(self, cell_index: int, cell: QiCell, count: int):
         # Each data box contains the states obtained from one cell
         # States are compressed as 3bits in 32bit unsigned integers
-        data = [
-            (value >> (3 * i)) & 0b111
-            for value in self.data_provider.get_states(cell_index)
-            for i in range(10)
-        ][
-            0 : self.averages  # Last value maybe only partially filled
-        ]
+        # Last value maybe only partially filled
+        extract = count_states if self.counts_only else unpack_states
+        data = extract(self.data_provider.get_states(cell_index), count=self.averages)
         # There has to be only exactly one box.
         box: QiResult = cell._result_recording_order[0]
         box.data = data
@@ -237,7 +245,8 @@ class _QuantumJumpsDataHandler(_StandardDataHandler):
             "a real qubit."
         )
         box = cell._result_recording_order[-1]
-        box.data = self.data_provider.get_states(cell_index)  # state
+        # States are compressed as single bits in 32bit unsigned integers
+        box.data = unpack_states(self.data_provider.get_states(cell_index), dense=True)
 
 
 class _NotImplementedDataHandler(DataHandler):
@@ -257,3 +266,117 @@ class _CustomDataHandlerWrapper(DataHandler):
 
     def process_results(self):
         self.custom_data_handler(self.cell_list, self.data_provider)
+
+
+class StreamDataHandler(ABC):
+    """
+    Counterpart to :class:`DataHandler` which demultiplexes the result data chunk by chunk while the experiment is
+    still running.
+
+    The data is not stored in the QiResults of the cells. Instead, :meth:`process_chunk` returns the data of a single
+    chunk assigned to the QiResults it belongs to. Only the position within the data stream of each cell is kept
+    between chunks, so the required memory does not grow with the number of shots.
+
+    :param cell_list: the cells of the job
+    :param averages: the number of repetitions of the experiment
+    """
+
+    @staticmethod
+    def _stream_handler_factories() -> dict[str, type[StreamDataHandler]]:
+        return {
+            "iqcloud": _IQCloudStreamHandler,
+            "states": _StateStreamHandler,
+            "quantum_jumps": _QuantumJumpsStreamHandler,
+        }
+
+    @staticmethod
+    def names() -> Iterator[str]:
+        return StreamDataHandler._stream_handler_factories().keys()
+
+    @classmethod
+    def get_factory_by_name(cls, name: str) -> type[StreamDataHandler] | None:
+        return StreamDataHandler._stream_handler_factories().get(name)
+
+    def __init__(self, cell_list: list[QiCell], averages: int):
+        self.cell_list = cell_list
+        self.averages = averages
+        # Number of values of each cell which have already been processed
+        self._offsets = [0] * len(cell_list)
+
+    def process_chunk(self, chunk: list) -> dict[QiResult, Any]:
+        """
+        Assigns the data of one chunk to the QiResults.
+
+        :param chunk: The data of all cells received with one message, in the format of
+            :meth:`qiclib.hardware.unitcell.UnitCells.stream_experiment`
+        :return: The new data for each QiResult which received some
+        """
+        updates: dict[QiResult, Any] = {}
+        for cell_index, cell in enumerate(self.cell_list):
+            count: int = cell.get_number_of_recordings()
+            if count == 0 or cell_index >= len(chunk):
+                continue
+            updates.update(
+                self.process_cell_chunk(cell_index, cell, count, chunk[cell_index])
+            )
+        return updates
+
+    @abstractmethod
+    def process_cell_chunk(
+        self, cell_index: int, cell: QiCell, count: int, data
+    ) -> dict[QiResult, Any]:
+        """
+        Process one chunk of data of one cell.
+
+        :param cell_index: Index of the cell
+        :param cell: The QiCell the data belongs to
+        :param count: The number of recordings
+        :param data: The chunk of data of this cell
+        :return: The new data for each QiResult of this cell
+        """
+
+
+class _IQCloudStreamHandler(StreamDataHandler):
+    def process_cell_chunk(
+        self, cell_index: int, cell: QiCell, count: int, data
+    ) -> dict[QiResult, Any]:
+        i_values, q_values = data
+        offset = self._offsets[cell_index]
+        self._offsets[cell_index] += len(i_values)
+
+        # Values are interleaved by recording, continuing where the last chunk ended
+        recordings = (np.arange(len(i_values)) + offset) % count
+        indices = np.arange(count)
+
+        updates: dict[QiResult, Any] = {}
+        for box, box_recordings in _recordings_per_box(cell, count).items():
+            mask = np.isin(recordings, indices[box_recordings])
+            if np.any(mask):
+                updates[box] = np.stack((i_values[mask], q_values[mask]))
+        return updates
+
+
+class _StateStreamHandler(StreamDataHandler):
+    def process_cell_chunk(
+        self, cell_index: int, cell: QiCell, count: int, data
+    ) -> dict[QiResult, Any]:
+        # States are compressed as 3bits in 32bit unsigned integers
+        # Last value maybe only partially filled
+        states = unpack_states(
+            data, count=max(self.averages - self._offsets[cell_index], 0)
+        )
+        self._offsets[cell_index] += len(states)
+        if len(states) == 0:
+            return {}
+        # There has to be only exactly one box.
+        return {cell._result_recording_order[0]: states}
+
+
+class _QuantumJumpsStreamHandler(StreamDataHandler):
+    def process_cell_chunk(
+        self, cell_index: int, cell: QiCell, count: int, data
+    ) -> dict[QiResult, Any]:
+        self._offsets[cell_index] += len(data)
+        if len(data) == 0:
+            return {}
+        return {cell._result_recording_order[-1]: unpack_states(data, dense=True)}
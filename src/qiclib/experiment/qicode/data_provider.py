@@ -69,6 +69,40 @@ class DataProvider(ABC):
     ) -> npt.NDArray[np.int32]:
         pass
 
+    def get_default(
+        self, cell_index: int, recording_count: int
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """
+        Returns the I and Q values of all recordings of the cell at once.
+        """
+        return (
+            np.asarray(self.get_raw_i(cell_index), dtype=np.float64)[:recording_count],
+            np.asarray(self.get_raw_q(cell_index), dtype=np.float64)[:recording_count],
+        )
+
+    def get_amp_pha(
+        self, cell_index: int, recording_count: int
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        return self.get_default(cell_index, recording_count)
+
+    def get_iq_cloud(self, cell_index: int, recording_count: int) -> npt.NDArray:
+        """
+        Returns the IQ clouds of all recordings of the cell at once.
+
+        :return: array of shape (2, recording_count, shots) containing the I and Q values
+        """
+        return np.stack(
+            [
+                np.stack(
+                    [
+                        getter(cell_index, index, recording_count)
+                        for index in range(recording_count)
+                    ]
+                )
+                for getter in (self.get_iq_cloud_i, self.get_iq_cloud_q)
+            ]
+        )
+
     def get_states(self, cell_index: int):
         return self._result[cell_index]
 
@@ -93,6 +127,15 @@ class _TaskrunnerDataProvider(DataProvider):
     def get_amp_pha_q(self, cell_index: int, index: int):
         return self._result[cell_index][1][index]
 
+    def get_amp_pha(
+        self, cell_index: int, recording_count: int
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        i_values, q_values = self._result[cell_index][:2]
+        return (
+            np.asarray(i_values, dtype=np.float64)[:recording_count],
+            np.asarray(q_values, dtype=np.float64)[:recording_count],
+        )
+
     def get_iq_cloud_i(
         self, cell_index: int, index: int, recording_count: int
     ) -> npt.NDArray[np.int32]:
@@ -103,6 +146,12 @@ class _TaskrunnerDataProvider(DataProvider):
     ) -> npt.NDArray[np.int32]:
         return self._result[recording_count * cell_index + index][1::2]
 
+    def get_iq_cloud(self, cell_index: int, recording_count: int) -> npt.NDArray:
+        first = recording_count * cell_index
+        # One databox per recording with interleaved I and Q values
+        boxes = np.asarray(self._result[first : first + recording_count])
+        return np.stack((boxes[:, 0::2], boxes[:, 1::2]))
+
 
 class _InternalPluginDataProvider(DataProvider):
     """
@@ -130,3 +179,15 @@ class _InternalPluginDataProvider(DataProvider):
     ) -> npt.NDArray[np.int32]:
         data = self._result[cell_index][1]
         return self._get_iq_cloud(data, index, recording_count)
+
+    def get_iq_cloud(self, cell_index: int, recording_count: int) -> npt.NDArray:
+        i_values, q_values = (np.asarray(v) for v in self._result[cell_index][:2])
+        if i_values.size % recording_count or q_values.size != i_values.size:
+            return super().get_iq_cloud(cell_index, recording_count)
+        # Recordings are interleaved, so each column holds the values of one recording
+        return np.stack(
+            (
+                i_values.reshape(-1, recording_count).T,
+                q_values.reshape(-1, recording_count).T,
+            )
+        )
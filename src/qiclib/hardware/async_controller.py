@@ -0,0 +1,355 @@
+# Copyright© 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""This module contains an asynchronous client for the QiController based on `grpc.aio`.
+
+The drivers in `qiclib.hardware.controller` perform one blocking remote procedure call
+after the other. When configuring multiple digital unit cells, the latency of these
+calls adds up. The `AsyncQiController` provides awaitable versions of the calls which
+are performed most frequently when running experiments. Together with
+:python:`asyncio.gather`, all cells can then be configured concurrently.
+
+The `AsyncQiController` does not replace the `qiclib.hardware.controller.QiController`
+but is created from an existing instance of it. This way, the information about the
+available modules of the platform does not have to be queried again.
+
+Example
+-------
+
+.. code-block:: python
+
+    qic = QiController("ip-address")
+
+
+    async def configure(programs: dict[int, list[int]]):
+        async with AsyncQiController(qic) as aqic:
+            await asyncio.gather(
+                *(
+                    aqic.cell[cell].sequencer.load_program_code(program)
+                    for cell, program in programs.items()
+                )
+            )
+
+
+    asyncio.run(configure(programs))
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from typing import TYPE_CHECKING, overload
+
+import numpy.typing as npt
+
+import qiclib.packages.grpc.datatypes_pb2 as dt
+import qiclib.packages.grpc.pulsegen_pb2 as pulsegen_proto
+import qiclib.packages.grpc.pulsegen_pb2_grpc as pulsegen_stub
+import qiclib.packages.grpc.qic_storage_pb2 as storage_proto
+import qiclib.packages.grpc.qic_storage_pb2_grpc as storage_stub
+import qiclib.packages.grpc.qic_unitcell_pb2 as unitcell_proto
+import qiclib.packages.grpc.qic_unitcell_pb2_grpc as unitcell_stub
+import qiclib.packages.grpc.sequencer_pb2 as sequencer_proto
+import qiclib.packages.grpc.sequencer_pb2_grpc as sequencer_stub
+import qiclib.packages.grpc.taskrunner_pb2_grpc as taskrunner_stub
+from qiclib.hardware.pulsegen import _pulse_message
+from qiclib.hardware.taskrunner import TaskRunner, _assemble_databoxes
+from qiclib.hardware.unitcell import (
+    _DATA_COLLECTION_MODES,
+    DataCollection,
+    UnitCell,
+    UnitCells,
+    _ResultCollector,
+    _results_from_arrays,
+)
+from qiclib.packages.servicehub import AsyncConnection, AsyncServiceHubCall
+
+if TYPE_CHECKING:
+    from qiclib.hardware.controller import QiController
+    from qiclib.hardware.pulsegen import PulseGen
+    from qiclib.hardware.sequencer import Sequencer
+    from qiclib.hardware.storage import Storage
+
+
+class AsyncSequencer:
+    """Asynchronous counterpart of `qiclib.hardware.sequencer.Sequencer`."""
+
+    def __init__(self, connection: AsyncConnection, sequencer: Sequencer):
+        self._conn = connection
+        self._sequencer = sequencer
+        self._component = sequencer._component
+
+    @property
+    def _stub(self) -> sequencer_stub.SequencerServiceStub:
+        return self._conn.stub(sequencer_stub.SequencerServiceStub)
+
+    @AsyncServiceHubCall(errormsg="Could not load the program onto the Sequencer")
+    async def load_program_code(self, program_data, description="No Description"):
+        """Loads the program data into the sequencer module on the QiController.
+
+        See `qiclib.hardware.sequencer.Sequencer.load_program_code`.
+        """
+        await self._stub.LoadProgram(
+            sequencer_proto.Program(
+                index=self._component,
+                program_data=program_data,
+                description=description,
+            )
+        )
+        self._sequencer._program_description = description
+
+
+class AsyncStorage:
+    """Asynchronous counterpart of `qiclib.hardware.storage.Storage`."""
+
+    def __init__(self, connection: AsyncConnection, storage: Storage):
+        self._conn = connection
+        self._component = storage._component
+
+    @property
+    def _stub(self) -> storage_stub.StorageStub:
+        return self._conn.stub(storage_stub.StorageStub)
+
+    @AsyncServiceHubCall(errormsg="Could not write into the Storage memory")
+    async def write_raw_memory(self, address: int, values: list[int]):
+        """Writes the values into the storage memory starting at the given address.
+
+        See `qiclib.hardware.storage.Storage.write_raw_memory`.
+        """
+        await self._stub.WriteData(
+            storage_proto.WriteDataRequest(
+                index=self._component, address=address, data=values
+            )
+        )
+
+
+class AsyncPulseGen:
+    """Asynchronous counterpart of `qiclib.hardware.pulsegen.PulseGen`."""
+
+    def __init__(self, connection: AsyncConnection, pulsegen: PulseGen):
+        self._conn = connection
+        self._component = pulsegen._component
+
+    @property
+    def _stub(self) -> pulsegen_stub.PulseGenServiceStub:
+        return self._conn.stub(pulsegen_stub.PulseGenServiceStub)
+
+    @AsyncServiceHubCall(errormsg="Could not load the pulse into the Triggerset.")
+    async def load_pulse(
+        self,
+        triggerset: int,
+        pulseform: npt.ArrayLike,
+        phase: float = 0.0,
+        offset: float = 0.0,
+        hold: bool = False,
+        shift_phase: bool = False,
+    ):
+        """Loads a given pulse shape into the trigger set with the given index.
+
+        See `qiclib.hardware.pulsegen.TriggerSet.load_pulse` for the parameters.
+        """
+        indexset = pulsegen_proto.IndexSet(
+            cindex=self._component,
+            tindex=pulsegen_proto.TriggerSetIndex(value=triggerset),
+        )
+        await self._stub.LoadPulse(
+            _pulse_message(indexset, pulseform, phase, offset, hold, shift_phase)
+        )
+
+
+class AsyncUnitCell:
+    """Asynchronous counterpart of `qiclib.hardware.unitcell.UnitCell`."""
+
+    def __init__(self, connection: AsyncConnection, cell: UnitCell):
+        self._sequencer = AsyncSequencer(connection, cell.sequencer)
+        self._readout = AsyncPulseGen(connection, cell.readout)
+        self._manipulation = AsyncPulseGen(connection, cell.manipulation)
+        self._storage = AsyncStorage(connection, cell.storage)
+
+    @property
+    def sequencer(self) -> AsyncSequencer:
+        """Sequencer of this digital unit cell."""
+        return self._sequencer
+
+    @property
+    def readout(self) -> AsyncPulseGen:
+        """Readout signal generator of this digital unit cell."""
+        return self._readout
+
+    @property
+    def manipulation(self) -> AsyncPulseGen:
+        """Manipulation/control signal generator of this digital unit cell."""
+        return self._manipulation
+
+    @property
+    def storage(self) -> AsyncStorage:
+        """Data storage of this digital unit cell."""
+        return self._storage
+
+
+class AsyncUnitCells(Sequence):
+    """Asynchronous counterpart of `qiclib.hardware.unitcell.UnitCells`."""
+
+    def __init__(self, connection: AsyncConnection, cells: UnitCells):
+        self._conn = connection
+        self._cells = [AsyncUnitCell(connection, cell) for cell in cells]
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    @overload
+    def __getitem__(self, key: int) -> AsyncUnitCell: ...
+
+    @overload
+    def __getitem__(self, key: slice) -> list[AsyncUnitCell]: ...
+
+    def __getitem__(self, key: int | slice) -> AsyncUnitCell | list[AsyncUnitCell]:
+        if isinstance(key, slice):
+            return self._cells[key]
+        return self._cells[int(key)]
+
+    @property
+    def _stub(self) -> unitcell_stub.UnitCellServiceStub:
+        return self._conn.stub(unitcell_stub.UnitCellServiceStub)
+
+    @AsyncServiceHubCall(idempotent=False)
+    async def run_experiment(
+        self,
+        averages: int,
+        cells: list[int],
+        recordings: list[int],
+        data_collection: DataCollection = "average",
+        progress_callback: Callable[[int], None] | None = None,
+    ):
+        """Runs the experiment on the hardware and returns the results.
+
+        See `qiclib.hardware.unitcell.UnitCells.run_experiment`.
+        """
+        mode = _DATA_COLLECTION_MODES.get(data_collection)
+        if mode is None:
+            raise Warning("Unknown data collection mode " + data_collection)
+        collector = _ResultCollector()
+        async for progress in self._stub.RunExperiment(
+            unitcell_proto.ExperimentParameters(
+                mode=mode,
+                shots=averages,
+                cells=cells,
+                recordings=recordings,
+            )
+        ):
+            collector.add(progress)
+            if progress_callback:
+                progress_callback(progress.progress)
+        return _results_from_arrays(mode, collector.arrays())
+
+
+class AsyncTaskRunner:
+    """Asynchronous counterpart of `qiclib.hardware.taskrunner.TaskRunner`."""
+
+    def __init__(self, connection: AsyncConnection):
+        self._conn = connection
+
+    @property
+    def _stub(self) -> taskrunner_stub.TaskRunnerServiceStub:
+        return self._conn.stub(taskrunner_stub.TaskRunnerServiceStub)
+
+    @AsyncServiceHubCall(errormsg="Failed to fetch databoxes from taskrunner")
+    async def get_databoxes_with_mode(
+        self, mode=TaskRunner.DataMode.INT32, require_done=True
+    ) -> list[npt.NDArray]:
+        """Retrieves data from a previously started task on the R5.
+
+        See `qiclib.hardware.taskrunner.TaskRunner.get_databoxes_with_mode`.
+        """
+        errors = (await self._stub.GetTaskErrorMessages(dt.Empty())).message[:]
+        if errors:
+            raise RuntimeError(
+                "The following error messages were retrieved "
+                + "from the Taskrunner:\n{}".format("\n".join(errors))
+            )
+
+        if require_done and not (await self._stub.GetTaskState(dt.Empty())).done:
+            raise RuntimeError("Task should be finished prior to fetching data.")
+
+        method_call = TaskRunner._databox_call(self._stub, mode)
+        databoxes = _assemble_databoxes(
+            [databox_reply async for databox_reply in method_call(dt.Empty())],
+            mode.dtype,
+        )
+
+        if require_done and not databoxes:
+            raise RuntimeError(
+                "No data available to fetch. Are you sure the task completed successfully?"
+            )
+
+        return databoxes
+
+
+class AsyncQiController:
+    """Asynchronous client for the QiController.
+
+    It uses its own `grpc.aio` channel which is bound to the event loop it is opened
+    in. Therefore, it should be used as asynchronous context manager (or opened using
+    `AsyncQiController.open`) from within the running event loop.
+
+    :param controller:
+        The QiController instance whose modules should be accessed asynchronously.
+    """
+
+    def __init__(self, controller: QiController):
+        self._qic = controller
+        self._conn = AsyncConnection(
+            ip=controller._conn.ip,
+            port=controller._conn.port,
+            channel_options=controller._conn.channel_options,
+        )
+        self._cell = AsyncUnitCells(self._conn, controller.cell)
+        if controller.taskrunner is not None:
+            self._taskrunner = AsyncTaskRunner(self._conn)
+        else:
+            self._taskrunner = None
+
+    def __str__(self):
+        return f"AsyncQiController({self._conn.ip}:{self._conn.port})"
+
+    async def __aenter__(self) -> AsyncQiController:
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def open(self):
+        """Opens the connection to the QiController within the running event loop."""
+        self._conn.open()
+
+    async def close(self):
+        """Closes the connection to the QiController."""
+        await self._conn.close()
+
+    @property
+    def controller(self) -> QiController:
+        """The synchronous QiController this client was created from."""
+        return self._qic
+
+    @property
+    def cell(self) -> AsyncUnitCells:
+        """The digital unit cells of the QiController."""
+        return self._cell
+
+    @property
+    def taskrunner(self) -> AsyncTaskRunner | None:
+        """The Taskrunner framework of the QiController."""
+        return self._taskrunner
@@ -66,6 +66,7 @@ from __future__ import annotations
 
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import qiclib
 from qiclib.hardware.direct_rf import DirectRf
@@ -80,7 +81,7 @@ from qiclib.hardware.rfdc import RFDataConverter
 from qiclib.hardware.servicehub import ServiceHub
 from qiclib.hardware.taskrunner import TaskRunner
 from qiclib.hardware.unitcell import UnitCells
-from qiclib.packages.servicehub import Connection
+from qiclib.packages.servicehub import ChannelOptions, Connection
 
 
 @platform_attribute_collector
@@ -96,14 +97,29 @@ class QiController(PlatformComponent):
         port forwarding of the platform port 50058 to another one.
     :param silent:
         If print messages from QiController should be suppressed
+    :param channel_options:
+        Settings of the gRPC channels to the QiController like message size limits,
+        keepalive and compression (see
+        :class:`~qiclib.packages.servicehub.ChannelOptions`), by default the gRPC
+        defaults are used.
     """
 
-    def __init__(self, ip: str, port: int = 50058, silent: bool = False):
+    def __init__(
+        self,
+        ip: str,
+        port: int = 50058,
+        silent: bool = False,
+        channel_options: ChannelOptions | None = None,
+    ):
         self._silent = silent
+        # Maximum number of status requests issued concurrently by check_errors
+        self.status_request_workers = 16
         print(f"qiclib version: {qiclib.__version__}")
 
         # Connection to the Platform
-        connection = Connection(ip=ip, port=port, silent=True)
+        connection = Connection(
+            ip=ip, port=port, silent=True, channel_options=channel_options
+        )
         super().__init__("QiController", connection, self)
         self._print(f"Establishing remote connection to {self._conn.ip}...")
 
@@ -404,37 +420,64 @@ class QiController(PlatformComponent):
                 + "\n\n{}".format("\n\n".join(errors))
             )
 
-    def _get_errors(self) -> list[str]:
-        """Collects all error messages and returns them as list of strings.
+    def get_status_snapshot(self) -> dict[str, str]:
+        """Obtains the status of all modules of the platform at once.
+
+        This covers the signal generators and signal recorders of all digital unit
+        cells, the Taskrunner and the converters. The QiController services do not
+        offer a single request returning all of these, so the individual modules are
+        queried concurrently (at most :attr:`status_request_workers` at a time). The
+        time this takes thus stays approximately constant in the number of cells.
+
+        Like the individual ``check_status`` methods, reported status flags will be
+        reset on the platform.
 
         :return:
-            A list of all error messages that have been obtained
+            A dictionary mapping the name of each module to its status report, which
+            is an empty string if the module did not report any issue.
         """
-        status_msgs = []
-
+        checks = {}
         for cell in self.cell:
             for part in [cell.readout, cell.manipulation, cell.recording]:
-                try:
-                    part.check_status()
-                except Warning as e:
-                    status_msgs.append(
-                        f"{part.name} returned the following warning:\n{e}"
-                    )
-
+                checks[part.name] = part.check_status
         if self.taskrunner is not None:
+            checks["Taskrunner"] = self.taskrunner.check_task_errors
+        # TODO Replace by rfdc.check_status once this is properly working
+        checks["Converters"] = self.cell.check_status
+
+        def report(check) -> str:
             try:
-                self.taskrunner.check_task_errors()
+                check()
             except Warning as e:
-                status_msgs.append(
-                    f"The Taskrunner returned the following warning:\n{e}"
-                )
+                return str(e)
+            return ""
+
+        workers = max(1, min(self.status_request_workers, len(checks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                name: executor.submit(report, check) for name, check in checks.items()
+            }
+        return {name: future.result() for name, future in futures.items()}
 
-        try:
-            # TODO Replace by rfdc.check_status once this is properly working
-            self.cell.check_status()
-        except Warning as e:
-            status_msgs.append(str(e))
+    def _get_errors(self) -> list[str]:
+        """Collects all error messages and returns them as list of strings.
 
+        :return:
+            A list of all error messages that have been obtained
+        """
+        status_msgs = []
+        for name, report in self.get_status_snapshot().items():
+            if not report:
+                continue
+            if name == "Converters":
+                # The converter report already states its origin
+                status_msgs.append(report)
+            elif name == "Taskrunner":
+                status_msgs.append(
+                    f"The Taskrunner returned the following warning:\n{report}"
+                )
+            else:
+                status_msgs.append(f"{name} returned the following warning:\n{report}")
         return status_msgs
 
     def export_configuration_dicts(self, filename):
@@ -474,7 +474,8 @@ class PulseGen(PlatformComponent):
         # self._stub.EnableNCO(proto.NCOEnable(cindex=self._component, value=enable))
 
     @ServiceHubCall(
-        errormsg="Failed to execute a manual trigger for the signal generator"
+        errormsg="Failed to execute a manual trigger for the signal generator",
+        idempotent=False,
     )
     def trigger_manually(self, triggerset: int):
         """Manually triggers the Pulse Generator module with the given triggerset.
@@ -684,23 +685,8 @@ class TriggerSet(PlatformComponent):
             or just adapted for this one pulse (False).
             This can be used to realize virtual Z gates.
         """
-
-        pulseform_i = np.real(pulseform)
-        pulseform_q = np.imag(pulseform)
-        if not np.any(pulseform_q):
-            # No imaginary part present, so only real envelope
-            pulseform_q = []
-
         self._stub.LoadPulse(
-            proto.Pulse(
-                index=self._indexset,
-                i=pulseform_i,
-                q=pulseform_q,
-                phase=phase,
-                offset=offset,
-                hold=hold,
-                shift_phase=shift_phase,
-            )
+            _pulse_message(self._indexset, pulseform, phase, offset, hold, shift_phase)
         )
 
     def trigger_manually(self):
@@ -712,3 +698,29 @@ class TriggerSet(PlatformComponent):
             to be visible, see :meth:`PulseGen.nco_enable()`.
         """
         self._pulsegen.trigger_manually(self._index)
+
+
+def _pulse_message(
+    indexset: proto.IndexSet,
+    pulseform: npt.ArrayLike,
+    phase: float,
+    offset: float,
+    hold: bool,
+    shift_phase: bool,
+) -> proto.Pulse:
+    """Creates the message to load a pulse into a trigger set, see `TriggerSet.load_pulse`."""
+    pulseform_i = np.real(pulseform)
+    pulseform_q = np.imag(pulseform)
+    if not np.any(pulseform_q):
+        # No imaginary part present, so only real envelope
+        pulseform_q = []
+
+    return proto.Pulse(
+        index=indexset,
+        i=pulseform_i,
+        q=pulseform_q,
+        phase=phase,
+        offset=offset,
+        hold=hold,
+        shift_phase=shift_phase,
+    )
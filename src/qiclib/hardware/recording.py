@@ -255,7 +255,7 @@ class Recording(PlatformComponent):
         except ValueError:
             return trigger
 
-    @ServiceHubCall
+    @ServiceHubCall(idempotent=False)
     def trigger_manually(self, trigger: RecordingTrigger | int):
         """Manually triggers the signal recorder."""
         if not isinstance(trigger, RecordingTrigger):
@@ -197,7 +197,7 @@ class Sequencer(PlatformComponent):
     def program_description(self):
         return self._program_description
 
-    @ServiceHubCall(errormsg="Could not start the Sequencer")
+    @ServiceHubCall(errormsg="Could not start the Sequencer", idempotent=False)
     def start_at(self, program_counter):
         """Sequencer gets started at the given program counter program_counter.
 
@@ -20,6 +20,7 @@ import qiclib.packages.grpc.qic_storage_pb2 as proto
 import qiclib.packages.grpc.qic_storage_pb2_grpc as grpc_stub
 from qiclib.hardware.platform_component import PlatformComponent
 from qiclib.packages.servicehub import ServiceHubCall
+from qiclib.packages.utility import count_states, unpack_states
 
 
 class Storage(PlatformComponent):
@@ -50,11 +51,12 @@ class Storage(PlatformComponent):
             for i in range(4)
         ]
 
-    def extract_states(self, val, dense=False):
-        if dense:
-            return [(val >> i) & 0x1 for i in range(32)]
-        else:
-            return [((val) >> (3 * i)) & 0x7 for i in range(10)]
+    def extract_states(self, val, dense=False, counts_only=False):
+        """Unpacks the states stored in `val`. If `counts_only` is set, only the number of
+        occurrences of each state is returned, without unpacking the individual states."""
+        if counts_only:
+            return count_states(val, dense)
+        return unpack_states(val, dense)
 
     @property
     @ServiceHubCall
@@ -149,11 +151,10 @@ class Storage(PlatformComponent):
         states_raw = self._stub.GetBramStateData(self._component).state
         _, accumulate, dense_mode, _ = self.state_handling
         if accumulate:
-            states = []
-            for x in states_raw:
-                # Returns the state data.
-                states.append(self.extract_states(x, dense_mode))
-            return states
+            # One row of states for each value
+            return self.extract_states(states_raw, dense_mode).reshape(
+                len(states_raw), -1
+            )
         else:
             return states_raw
 
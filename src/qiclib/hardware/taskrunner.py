@@ -18,8 +18,10 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Iterable, Iterator
 from enum import Enum
-from typing import Any
+
+import numpy as np
 
 import qiclib.packages.grpc.datatypes_pb2 as dt
 import qiclib.packages.grpc.taskrunner_pb2 as proto
@@ -30,6 +32,7 @@ from qiclib.hardware.platform_component import (
     platform_attribute,
     platform_attribute_collector,
 )
+from qiclib.packages.protobuf_arrays import packed_arrays
 from qiclib.packages.servicehub import ServiceHubCall
 
 
@@ -46,6 +49,11 @@ class TaskRunner(PlatformComponent):
     ):
         super().__init__(name, connection, controller, qkit_instrument)
         self._stub = grpc_stub.TaskRunnerServiceStub(self._conn.channel)
+        # Databoxes are fetched over the bulk channel (if separate)
+        if self._conn.bulk_channel is self._conn.channel:
+            self._bulk_stub = self._stub
+        else:
+            self._bulk_stub = grpc_stub.TaskRunnerServiceStub(self._conn.bulk_channel)
 
     @property
     @platform_attribute
@@ -117,7 +125,7 @@ class TaskRunner(PlatformComponent):
         """Returns if if error message queue is full."""
         return self._stub.GetTaskState(dt.Empty()).error_msg_queue_full
 
-    @ServiceHubCall(errormsg="Failed to start task")
+    @ServiceHubCall(errormsg="Failed to start task", idempotent=False)
     def start_task(self, loop=False, overwrite=False):
         """Starts the execution of a previously loaded task.
 
@@ -198,10 +206,38 @@ class TaskRunner(PlatformComponent):
         INT64 = 7
         UINT64 = 8
 
+        @property
+        def dtype(self) -> np.dtype:
+            """The numpy data type of the databox values in this data mode."""
+            return np.dtype(self.name.lower())
+
+    @staticmethod
+    def _databox_call(stub: grpc_stub.TaskRunnerServiceStub, mode: DataMode):
+        """Returns the method of the `stub` to fetch databoxes for the given data mode."""
+        method_name = {
+            TaskRunner.DataMode.INT8: "GetDataboxesINT8",
+            TaskRunner.DataMode.UINT8: "GetDataboxesUINT8",
+            TaskRunner.DataMode.INT16: "GetDataboxesINT16",
+            TaskRunner.DataMode.UINT16: "GetDataboxesUINT16",
+            TaskRunner.DataMode.INT32: "GetDataboxesINT32",
+            TaskRunner.DataMode.UINT32: "GetDataboxesUINT32",
+            TaskRunner.DataMode.INT64: "GetDataboxesINT64",
+            TaskRunner.DataMode.UINT64: "GetDataboxesUINT64",
+        }.get(mode, None)
+        if method_name is None:
+            raise ValueError("Data mode is unknown! Only use DataMode Enum values.")
+        return getattr(stub, method_name)
+
+    def _check_databoxes_ready(self, require_done: bool):
+        self.check_task_errors()
+
+        if require_done and not self.task_done:
+            raise RuntimeError("Task should be finished prior to fetching data.")
+
     @ServiceHubCall(errormsg="Failed to fetch databoxes from taskrunner")
     def get_databoxes_with_mode(
         self, mode=DataMode.INT32, require_done=True
-    ) -> list[list[Any]]:
+    ) -> list[np.ndarray]:
         """Retrieves data from a previously started task on the R5.
         Depending on the parameter mode, the data is interpreted differently.
 
@@ -211,7 +247,8 @@ class TaskRunner(PlatformComponent):
             if the task has to be finished before fetching data, by default True
 
         :return:
-            A list of databoxes, being list of values themselves, either int32 or uint32.
+            A list of databoxes, being numpy arrays with the data type of the `mode`
+            (see `TaskRunner.DataMode.dtype`).
 
         :raises Exception:
             If require_done is True and the Task is not finished
@@ -220,34 +257,10 @@ class TaskRunner(PlatformComponent):
         :raises Exception:
             If require_done and not data is available
         """
-        self.check_task_errors()
+        self._check_databoxes_ready(require_done)
 
-        if require_done and not self.task_done:
-            raise RuntimeError("Task should be finished prior to fetching data.")
-
-        method_call = {
-            TaskRunner.DataMode.INT8: self._stub.GetDataboxesINT8,
-            TaskRunner.DataMode.UINT8: self._stub.GetDataboxesUINT8,
-            TaskRunner.DataMode.INT16: self._stub.GetDataboxesINT16,
-            TaskRunner.DataMode.UINT16: self._stub.GetDataboxesUINT16,
-            TaskRunner.DataMode.INT32: self._stub.GetDataboxesINT32,
-            TaskRunner.DataMode.UINT32: self._stub.GetDataboxesUINT32,
-            TaskRunner.DataMode.INT64: self._stub.GetDataboxesINT64,
-            TaskRunner.DataMode.UINT64: self._stub.GetDataboxesUINT64,
-        }.get(mode, None)
-        if method_call is None:
-            raise ValueError("Data mode is unknown! Only use DataMode Enum values.")
-
-        databoxes: list[list[Any]] = []
-        last_index = -1
-        for databox_reply in method_call(dt.Empty()):
-            # print databox_reply.index, databox_reply.data[:]
-            if last_index != databox_reply.index:
-                # Create new (empty) databox in list
-                databoxes.append([])
-                last_index = databox_reply.index
-            # Fill the latest databox with content
-            databoxes[-1].extend(databox_reply.data[:])
+        method_call = self._databox_call(self._bulk_stub, mode)
+        databoxes = _assemble_databoxes(method_call(dt.Empty()), mode.dtype)
 
         if require_done and not databoxes:
             raise RuntimeError(
@@ -256,6 +269,37 @@ class TaskRunner(PlatformComponent):
 
         return databoxes
 
+    def iter_databoxes_with_mode(
+        self, mode=DataMode.INT32, require_done=True
+    ) -> Iterator[np.ndarray]:
+        """Retrieves data from a previously started task on the R5 and yields each
+        databox as soon as it has been received completely.
+
+        In contrast to `TaskRunner.get_databoxes_with_mode`, already received databoxes
+        can be processed while the remaining ones are still transferred. If the
+        iterator is closed early, the transfer is cancelled.
+
+        :param mode:
+            DataMode of the databoxes, by default DataMode.INT32
+        :param require_done:
+            if the task has to be finished before fetching data, by default True
+
+        :return:
+            An iterator over the databoxes, being numpy arrays with the data type of
+            the `mode`.
+        """
+        self._check_databoxes_ready(require_done)
+
+        replies = self._start_databox_stream(mode)
+        try:
+            yield from _iter_databoxes(replies, mode.dtype)
+        finally:
+            replies.cancel()
+
+    @ServiceHubCall(errormsg="Failed to fetch databoxes from taskrunner")
+    def _start_databox_stream(self, mode: DataMode):
+        return self._databox_call(self._bulk_stub, mode)(dt.Empty())
+
     def get_databoxes(self, require_done=True):
         """Retrieves data from a previously started task on the R5.
 
@@ -332,3 +376,34 @@ class TaskRunner(PlatformComponent):
                 "The following error messages were retrieved "
                 + "from the Taskrunner:\n{}".format("\n".join(errors))
             )
+
+
+def _assemble_databoxes(databox_replies: Iterable, dtype: np.dtype) -> list[np.ndarray]:
+    """Combines the streamed databox replies into a list of databoxes."""
+    return list(_iter_databoxes(databox_replies, dtype))
+
+
+def _iter_databoxes(databox_replies: Iterable, dtype: np.dtype) -> Iterator[np.ndarray]:
+    """Combines the streamed databox replies and yields each databox once all of its
+    replies have been received.
+
+    The data of each reply is decoded directly into a numpy array. The server does not
+    announce the size of a databox, so the chunks are joined when the next databox
+    starts. Databoxes consisting of a single reply are not copied again.
+    """
+    chunks: list[np.ndarray] = []
+    last_index = None
+    for databox_reply in databox_replies:
+        if last_index != databox_reply.index and last_index is not None:
+            yield _join_chunks(chunks, dtype)
+            chunks = []
+        last_index = databox_reply.index
+        chunks.append(packed_arrays(databox_reply)["data"])
+    if last_index is not None:
+        yield _join_chunks(chunks, dtype)
+
+
+def _join_chunks(chunks: list[np.ndarray], dtype: np.dtype) -> np.ndarray:
+    if len(chunks) == 1:
+        return chunks[0].astype(dtype, copy=False)
+    return np.concatenate(chunks, dtype=dtype)
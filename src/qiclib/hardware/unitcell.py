@@ -59,8 +59,8 @@ the same DAC channel for frequency-division-multiplexed readout and control.
 from __future__ import annotations
 
 import sys
-from collections.abc import Iterable, Mapping
-from copy import copy
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
 from typing import TYPE_CHECKING, Literal
 
 import numpy as np
@@ -74,6 +74,7 @@ from qiclib.hardware.pulsegen import PulseGen
 from qiclib.hardware.recording import Recording
 from qiclib.hardware.sequencer import Sequencer
 from qiclib.hardware.storage import Storage
+from qiclib.packages.protobuf_arrays import packed_arrays
 from qiclib.packages.servicehub import ServiceHubCall
 
 if TYPE_CHECKING:
@@ -81,9 +82,28 @@ if TYPE_CHECKING:
 
 
 DataCollection = Literal[
-    "average", "amp_pha", "iqcloud", "raw", "states", "counts", "quantum_jumps"
+    "average",
+    "amp_pha",
+    "iqcloud",
+    "raw",
+    "states",
+    "state_counts",
+    "counts",
+    "quantum_jumps",
 ]
 
+_DATA_COLLECTION_MODES = {
+    "average": proto.AVERAGE,
+    "amp_pha": proto.AMPLITUDE_PHASE,
+    "iqcloud": proto.IQCLOUD,
+    "raw": proto.RAW_TRACE,
+    "states": proto.STATES,
+    # Records the states of each shot, which are only counted when processing the results
+    "state_counts": proto.STATES,
+    "counts": proto.STATE_COUNT,
+    "quantum_jumps": proto.QM_JUMPS,
+}
+
 
 class UnitCell:
     """A single digital unit cell containing its internal modules as properties.
@@ -217,6 +237,11 @@ class UnitCells(PlatformComponent, Mapping):
     ):
         super().__init__(name, connection, controller, qkit_instrument)
         self._stub = grpc_stub.UnitCellServiceStub(self._conn.channel)
+        # Results are streamed over the bulk channel (if separate)
+        if self._conn.bulk_channel is self._conn.channel:
+            self._bulk_stub = self._stub
+        else:
+            self._bulk_stub = grpc_stub.UnitCellServiceStub(self._conn.bulk_channel)
         self._cells: list[UnitCell] = []
         self._update_cells()
 
@@ -241,7 +266,7 @@ class UnitCells(PlatformComponent, Mapping):
         """The number of digital unit cells available in the QiController."""
         return len(self._cells)
 
-    @ServiceHubCall
+    @ServiceHubCall(idempotent=False)
     def start_all(self):
         """Start the sequencers of all digital unit cells synchronously.
 
@@ -254,7 +279,7 @@ class UnitCells(PlatformComponent, Mapping):
         """
         self._stub.StartCells(proto.StartCellInfo(all_cells=True))
 
-    @ServiceHubCall
+    @ServiceHubCall(idempotent=False)
     def start(self, cells: list[int]):
         """Starts the sequencers of the given digital unit cells synchronously.
 
@@ -331,25 +356,24 @@ class UnitCells(PlatformComponent, Mapping):
         """Resets the status report so old error messages will be discarded."""
         self._stub.ClearConverterStatus(dt.Empty())
 
-    @ServiceHubCall
-    def submit(
+    def prepare_job(
         self,
         job: proto.Job,
         averages: int,
         cells: list[int],
         recordings: list[int],
         data_collection: str = "average",
-    ) -> int:
-        switch_dict = {
-            "average": proto.AVERAGE,
-            "amp_pha": proto.AMPLITUDE_PHASE,
-            "iqcloud": proto.IQCLOUD,
-            "raw": proto.RAW_TRACE,
-            "states": proto.STATES,
-            "counts": proto.STATE_COUNT,
-            "quantum_jumps": proto.QM_JUMPS,
-        }
-        mode = switch_dict.get(data_collection)
+    ) -> proto.Job:
+        """Attaches the experiment parameters to a job so it can be submitted.
+
+        :param job: The job description which will be modified in place.
+        :param averages: The number of repetitions of the experiment.
+        :param cells: The indices of the digital unit cells taking part in the job.
+        :param recordings: The number of recordings for each of the `cells`.
+        :param data_collection: The data collection mode, by default "average".
+        :return: The passed job, ready to be used with `UnitCells.submit_batch`.
+        """
+        mode = _DATA_COLLECTION_MODES.get(data_collection)
         if mode is None:
             raise RuntimeError("Unknown data collection mode " + data_collection)
         job.parameters.CopyFrom(
@@ -360,9 +384,64 @@ class UnitCells(PlatformComponent, Mapping):
                 recordings=recordings,
             )
         )
+        return job
 
+    def submit(
+        self,
+        job: proto.Job,
+        averages: int,
+        cells: list[int],
+        recordings: list[int],
+        data_collection: str = "average",
+    ) -> int:
+        self.prepare_job(job, averages, cells, recordings, data_collection)
+        return self._submit_prepared(job)
+
+    @ServiceHubCall(idempotent=False)
+    def _submit_prepared(self, job: proto.Job) -> int:
         return self._stub.Submit(job).value
 
+    def submit_batch(
+        self, jobs: Iterable[proto.Job], max_in_flight: int = 4
+    ) -> Iterator[tuple[int, int, list]]:
+        """Submits multiple jobs while keeping up to `max_in_flight` of them queued on
+        the QiController and yields their results as soon as they are available.
+
+        Instead of waiting for each job to finish before the next one is sent, new
+        jobs are submitted while the previous ones are still executing. This way,
+        the network round trip of each job overlaps with the execution of the queued
+        ones. As the jobs are processed in submission order on the QiController, the
+        results are also yielded in this order.
+
+        `jobs` is consumed lazily, so a generator can be used to create the jobs
+        (e.g. compile the programs) only shortly before they are submitted.
+
+        :param jobs:
+            The jobs to submit. Their experiment parameters need to be set already,
+            see `UnitCells.prepare_job`.
+        :param max_in_flight:
+            The maximum number of jobs submitted but not yet collected, by default 4.
+        :return:
+            An iterator over tuples `(index, job_id, results)` where `index` is the
+            position of the job within `jobs` and `results` has the same format as
+            returned by `UnitCells.run_experiment`.
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight needs to be at least 1.")
+
+        pending = iter(enumerate(jobs))
+        in_flight: deque[tuple[int, int]] = deque()
+        while True:
+            for index, job in pending:
+                in_flight.append((index, self._submit_prepared(job)))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            index, job_id = in_flight.popleft()
+            results = self._await_results(job_id)
+            yield index, job_id, self._process_results(results.mode, results.results)
+
     @ServiceHubCall
     def status(self, job_id: int):
         return self._stub.GetJobStatus(dt.UInt(value=job_id))
@@ -373,45 +452,77 @@ class UnitCells(PlatformComponent, Mapping):
         results: Iterable[proto.ExperimentResults.SingleCellResults],
     ):
         # Convert the proto messages to appropriate arrays
-        if mode in {proto.AVERAGE, proto.AMPLITUDE_PHASE, proto.RAW_TRACE}:
-            return [
-                (
-                    np.array(single_result.data_double_1, dtype=float),  # I
-                    np.array(single_result.data_double_2, dtype=float),  # Q
-                )
-                for single_result in results
-            ]
-        elif mode == proto.IQCLOUD:
-            return [
-                (
-                    np.array(single_result.data_sint32_1, dtype=np.int32),
-                    np.array(single_result.data_sint32_2, dtype=np.int32),
-                )
-                for single_result in results
-            ]
-        elif mode in {proto.STATES, proto.QM_JUMPS, proto.STATE_COUNT}:
-            return [
-                np.array(single_result.data_uint32, dtype=np.uint32)
-                for single_result in results
-            ]
-        else:
-            raise AssertionError("Unknown data collection mode")
+        return _results_from_arrays(
+            mode, [packed_arrays(single_result) for single_result in results]
+        )
 
     @ServiceHubCall
+    def _await_results(
+        self,
+        job_id: int,
+        on_progress: Callable[[proto.ExperimentResults], None] | None = None,
+    ) -> proto.ExperimentResults:
+        experiment_results = proto.ExperimentResults()
+        for progress in self._bulk_stub.StreamResults(dt.UInt(value=job_id)):
+            experiment_results = progress
+            if on_progress:
+                on_progress(progress)
+        return experiment_results
+
     def stream_results(self, job_id: int):
         from tqdm.notebook import tqdm
 
         with tqdm() as pbar:
-            current = 0
-            for progress in self._stub.StreamResults(dt.UInt(value=job_id)):
-                experiment_results = progress
+
+            def update(progress: proto.ExperimentResults):
                 pbar.total = progress.max_progress
-                pbar.update(progress.progress - current)
-                current = progress.progress
-        results = experiment_results
+                pbar.update(progress.progress - pbar.n)
+
+            results = self._await_results(job_id, update)
         return self._process_results(results.mode, results.results)
 
-    @ServiceHubCall
+    def stream_experiment(
+        self,
+        averages: int,
+        cells: list[int],
+        recordings: list[int],
+        data_collection: DataCollection = "iqcloud",
+    ) -> Iterator[tuple[int, list]]:
+        """Runs the experiment on the hardware and yields the results while it is
+        running.
+
+        In contrast to `UnitCells.run_experiment`, the result data is not accumulated.
+        Each streamed message is converted on its own, so the required memory does not
+        depend on the number of shots. If the iterator is closed early, the experiment
+        stream is cancelled.
+
+        :return:
+            An iterator over tuples `(progress, results)` where `results` contains only
+            the data received with this message, in the format of
+            `UnitCells.run_experiment`.
+        """
+        mode = _DATA_COLLECTION_MODES.get(data_collection)
+        if mode is None:
+            raise Warning("Unknown data collection mode " + data_collection)
+        responses = self._start_experiment(
+            proto.ExperimentParameters(
+                mode=mode,
+                shots=averages,
+                cells=cells,
+                recordings=recordings,
+            )
+        )
+        try:
+            for progress in responses:
+                yield progress.progress, self._process_results(mode, progress.results)
+        finally:
+            responses.cancel()
+
+    @ServiceHubCall(idempotent=False)
+    def _start_experiment(self, parameters: proto.ExperimentParameters):
+        return self._bulk_stub.RunExperiment(parameters)
+
+    @ServiceHubCall(idempotent=False)
     def run_experiment(
         self,
         averages: int,
@@ -429,20 +540,11 @@ class UnitCells(PlatformComponent, Mapping):
         - IQ Cloud: A tuple containing the I/Q values as numpy arrays (signed integer type)
         - States, Quantum Jumps, State Count: A single numpy array containing the states (unsigned integer type)
         """
-        switch_dict = {
-            "average": proto.AVERAGE,
-            "amp_pha": proto.AMPLITUDE_PHASE,
-            "iqcloud": proto.IQCLOUD,
-            "raw": proto.RAW_TRACE,
-            "states": proto.STATES,
-            "counts": proto.STATE_COUNT,
-            "quantum_jumps": proto.QM_JUMPS,
-        }
-        mode = switch_dict.get(data_collection)
+        mode = _DATA_COLLECTION_MODES.get(data_collection)
         if mode is None:
             raise Warning("Unknown data collection mode " + data_collection)
-        experiment_results: proto.ExperimentResults = None
-        for progress in self._stub.RunExperiment(
+        collector = _ResultCollector()
+        for progress in self._bulk_stub.RunExperiment(
             proto.ExperimentParameters(
                 mode=mode,
                 shots=averages,
@@ -450,15 +552,69 @@ class UnitCells(PlatformComponent, Mapping):
                 recordings=recordings,
             )
         ):
-            if len(progress.results) > 0:
-                if experiment_results is None:
-                    experiment_results = copy(progress)
-                else:
-                    for i, result in enumerate(progress.results):
-                        experiment_results.results[i].MergeFrom(result)
-
+            collector.add(progress)
             if progress_callback:
                 progress_callback(progress.progress)
-        if experiment_results is None:
-            experiment_results = proto.ExperimentResults()
-        return self._process_results(mode, experiment_results.results)
+        return _results_from_arrays(mode, collector.arrays())
+
+
+class _ResultCollector:
+    """Accumulates the result data of the streamed progress messages of an experiment.
+
+    The data of each message is decoded into arrays right away and only concatenated
+    once all messages have been received.
+    """
+
+    def __init__(self):
+        self._cells: list[dict[str, list[np.ndarray]]] = []
+
+    def add(self, progress: proto.ExperimentResults):
+        for index, single_result in enumerate(progress.results):
+            if index == len(self._cells):
+                self._cells.append({})
+            for name, values in packed_arrays(single_result).items():
+                if len(values) > 0:
+                    self._cells[index].setdefault(name, []).append(values)
+
+    def arrays(self) -> list[dict[str, np.ndarray]]:
+        return [
+            {
+                name: chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+                for name, chunks in cell.items()
+            }
+            for cell in self._cells
+        ]
+
+
+def _results_from_arrays(
+    mode: proto.DataCollectionMode, cells: list[dict[str, np.ndarray]]
+):
+    """Returns the results of each cell in the format of `UnitCells.run_experiment`.
+
+    :param mode: The data collection mode of the experiment.
+    :param cells: The content of the result fields of each cell, see `_ResultCollector`.
+    """
+
+    def field(cell: dict[str, np.ndarray], name: str, dtype) -> np.ndarray:
+        return cell.get(name, np.zeros(0)).astype(dtype, copy=False)
+
+    if mode in {proto.AVERAGE, proto.AMPLITUDE_PHASE, proto.RAW_TRACE}:
+        return [
+            (
+                field(cell, "data_double_1", float),  # I
+                field(cell, "data_double_2", float),  # Q
+            )
+            for cell in cells
+        ]
+    elif mode == proto.IQCLOUD:
+        return [
+            (
+                field(cell, "data_sint32_1", np.int32),
+                field(cell, "data_sint32_2", np.int32),
+            )
+            for cell in cells
+        ]
+    elif mode in {proto.STATES, proto.QM_JUMPS, proto.STATE_COUNT}:
+        return [field(cell, "data_uint32", np.uint32) for cell in cells]
+    else:
+        raise AssertionError("Unknown data collection mode")
@@ -45,6 +45,89 @@ def boltzmann_end(frequency_ghz, a, temp):
     return a * np.exp(-(frequency_ghz * 1e9 * 4.13567e-15) / (temp * 8.61733e-5))
 
 
+class StateClassifier:
+    """Assigns I/Q points to the state whose blob center is the nearest.
+
+    The points are processed in chunks of `chunk_size`, so the required temporary
+    memory does not depend on the number of points.
+
+    :param centers:
+        The I/Q coordinates of the blob centers, one row per state.
+    :param precisions:
+        The inverse covariance matrices (2x2) of the blobs, optional. If given, the
+        Mahalanobis distance is used instead of the Euclidean distance, so the width
+        and orientation of each blob is taken into account.
+    """
+
+    chunk_size = 2**16
+
+    def __init__(self, centers, precisions=None):
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        self.precisions = None
+        if precisions is not None:
+            self.precisions = np.asarray(precisions, dtype=np.float64).reshape(-1, 2, 2)
+
+    @classmethod
+    def from_blobs(cls, popts, use_covariance=False) -> StateClassifier:
+        """Creates the classifier from the blob parameters returned by
+        `IQFit.get_blobs`, with the states in order of decreasing phase.
+
+        :param popts:
+            The parameters of the fitted 2D Gauss functions, see `gaussian_2d`.
+        :param use_covariance:
+            If the Mahalanobis distance using the fitted widths and rotation of the
+            blobs should be used, by default False
+        """
+        popts = np.asarray(popts, dtype=np.float64).reshape(-1, 6)
+        popts = popts[np.argsort(-np.angle(popts[:, 1] + 1j * popts[:, 2]))]
+        precisions = None
+        if use_covariance:
+            precisions = _gaussian_2d_precision(*popts.T[3:6])
+        return cls(popts[:, 1:3], precisions)
+
+    @property
+    def order(self) -> int:
+        """The number of states."""
+        return len(self.centers)
+
+    def classify(self, i_values, q_values) -> npt.NDArray[np.intp]:
+        """Returns the index of the state for each of the given I/Q points."""
+        i_values = np.ravel(np.asarray(i_values, dtype=np.float64))
+        q_values = np.ravel(np.asarray(q_values, dtype=np.float64))
+        labels = np.empty(len(i_values), dtype=np.intp)
+        for start in range(0, len(i_values), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            delta_i = i_values[chunk, np.newaxis] - self.centers[:, 0]
+            delta_q = q_values[chunk, np.newaxis] - self.centers[:, 1]
+            if self.precisions is None:
+                distance = delta_i * delta_i + delta_q * delta_q
+            else:
+                distance = (
+                    self.precisions[:, 0, 0] * delta_i * delta_i
+                    + 2 * self.precisions[:, 0, 1] * delta_i * delta_q
+                    + self.precisions[:, 1, 1] * delta_q * delta_q
+                )
+            labels[chunk] = np.argmin(distance, axis=1)
+        return labels
+
+    def count(self, i_values, q_values) -> npt.NDArray[np.int64]:
+        """Returns the number of the given I/Q points assigned to each state."""
+        return np.bincount(self.classify(i_values, q_values), minlength=self.order)
+
+
+def _gaussian_2d_precision(sigma_x, sigma_y, theta) -> np.ndarray:
+    """Inverse covariance matrices of the Gauss functions described by `gaussian_2d`."""
+    cos2, sin2 = np.cos(theta) ** 2, np.sin(theta) ** 2
+    sin_2theta = np.sin(2 * theta)
+    precisions = np.empty((len(np.atleast_1d(theta)), 2, 2))
+    precisions[:, 0, 0] = cos2 / sigma_x**2 + sin2 / sigma_y**2
+    precisions[:, 0, 1] = precisions[:, 1, 0] = -sin_2theta / (
+        2 * sigma_x**2
+    ) + sin_2theta / (2 * sigma_y**2)
+    precisions[:, 1, 1] = sin2 / sigma_x**2 + cos2 / sigma_y**2
+    return precisions
+
+
 class IQFit:
     def __init__(self, iqdata, bins=400, limits=None):
         self.iqdata = iqdata  # type: IQData
@@ -89,36 +172,61 @@ class IQFit:
 
         return population
 
+    def get_state_classifier(
+        self, order=4, histo=None, use_covariance=False
+    ) -> StateClassifier:
+        """Fits `order` blobs and returns a classifier assigning I/Q points to them.
+
+        The classifier can be reused to segment other I/Q clouds without fitting them.
+
+        :param order:
+            The number of states (blobs), by default 4
+        :param histo:
+            The histogram. When omitted, the cached histogram will be used
+        :param use_covariance:
+            If the shape of the fitted blobs should be considered for the segmentation
+            (see `StateClassifier`), by default False
+
+        :return:
+            The classifier with the states in order of decreasing phase.
+        """
+        popts, _, _ = self.get_blobs(order, histo, plot=False)
+        return StateClassifier.from_blobs(popts, use_covariance)
+
+    def get_plane_segmentation(
+        self, classifier=None, order=4, histo=None, use_covariance=False
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.intp], StateClassifier]:
+        """Assigns each I/Q point to the state of the nearest blob.
+
+        :param classifier:
+            The `StateClassifier` to use. If omitted, it is determined by
+            `get_state_classifier` using the remaining parameters.
+
+        :return:
+            A tuple containing:
+            - counts: The number of points assigned to each state
+            - labels: The state of each I/Q point
+            - classifier: The used classifier
+        """
+        if classifier is None:
+            classifier = self.get_state_classifier(order, histo, use_covariance)
+        labels = classifier.classify(self.iqdata.i_list, self.iqdata.q_list)
+        counts = np.bincount(labels, minlength=classifier.order)
+        return counts, labels, classifier
+
     def get_plane_segmentation_count(
         self, center_list=None, order=4, histo=None, plot=True
     ):
         if center_list is None:
-            popts, _, _ = self.get_blobs(order, histo, plot=False)
-            center_list = np.array([(popt[1], popt[2]) for popt in popts])
-            # Sort in order of decreasing phase
-            pos_i, pos_q = popts.T[1:3]
-            phases = np.angle(pos_i + 1j * pos_q)
-            center_list = center_list[np.argsort(-phases)]
-            print(center_list)
+            classifier = self.get_state_classifier(order, histo)
+            print(classifier.centers)
         else:
-            order = len(center_list)
-
-        def vlen(x, y):
-            return (x[0] - y[0]) * (x[0] - y[0]) + (x[1] - y[1]) * (x[1] - y[1])
-
-        # Assume same stddev for all blobs atm
-        count_list = np.zeros(order)
-        for iq_point in zip(self.iqdata.i_list, self.iqdata.q_list):
-            min_dist = np.inf
-            min_dist_idx = 0
-            for state in range(order):
-                dist = vlen(center_list[state], iq_point)
-                if dist < min_dist:
-                    min_dist = dist
-                    min_dist_idx = state
-            count_list[min_dist_idx] += 1
-
-        return count_list, center_list
+            # Assume same stddev for all blobs
+            classifier = StateClassifier(center_list)
+
+        counts, _, _ = self.get_plane_segmentation(classifier)
+        # The counts have always been returned as floats
+        return counts.astype(np.float64), classifier.centers
 
     def get_blobs(
         self,
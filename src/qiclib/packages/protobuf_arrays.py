@@ -0,0 +1,203 @@
+# Copyright© 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Fast conversion of repeated numeric protobuf fields into numpy arrays.
+
+Converting a repeated field using :python:`np.array(message.field)` iterates over the
+field element by element in Python. Instead, the message is serialized once and the
+packed wire format of the fields is decoded with numpy. Fixed size types are used
+directly using :python:`np.frombuffer` while variable length integers (varints) are
+decoded in a vectorized way.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.message import Message
+
+_WIRETYPE_LENGTH_DELIMITED = 2
+
+_FIXED_TYPES = {
+    FieldDescriptor.TYPE_DOUBLE: np.dtype("<f8"),
+    FieldDescriptor.TYPE_FLOAT: np.dtype("<f4"),
+    FieldDescriptor.TYPE_FIXED64: np.dtype("<u8"),
+    FieldDescriptor.TYPE_FIXED32: np.dtype("<u4"),
+    FieldDescriptor.TYPE_SFIXED64: np.dtype("<i8"),
+    FieldDescriptor.TYPE_SFIXED32: np.dtype("<i4"),
+}
+
+# Varint types which can be decoded: (unsigned dtype used for decoding, zigzag encoded)
+# Negative values of int32 and int64 are encoded as sign extended 64 bit values.
+_VARINT_TYPES = {
+    FieldDescriptor.TYPE_INT32: (np.dtype(np.uint64), False),
+    FieldDescriptor.TYPE_INT64: (np.dtype(np.uint64), False),
+    FieldDescriptor.TYPE_UINT32: (np.dtype(np.uint32), False),
+    FieldDescriptor.TYPE_UINT64: (np.dtype(np.uint64), False),
+    FieldDescriptor.TYPE_SINT32: (np.dtype(np.uint32), True),
+    FieldDescriptor.TYPE_SINT64: (np.dtype(np.uint64), True),
+}
+
+_NATIVE_TYPES = {
+    FieldDescriptor.TYPE_DOUBLE: np.dtype(np.float64),
+    FieldDescriptor.TYPE_FLOAT: np.dtype(np.float32),
+    FieldDescriptor.TYPE_FIXED64: np.dtype(np.uint64),
+    FieldDescriptor.TYPE_FIXED32: np.dtype(np.uint32),
+    FieldDescriptor.TYPE_SFIXED64: np.dtype(np.int64),
+    FieldDescriptor.TYPE_SFIXED32: np.dtype(np.int32),
+    FieldDescriptor.TYPE_INT32: np.dtype(np.int32),
+    FieldDescriptor.TYPE_INT64: np.dtype(np.int64),
+    FieldDescriptor.TYPE_UINT32: np.dtype(np.uint32),
+    FieldDescriptor.TYPE_UINT64: np.dtype(np.uint64),
+    FieldDescriptor.TYPE_SINT32: np.dtype(np.int32),
+    FieldDescriptor.TYPE_SINT64: np.dtype(np.int64),
+}
+
+
+def packed_arrays(message: Message) -> dict[str, np.ndarray]:
+    """Returns the content of all repeated numeric fields of the message as arrays.
+
+    Only the direct fields of the message are considered. Fields which are not set
+    result in empty arrays.
+
+    :param message: The protobuf message containing the repeated fields.
+    :return: A dictionary mapping the field names to (writable) numpy arrays.
+    """
+    descriptor = message.DESCRIPTOR
+    fields = {
+        field.number: field
+        for field in descriptor.fields
+        if _is_repeated(field) and field.type in _NATIVE_TYPES
+    }
+    chunks: dict[str, list[np.ndarray]] = {field.name: [] for field in fields.values()}
+
+    # Copy into a bytearray so the resulting arrays are writable
+    data = bytearray(message.SerializeToString())
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 0x7
+        field = fields.get(number)
+        if field is None or wire_type != _WIRETYPE_LENGTH_DELIMITED:
+            if field is not None:
+                # Not packed, so use the (slow) iteration as fallback
+                chunks[field.name] = [_iterate(message, field)]
+                fields.pop(number)
+            position = _skip_field(data, position, wire_type)
+            continue
+        length, position = _read_varint(data, position)
+        payload = memoryview(data)[position : position + length]
+        chunks[field.name].append(_decode_packed(payload, field.type))
+        position += length
+
+    return {
+        field.name: _concatenate(chunks[field.name], _NATIVE_TYPES[field.type])
+        for field in descriptor.fields
+        if field.name in chunks
+    }
+
+
+def decode_varints(data, dtype: np.dtype = np.dtype(np.uint64)) -> np.ndarray:
+    """Decodes a buffer consisting only of varints into an array.
+
+    :param data: The buffer holding the encoded values.
+    :param dtype: The unsigned integer type used for decoding, by default uint64.
+    :return: An array with the decoded values.
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return np.zeros(0, dtype=dtype)
+    if buffer[-1] >= 0x80:
+        raise ValueError("Truncated varint at the end of the buffer.")
+
+    is_last = buffer < 0x80
+    starts = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    if starts.size == buffer.size:
+        # Fast path: all values fit into a single byte
+        return buffer.astype(dtype)
+
+    # Bit position of each byte within its varint
+    first = np.zeros(buffer.size, dtype=np.intp)
+    first[starts] = starts
+    np.maximum.accumulate(first, out=first)
+    shifts = np.arange(buffer.size, dtype=np.intp)
+    shifts -= first
+    shifts *= 7
+
+    values = (buffer & 0x7F).astype(dtype)
+    np.left_shift(values, shifts.astype(dtype), out=values)
+    return np.bitwise_or.reduceat(values, starts)
+
+
+def _decode_packed(payload: memoryview, field_type: int) -> np.ndarray:
+    fixed = _FIXED_TYPES.get(field_type)
+    if fixed is not None:
+        return np.frombuffer(payload, dtype=fixed).astype(
+            _NATIVE_TYPES[field_type], copy=False
+        )
+    dtype, zigzag = _VARINT_TYPES[field_type]
+    values = decode_varints(payload, dtype)
+    signed = np.dtype(f"i{dtype.itemsize}")
+    if zigzag:
+        values = (values >> 1).view(signed) ^ -(values & 1).view(signed)
+    elif _NATIVE_TYPES[field_type].kind == "i":
+        values = values.view(signed).astype(_NATIVE_TYPES[field_type], copy=False)
+    return values
+
+
+def _concatenate(chunks: list[np.ndarray], dtype: np.dtype) -> np.ndarray:
+    if not chunks:
+        return np.zeros(0, dtype=dtype)
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate(chunks)
+
+
+def _is_repeated(field: FieldDescriptor) -> bool:
+    # `is_repeated` is only available in newer protobuf versions
+    if hasattr(field, "is_repeated"):
+        return field.is_repeated
+    return field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def _iterate(message: Message, field: FieldDescriptor) -> np.ndarray:
+    container = getattr(message, field.name)
+    return np.fromiter(container, dtype=_NATIVE_TYPES[field.type], count=len(container))
+
+
+def _read_varint(data: bytearray, position: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def _skip_field(data: bytearray, position: int, wire_type: int) -> int:
+    if wire_type == 0:
+        _, position = _read_varint(data, position)
+        return position
+    if wire_type == 1:
+        return position + 8
+    if wire_type == 2:
+        length, position = _read_varint(data, position)
+        return position + length
+    if wire_type == 5:
+        return position + 4
+    raise ValueError(f"Unsupported wire type {wire_type}.")
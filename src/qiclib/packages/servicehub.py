@@ -13,36 +13,126 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import annotations
+
+import asyncio
 import functools
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
 
 import grpc
+import grpc.aio
 import wrapt
 
+_log = logging.getLogger(__name__)
+
+
+@dataclass
+class ChannelOptions:
+    """Settings of the gRPC channels used to communicate with the platform.
+
+    All settings which are None keep the gRPC defaults.
+
+    :param max_message_length:
+        The maximum size of sent and received messages in bytes (-1 for unlimited).
+    :param keepalive_time:
+        The interval in seconds in which keepalive pings are sent, also while no calls
+        are active. By default, no pings are sent.
+    :param keepalive_timeout:
+        The time in seconds to wait for the acknowledgement of a keepalive ping before
+        the connection is considered broken.
+    :param compression:
+        The compression algorithm used for all calls, e.g. `grpc.Compression.Gzip`.
+    :param separate_bulk_channel:
+        If bulk transfers (result streams and databoxes) should use their own channel
+        and connection, so they do not delay the control calls, by default False.
+    """
+
+    max_message_length: int | None = None
+    keepalive_time: float | None = None
+    keepalive_timeout: float | None = None
+    compression: grpc.Compression | None = None
+    separate_bulk_channel: bool = False
+
+    def grpc_options(self, bulk: bool = False) -> list[tuple[str, int]]:
+        """The channel arguments to pass to gRPC when creating a channel.
+
+        :param bulk: If the arguments are for the separate bulk channel, by default False.
+        """
+        options = []
+        if self.max_message_length is not None:
+            options += [
+                ("grpc.max_send_message_length", self.max_message_length),
+                ("grpc.max_receive_message_length", self.max_message_length),
+            ]
+        if self.keepalive_time is not None:
+            options += [
+                ("grpc.keepalive_time_ms", round(self.keepalive_time * 1000)),
+                ("grpc.keepalive_permit_without_calls", 1),
+            ]
+        if self.keepalive_timeout is not None:
+            options.append(
+                ("grpc.keepalive_timeout_ms", round(self.keepalive_timeout * 1000))
+            )
+        if bulk:
+            # Channels with the same target and arguments share their connection,
+            # so the bulk channel needs its own subchannels to open a second one
+            options.append(("grpc.use_local_subchannel_pool", 1))
+        return options
+
 
 class Connection:
-    def __init__(self, ip="0.0.0.0", port=50058, silent=False):
+    def __init__(
+        self,
+        ip="0.0.0.0",
+        port=50058,
+        silent=False,
+        channel_options: ChannelOptions | None = None,
+    ):
         self.ip = ip
         self.port = port
         self.grpc_connection = f"{self.ip}:{self.port}"
+        self.channel_options = channel_options or ChannelOptions()
         self._silent = silent
         self._channel = None
+        self._bulk_channel = None
         self._open = False
         self.open()
 
+    def _create_channel(self, bulk: bool = False) -> grpc.Channel:
+        channel = grpc.insecure_channel(
+            self.grpc_connection,
+            options=self.channel_options.grpc_options(bulk),
+            compression=self.channel_options.compression,
+        )
+        return grpc.intercept_channel(channel, _DeadlineInterceptor())
+
     def open(self):
         """Opens the connection to the platform."""
         if self._channel is not None:
             self.close()
-        self._channel = grpc.insecure_channel(self.grpc_connection)
+        self._channel = self._create_channel()
+        if self.channel_options.separate_bulk_channel:
+            self._bulk_channel = self._create_channel(bulk=True)
+        else:
+            self._bulk_channel = self._channel
         if not self._silent:
             print(f"Establishing gRPC connection to {self.grpc_connection}...")
         self._open = True
 
     def close(self):
         """Closes the connection to the platform."""
+        if self._bulk_channel is not self._channel:
+            self._bulk_channel.close()
         self._channel.close()
         del self._channel
         self._channel = None  # type: grpc.Channel
+        self._bulk_channel = None
         if not self._silent:
             print(f"Closed gRPC connection to {self.grpc_connection}.")
         self._open = False
@@ -52,15 +142,330 @@ class Connection:
         """The gRPC connection channel to the platform."""
         return self._channel if self._open else None
 
+    @property
+    def bulk_channel(self):
+        """The gRPC connection channel used for bulk transfers to and from the platform.
+
+        This is the same as `channel` unless `ChannelOptions.separate_bulk_channel` is
+        set.
+        """
+        return self._bulk_channel if self._open else None
+
     @property
     def is_open(self):
         """If the gRPC connection to the platform is open."""
         return self._open
 
 
-def ServiceHubCall(call=None, errormsg="Error executing command", tries=5):
+class AsyncConnection:
+    """Asynchronous counterpart to `Connection` based on `grpc.aio`.
+
+    The channel is bound to the event loop it is opened in, so `open` has to be called
+    from within a running event loop.
+    """
+
+    def __init__(
+        self,
+        ip="0.0.0.0",
+        port=50058,
+        channel_options: ChannelOptions | None = None,
+    ):
+        self.ip = ip
+        self.port = port
+        self.grpc_connection = f"{self.ip}:{self.port}"
+        self.channel_options = channel_options or ChannelOptions()
+        self._channel = None
+        self._stubs = {}
+
+    def open(self):
+        """Opens the connection to the platform."""
+        if self._channel is None:
+            self._channel = grpc.aio.insecure_channel(
+                self.grpc_connection,
+                options=self.channel_options.grpc_options(),
+                compression=self.channel_options.compression,
+                interceptors=[_AsyncDeadlineInterceptor()],
+            )
+
+    async def close(self):
+        """Closes the connection to the platform."""
+        if self._channel is not None:
+            await self._channel.close()
+        self._channel = None
+        self._stubs = {}
+
+    @property
+    def is_open(self):
+        """If the gRPC connection to the platform is open."""
+        return self._channel is not None
+
+    def stub(self, stub_class):
+        """Returns an instance of the given gRPC service stub using this connection."""
+        if not self.is_open:
+            raise RuntimeError("No connection! Open the connection first.")
+        if stub_class not in self._stubs:
+            self._stubs[stub_class] = stub_class(self._channel)
+        return self._stubs[stub_class]
+
+
+class _ClientCallDetails(
+    namedtuple(
+        "_ClientCallDetails",
+        (
+            "method",
+            "timeout",
+            "metadata",
+            "credentials",
+            "wait_for_ready",
+            "compression",
+        ),
+    ),
+    grpc.ClientCallDetails,
+):
+    pass
+
+
+# Monotonic time until which the innermost running `ServiceHubCall` has to finish
+_deadline: ContextVar[float | None] = ContextVar("servicehub_deadline", default=None)
+
+
+def _remaining_timeout(timeout: float | None) -> float | None:
+    """The timeout for a new RPC respecting the deadline of the surrounding call."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = max(0.0, deadline - time.monotonic())
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class _DeadlineInterceptor(
+    grpc.UnaryUnaryClientInterceptor,
+    grpc.UnaryStreamClientInterceptor,
+    grpc.StreamUnaryClientInterceptor,
+    grpc.StreamStreamClientInterceptor,
+):
+    """Passes the deadline of the surrounding `ServiceHubCall` on to each RPC."""
+
+    @staticmethod
+    def _details(details: grpc.ClientCallDetails) -> grpc.ClientCallDetails:
+        if _deadline.get() is None:
+            return details
+        return _ClientCallDetails(
+            details.method,
+            _remaining_timeout(details.timeout),
+            details.metadata,
+            details.credentials,
+            getattr(details, "wait_for_ready", None),
+            getattr(details, "compression", None),
+        )
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        return continuation(self._details(client_call_details), request)
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        return continuation(self._details(client_call_details), request)
+
+    def intercept_stream_unary(self, continuation, client_call_details, requests):
+        return continuation(self._details(client_call_details), requests)
+
+    def intercept_stream_stream(self, continuation, client_call_details, requests):
+        return continuation(self._details(client_call_details), requests)
+
+
+class _AsyncDeadlineInterceptor(
+    grpc.aio.UnaryUnaryClientInterceptor, grpc.aio.UnaryStreamClientInterceptor
+):
+    """Equivalent of `_DeadlineInterceptor` for `grpc.aio` channels."""
+
+    @staticmethod
+    def _details(details: grpc.aio.ClientCallDetails) -> grpc.aio.ClientCallDetails:
+        if _deadline.get() is None:
+            return details
+        return grpc.aio.ClientCallDetails(
+            details.method,
+            _remaining_timeout(details.timeout),
+            details.metadata,
+            details.credentials,
+            details.wait_for_ready,
+        )
+
+    async def intercept_unary_unary(self, continuation, client_call_details, request):
+        return await continuation(self._details(client_call_details), request)
+
+    async def intercept_unary_stream(self, continuation, client_call_details, request):
+        return await continuation(self._details(client_call_details), request)
+
+
+@dataclass
+class RetryStatistics:
+    """Statistics of the calls of a single method decorated with `ServiceHubCall`.
+
+    :param calls: How often the method was called.
+    :param retries: How often a call was repeated after a failed RPC.
+    :param failures: How many calls failed after all attempts.
+    :param last_error: The status code of the last failed RPC, if any.
+    """
+
+    calls: int = 0
+    retries: int = 0
+    failures: int = 0
+    last_error: grpc.StatusCode | None = None
+
+
+class RetryMetrics:
+    """Collects the `RetryStatistics` of all methods decorated with `ServiceHubCall`.
+
+    The statistics are global for the process and can be obtained using
+    :python:`retry_metrics.snapshot()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statistics: dict[str, RetryStatistics] = {}
+
+    def _get(self, name: str) -> RetryStatistics:
+        return self._statistics.setdefault(name, RetryStatistics())
+
+    def record_call(self, name: str):
+        with self._lock:
+            self._get(name).calls += 1
+
+    def record_error(self, name: str, code: grpc.StatusCode, retry: bool):
+        with self._lock:
+            statistics = self._get(name)
+            statistics.last_error = code
+            if retry:
+                statistics.retries += 1
+            else:
+                statistics.failures += 1
+
+    def snapshot(self) -> dict[str, RetryStatistics]:
+        """A copy of the statistics, indexed by the qualified name of the method."""
+        with self._lock:
+            return {
+                name: replace(statistics)
+                for name, statistics in self._statistics.items()
+            }
+
+    def reset(self):
+        """Discards all collected statistics."""
+        with self._lock:
+            self._statistics.clear()
+
+
+retry_metrics = RetryMetrics()
+
+# Exponential backoff between two attempts of a `ServiceHubCall` (in seconds)
+_INITIAL_BACKOFF = 0.05
+_MAX_BACKOFF = 2.0
+
+# Status codes of errors which will not be resolved by retrying the call
+_NOT_RETRIED = {
+    grpc.StatusCode.NOT_FOUND,
+    grpc.StatusCode.INVALID_ARGUMENT,
+    grpc.StatusCode.UNIMPLEMENTED,
+}
+
+
+class _Attempts:
+    """Tracks the attempts of a single `ServiceHubCall` and decides about retries."""
+
+    def __init__(
+        self,
+        name: str,
+        errormsg: str,
+        tries: int,
+        idempotent: bool,
+        timeout: float | None,
+    ):
+        self.name = name
+        self.errormsg = errormsg
+        # Non-idempotent calls could be executed twice if they were retried
+        self.tries = tries if idempotent else 1
+        outer = _deadline.get()
+        self.deadline = outer
+        if timeout is not None:
+            own = time.monotonic() + timeout
+            self.deadline = own if outer is None else min(outer, own)
+        self.attempt = 0
+        self._code = None
+        self._details = None
+        retry_metrics.record_call(name)
+
+    def backoff(self, error: grpc.RpcError) -> float | None:
+        """Handles a failed attempt and returns the time to wait before the next one.
+
+        :return: The delay in seconds, or None if the call should not be retried.
+        :raises: The appropriate exception for errors which should not be retried.
+        """
+        self._code = error.code()  # pylint: disable=no-member
+        self._details = error.details()  # pylint: disable=no-member
+        self.attempt += 1
+        delay = random.uniform(
+            0, min(_MAX_BACKOFF, _INITIAL_BACKOFF * 2 ** (self.attempt - 1))
+        )
+        retry = (
+            self._code not in _NOT_RETRIED
+            and self.attempt < self.tries
+            and (self.deadline is None or time.monotonic() + delay < self.deadline)
+        )
+        retry_metrics.record_error(self.name, self._code, retry)
+        if self._code == grpc.StatusCode.NOT_FOUND:
+            raise error  # No retry
+        if self._code == grpc.StatusCode.INVALID_ARGUMENT:
+            raise ValueError(self._details) from error
+        if self._code == grpc.StatusCode.UNIMPLEMENTED:
+            raise NotImplementedError(self._details) from error
+        if not retry:
+            return None
+        _log.info(
+            "%s failed (%s). Retry %d of %d in %.3f s...",
+            self.name,
+            self._code,
+            self.attempt,
+            self.tries - 1,
+            delay,
+        )
+        return delay
+
+    def error(self) -> RuntimeError:
+        return RuntimeError(
+            f"{self.errormsg} ({self._code}). Error message:\n{self._details}"
+        )
+
+
+def ServiceHubCall(
+    call=None,
+    errormsg="Error executing command",
+    tries=5,
+    idempotent=True,
+    timeout: float | None = None,
+):
+    """Decorator for methods of platform components executing remote procedure calls.
+
+    Failed calls are retried with exponential backoff and jitter. The attempts and
+    errors are counted in `retry_metrics`.
+
+    :param errormsg:
+        The message of the exception raised if all attempts failed.
+    :param tries:
+        The maximum number of attempts, by default 5.
+    :param idempotent:
+        If the call can safely be executed more than once. Non-idempotent calls (like
+        starting a task or submitting a job) are not retried, by default True.
+    :param timeout:
+        The time in seconds after which all RPCs of the call (including retries) have
+        to be finished, by default None (no deadline). It is passed on as deadline to
+        the RPCs, also to those issued by nested calls.
+    """
     if call is None:
-        return functools.partial(ServiceHubCall, errormsg=errormsg, tries=tries)
+        return functools.partial(
+            ServiceHubCall,
+            errormsg=errormsg,
+            tries=tries,
+            idempotent=idempotent,
+            timeout=timeout,
+        )
 
     @wrapt.decorator
     def call_wrapper(call, instance, args, kwargs):
@@ -68,21 +473,58 @@ def ServiceHubCall(call=None, errormsg="Error executing command", tries=5):
             instance = args[0]
         if not instance._conn.is_open:
             raise RuntimeError("No connection! Create a new QiController instance.")
-        for attempt in range(tries):
-            try:
-                return call(*args, **kwargs)
-            except grpc.RpcError as error:
-                code = error.code()  # pylint: disable=no-member
-                details = error.details()  # pylint: disable=no-member
-                if code == grpc.StatusCode.NOT_FOUND:
-                    raise  # No retry
-                if code == grpc.StatusCode.INVALID_ARGUMENT:
-                    raise ValueError(details) from error
-                if code == grpc.StatusCode.UNIMPLEMENTED:
-                    raise NotImplementedError(details) from error
-
-                if attempt < tries - 1:
-                    print(f"Internal Error. Retry {attempt + 1} of {tries - 1}...")
-            raise RuntimeError(f"{errormsg} ({code}). Error message:\n{details}")
+        attempts = _Attempts(call.__qualname__, errormsg, tries, idempotent, timeout)
+        token = _deadline.set(attempts.deadline)
+        try:
+            while True:
+                try:
+                    return call(*args, **kwargs)
+                except grpc.RpcError as error:
+                    delay = attempts.backoff(error)
+                if delay is None:
+                    raise attempts.error()
+                time.sleep(delay)
+        finally:
+            _deadline.reset(token)
+
+    return call_wrapper(call)  # pylint: disable=no-value-for-parameter
+
+
+def AsyncServiceHubCall(
+    call=None,
+    errormsg="Error executing command",
+    tries=5,
+    idempotent=True,
+    timeout: float | None = None,
+):
+    """Equivalent of `ServiceHubCall` for coroutine methods of asynchronous components."""
+    if call is None:
+        return functools.partial(
+            AsyncServiceHubCall,
+            errormsg=errormsg,
+            tries=tries,
+            idempotent=idempotent,
+            timeout=timeout,
+        )
+
+    @wrapt.decorator
+    async def call_wrapper(call, instance, args, kwargs):
+        if instance is None:
+            instance = args[0]
+        if not instance._conn.is_open:
+            raise RuntimeError("No connection! Open the AsyncQiController first.")
+        attempts = _Attempts(call.__qualname__, errormsg, tries, idempotent, timeout)
+        token = _deadline.set(attempts.deadline)
+        try:
+            while True:
+                try:
+                    return await call(*args, **kwargs)
+                except grpc.RpcError as error:
+                    delay = attempts.backoff(error)
+                if delay is None:
+                    raise attempts.error()
+                await asyncio.sleep(delay)
+        finally:
+            _deadline.reset(token)
 
     return call_wrapper(call)  # pylint: disable=no-value-for-parameter
@@ -18,7 +18,9 @@
 from __future__ import annotations
 
 import math
+import time
 import warnings
+from collections.abc import Callable
 
 import numpy as np
 
@@ -217,3 +219,89 @@ def calculate_stater_state(data_I, data_Q, config):
 
 def flatten(list):
     return [item for sublist in list for item in sublist]
+
+
+def _state_layout(dense: bool) -> tuple[int, int, int]:
+    """Returns the bits per state, the states per 32-bit word and the state mask."""
+    bits = 1 if dense else 3
+    return bits, 32 // bits, (1 << bits) - 1
+
+
+def unpack_states(values, dense: bool = False, count: int | None = None) -> np.ndarray:
+    """Unpacks qubit states which are packed into 32-bit unsigned integers.
+
+    By default, each word contains 10 states with 3 bits each, starting with the least
+    significant bits. In dense mode, each word contains 32 states with one bit each.
+
+    :param values: The packed states.
+    :param dense: If the states are stored in dense mode.
+    :param count: The number of states to return, as the last word might only be
+        partially filled. By default, all states are returned.
+    :return: The unpacked states as one-dimensional uint8 array.
+    """
+    bits, per_word, mask = _state_layout(dense)
+    words = np.asarray(values, dtype=np.uint32).ravel()
+    states = np.empty((words.size, per_word), dtype=np.uint8)
+    for position in range(per_word):
+        states[:, position] = (words >> np.uint32(bits * position)) & np.uint32(mask)
+    return states.ravel()[:count]
+
+
+def count_states(values, dense: bool = False, count: int | None = None) -> np.ndarray:
+    """Counts the occurrence of each qubit state without unpacking all of them.
+
+    See `unpack_states` for the parameters.
+
+    :return: An array with the number of occurrences of each possible state.
+    """
+    bits, per_word, mask = _state_layout(dense)
+    words = np.asarray(values, dtype=np.uint32).ravel()
+    total = words.size * per_word
+    if count is not None:
+        total = min(max(count, 0), total)
+    histogram = np.zeros(mask + 1, dtype=np.int64)
+    for position in range(per_word):
+        # Number of words holding a state at this position within the first `total`
+        words_used = max(total - position + per_word - 1, 0) // per_word
+        histogram += np.bincount(
+            (words[:words_used] >> np.uint32(bits * position)) & np.uint32(mask),
+            minlength=mask + 1,
+        )
+    return histogram
+
+
+def wait_until(
+    condition: Callable[[], bool],
+    timeout: float | None = None,
+    on_poll: Callable[[], None] | None = None,
+    initial_delay: float = 1e-3,
+    max_delay: float = 0.2,
+):
+    """Waits until the condition is fulfilled by polling it with exponential backoff.
+
+    The delay between two polls starts at `initial_delay` and doubles after each poll
+    until it reaches `max_delay`. Short waits therefore end with little latency while
+    long waits do not occupy the CPU or flood the QiController with requests.
+
+    :param condition: Function returning True as soon as the wait is over.
+    :param timeout: Maximum time in seconds to wait, by default there is no limit.
+    :param on_poll:
+        Called each time the condition is not fulfilled (before sleeping), e.g. to
+        check for errors or to update the progress.
+    :param initial_delay: Delay in seconds after the first poll.
+    :param max_delay: Maximum delay in seconds between two polls.
+
+    :raises TimeoutError: if the condition is not fulfilled within the timeout.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = min(initial_delay, max_delay)
+    while not condition():
+        if on_poll is not None:
+            on_poll()
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Condition not fulfilled within {timeout} s.")
+            delay = min(delay, remaining)
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
@@ -54,6 +54,7 @@ def test_something(): ...  # Test something that uses many hardware component, f
 """
 
 from mocks import (
+    aio,
     digital_trigger,
     pimc,
     pulse_gen,
@@ -69,6 +70,7 @@ from mocks.unit_cell import MockUnitCellServiceStub
 
 __all__ = [
     "MockUnitCellServiceStub",
+    "aio",
     "digital_trigger",
     "pimc",
     "pulse_gen",
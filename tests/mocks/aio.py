@@ -0,0 +1,60 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Lukas Scheller, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Makes the (synchronous) mock service stubs usable with `grpc.aio` channels.
+
+Patch this together with the mocks of the used services, i.e.
+`@mocks.patch(aio, sequencer, ...)`.
+"""
+
+from collections.abc import Iterator
+from unittest import mock
+
+
+class AsyncStubAdapter:
+    """Wraps a mock stub so unary calls are awaitable and streams are async iterable."""
+
+    def __init__(self, stub):
+        self._stub = stub
+
+    def __getattr__(self, name):
+        method = getattr(self._stub, name)
+
+        def call(request):
+            result = method(request)
+            if isinstance(result, Iterator):
+                return _async_iter(result)
+            return _completed(result)
+
+        return call
+
+
+async def _async_iter(iterable):
+    for item in iterable:
+        yield item
+
+
+async def _completed(result):
+    return result
+
+
+def _stub(self, stub_class):
+    if not self.is_open:
+        raise RuntimeError("No connection! Open the connection first.")
+    return AsyncStubAdapter(stub_class(None))
+
+
+def patch():
+    return mock.patch("qiclib.packages.servicehub.AsyncConnection.stub", new=_stub)
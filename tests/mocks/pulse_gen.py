@@ -32,6 +32,9 @@ class MockPulseGenServiceStub:
     def GetStatusFlags(self, _):
         return StatusFlags()
 
+    def ResetStatusFlags(self, _):
+        pass
+
     def ResetEnvelopeMemory(self, _):
         pass
 
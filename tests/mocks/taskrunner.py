@@ -17,6 +17,7 @@ from __future__ import annotations
 
 from unittest import mock
 
+from mocks.unit_cell import MockResponseStream
 from qiclib.packages.grpc.taskrunner_pb2 import *
 
 
@@ -41,8 +42,11 @@ def _get_databoxes(dtype):
         reply = DataboxReplyUINT32
     else:
         raise AssertionError
-    for idx, all_data in _settings.databoxs[dtype].items():
-        yield from (reply(data=single, index=idx) for single in all_data)
+    return MockResponseStream(
+        reply(data=single, index=idx)
+        for idx, all_data in _settings.databoxs.get(dtype, {}).items()
+        for single in all_data
+    )
 
 
 class MockTaskRunnerServiceStub:
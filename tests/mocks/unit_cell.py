@@ -15,18 +15,42 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from unittest import mock
 
+from qiclib.packages.grpc.datatypes_pb2 import UInt
 from qiclib.packages.grpc.qic_unitcell_pb2 import *
 
 
+class MockResponseStream:
+    """Mimics the response iterator of a server streaming gRPC call."""
+
+    def __init__(self, responses):
+        self._responses = iter(responses)
+        self.cancelled = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.cancelled:
+            raise StopIteration
+        return next(self._responses)
+
+    def cancel(self):
+        self.cancelled = True
+
+
 class MockUnitCellServiceStub:
+    cell_count = 1
+
     def __init__(self, _):
-        pass
+        self.submitted_jobs: dict[int, Job] = {}
+        self.queued_jobs: list[int] = []
+        self.max_queued = 0
 
     def GetCellInfo(self, _):
         return CellInfo()
 
     def GetAllCellInfo(self, _):
-        return AllCellInfo(cells=[CellInfo()])
+        return AllCellInfo(cells=[CellInfo()] * self.cell_count)
 
     def GetConverterStatus(self, _):
         return ConverterStatus()
@@ -35,6 +59,10 @@ class MockUnitCellServiceStub:
         pass
 
     def RunExperiment(self, _):
+        return MockResponseStream(self.experiment_results())
+
+    @staticmethod
+    def experiment_results():
         yield from (
             ExperimentResults(
                 progress=prog,
@@ -55,6 +83,39 @@ class MockUnitCellServiceStub:
             ],
         )
 
+    def Submit(self, job):
+        job_id = len(self.submitted_jobs)
+        self.submitted_jobs[job_id] = job
+        self.queued_jobs.append(job_id)
+        self.max_queued = max(self.max_queued, len(self.queued_jobs))
+        return UInt(value=job_id)
+
+    def GetJobStatus(self, job_id):
+        if job_id.value not in self.submitted_jobs:
+            return JobStatus(status=JobStatus.NOT_PRESENT)
+        if job_id.value in self.queued_jobs:
+            return JobStatus(status=JobStatus.ENQUEUED)
+        return JobStatus(status=JobStatus.FINISHED)
+
+    def StreamResults(self, job_id):
+        """Finishes the job immediately. The data contains the job id as first value."""
+        self.queued_jobs.remove(job_id.value)
+        job = self.submitted_jobs[job_id.value]
+        yield ExperimentResults(progress=0, max_progress=1, mode=job.parameters.mode)
+        yield ExperimentResults(
+            progress=1,
+            max_progress=1,
+            finished=True,
+            mode=job.parameters.mode,
+            results=[
+                ExperimentResults.SingleCellResults(
+                    data_double_1=[job_id.value] * recordings,
+                    data_double_2=[0] * recordings,
+                )
+                for recordings in job.parameters.recordings
+            ],
+        )
+
     def GetBusyCells(self, _):
         return BusyCellInfo(busy=False)
 
@@ -0,0 +1,116 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+
+import mocks
+import numpy as np
+import pytest
+from mocks import (
+    aio,
+    digital_trigger,
+    pimc,
+    pulse_gen,
+    recording,
+    rfdc,
+    sequencer,
+    servicehub_control,
+    storage,
+    taskrunner,
+    unit_cell,
+)
+from numpy.testing import assert_array_equal
+
+from qiclib import AsyncQiController, QiController
+from qiclib.hardware.taskrunner import TaskRunner
+
+
+@mocks.patch(
+    aio,
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestAsyncQiController:
+    @staticmethod
+    def _run(controller, coroutine_function):
+        async def run():
+            async with AsyncQiController(controller) as aqic:
+                return await coroutine_function(aqic)
+
+        return asyncio.run(run())
+
+    def test_configure_cells_concurrently(self):
+        controller = QiController("IP")
+
+        async def configure(aqic: AsyncQiController):
+            await asyncio.gather(
+                *(
+                    call
+                    for cell in aqic.cell
+                    for call in (
+                        cell.sequencer.load_program_code([1, 2, 3], "program"),
+                        cell.storage.write_raw_memory(0, [4, 5]),
+                        cell.readout.load_pulse(1, [0.5, 0.5]),
+                        cell.manipulation.load_pulse(1, [0.5j, 0.5j], hold=True),
+                    )
+                )
+            )
+
+        self._run(controller, configure)
+        assert controller.cell[0].sequencer.program_description == "program"
+
+    def test_run_experiment(self):
+        controller = QiController("IP")
+        progress = []
+
+        async def run(aqic: AsyncQiController):
+            return await aqic.cell.run_experiment(
+                1, [0], [1], progress_callback=progress.append
+            )
+
+        expected = controller.cell.run_experiment(1, [0], [1])
+        results = self._run(controller, run)
+        assert len(results) == len(expected) == 1
+        assert_array_equal(results[0][0], expected[0][0])
+        assert_array_equal(results[0][1], expected[0][1])
+        assert progress == [0, 5, 10]
+
+    def test_get_databoxes_with_mode(self):
+        controller = QiController("IP")
+
+        async def fetch(aqic: AsyncQiController):
+            return await aqic.taskrunner.get_databoxes_with_mode(
+                TaskRunner.DataMode.INT32
+            )
+
+        with taskrunner.patch({"int32": {0: [[1, 2], [3]], 1: [[4]]}}):
+            first, second = self._run(controller, fetch)
+        assert_array_equal(first, [1, 2, 3])
+        assert_array_equal(second, [4])
+        assert first.dtype == np.int32
+
+    def test_requires_open_connection(self):
+        controller = QiController("IP")
+        aqic = AsyncQiController(controller)
+        with pytest.raises(RuntimeError, match="No connection"):
+            asyncio.run(aqic.cell[0].sequencer.load_program_code([1]))
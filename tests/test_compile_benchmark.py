@@ -0,0 +1,49 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""Ensures the compiler benchmarks keep working, using small job sizes."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import compile_benchmark
+
+
+@pytest.mark.parametrize("name", compile_benchmark.BENCHMARKS)
+def test_benchmark(name):
+    result = compile_benchmark.run_benchmark(name, size=2, repeat=1)
+
+    assert set(result.timings) == set(compile_benchmark.PHASES)
+    assert all(len(values) == 1 for values in result.timings.values())
+    assert result.medians()["build"] > 0
+    assert result.peak_memory > 0
+
+
+def test_compare_reports_regressions(tmp_path, capsys):
+    results = tmp_path / "results.json"
+    args = ["array_variables", "--size", "2", "--repeat", "1"]
+    assert compile_benchmark.main([*args, "--json", str(results)]) == 0
+
+    baseline = json.loads(results.read_text())
+    baseline["benchmarks"]["array_variables"]["timings"]["total"] = 1e-9
+    results.write_text(json.dumps(baseline))
+
+    assert compile_benchmark.main([*args, "--compare", str(results)]) == 1
+    assert "Regressions" in capsys.readouterr().out
@@ -0,0 +1,174 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from typing import ClassVar
+from unittest import mock
+
+import grpc
+import mocks
+import numpy as np
+import pytest
+from mocks import (
+    digital_trigger,
+    pimc,
+    pulse_gen,
+    recording,
+    rfdc,
+    sequencer,
+    servicehub_control,
+    storage,
+    taskrunner,
+    unit_cell,
+)
+from numpy.testing import assert_array_equal
+
+from qiclib import QiController
+from qiclib.hardware.taskrunner import TaskRunner
+from qiclib.packages.servicehub import ChannelOptions
+
+
+@mock.patch.object(unit_cell.MockUnitCellServiceStub, "cell_count", 4)
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestStatusSnapshot:
+    def test_contains_all_modules(self):
+        controller = QiController("IP")
+        snapshot = controller.get_status_snapshot()
+        assert len(snapshot) == 3 * 4 + 2
+        assert "Cell 3 Recording" in snapshot
+        assert not any(snapshot.values())
+        assert controller.check_errors()
+
+    def test_reports_errors_of_single_module(self):
+        controller = QiController("IP")
+        controller.status_request_workers = 1
+        with mock.patch.object(
+            pulse_gen.MockPulseGenServiceStub,
+            "GetStatusFlags",
+            return_value=pulse_gen.StatusFlags(saturation=True),
+        ):
+            snapshot = controller.get_status_snapshot()
+        assert snapshot["Cell 2 Control PG"].endswith("lead to saturation!")
+        assert snapshot["Cell 2 Recording"] == ""
+
+        with (
+            mock.patch.object(
+                pulse_gen.MockPulseGenServiceStub,
+                "GetStatusFlags",
+                return_value=pulse_gen.StatusFlags(saturation=True),
+            ),
+            pytest.raises(Warning, match="Cell 0 Readout PG returned"),
+        ):
+            controller.check_errors(stop_on_error=False)
+
+
+def test_channel_options():
+    assert ChannelOptions().grpc_options() == []
+    options = dict(
+        ChannelOptions(
+            max_message_length=64 * 2**20, keepalive_time=10, keepalive_timeout=2.5
+        ).grpc_options()
+    )
+    assert options["grpc.max_send_message_length"] == 64 * 2**20
+    assert options["grpc.max_receive_message_length"] == 64 * 2**20
+    assert options["grpc.keepalive_time_ms"] == 10000
+    assert options["grpc.keepalive_timeout_ms"] == 2500
+
+
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestChannels:
+    def test_shares_channel_by_default(self):
+        controller = QiController("IP")
+        assert controller._conn.bulk_channel is controller._conn.channel
+        assert controller.cell._bulk_stub is controller.cell._stub
+
+    def test_separate_bulk_channel(self):
+        with mock.patch("grpc.insecure_channel", wraps=grpc.insecure_channel) as create:
+            controller = QiController(
+                "IP", channel_options=ChannelOptions(separate_bulk_channel=True)
+            )
+        assert controller._conn.bulk_channel is not controller._conn.channel
+        # Identical channel arguments would share one connection
+        (control_call, bulk_call) = create.call_args_list
+        control_options = dict(control_call.kwargs["options"])
+        bulk_options = dict(bulk_call.kwargs["options"])
+        assert control_options != bulk_options
+        assert bulk_options["grpc.use_local_subchannel_pool"] == 1
+        assert len(controller.cell.run_experiment(1, [0], [1])) == 1
+        controller._conn.close()
+        assert controller._conn.bulk_channel is None
+
+
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestDataboxes:
+    databoxes: ClassVar[dict] = {
+        "uint64": {0: [[1, 2], [3]], 1: [[2**64 - 1]], 2: [[5]]}
+    }
+
+    def test_get_databoxes_returns_arrays(self):
+        controller = QiController("IP")
+        with taskrunner.patch(self.databoxes):
+            boxes = controller.taskrunner.get_databoxes_UINT64()
+        assert len(boxes) == 3
+        assert_array_equal(boxes[0], [1, 2, 3])
+        assert boxes[1][0] == 2**64 - 1
+        assert all(box.dtype == np.uint64 for box in boxes)
+
+    def test_iter_databoxes_cancels_transfer_when_closed(self):
+        controller = QiController("IP")
+        with (
+            taskrunner.patch(self.databoxes),
+            mock.patch.object(
+                unit_cell.MockResponseStream, "cancel", autospec=True
+            ) as cancel,
+        ):
+            databoxes = controller.taskrunner.iter_databoxes_with_mode(
+                TaskRunner.DataMode.UINT64
+            )
+            assert_array_equal(next(databoxes), [1, 2, 3])
+            databoxes.close()
+        cancel.assert_called_once()
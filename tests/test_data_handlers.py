@@ -101,3 +101,64 @@ def test_iqcloud_handler_multiple_recordings(iqcloud_handler_factory):
             ]
         ),
     )
+
+
+def test_default_handler_distributes_recordings():
+    with QiJob() as job:
+        q = QiCells(1)
+        Recording(q[0], duration=1e-6, save_to="first")
+        Recording(q[0], duration=1e-6, save_to="second")
+        Recording(q[0], duration=1e-6, save_to="second")
+        Recording(q[0], duration=1e-6, save_to="first")
+        Recording(q[0], duration=1e-6, save_to="first")
+
+    job._build_program()
+
+    mock_data = [(np.arange(5, dtype=np.float64), -np.arange(5, dtype=np.float64))]
+    data_provider = DataProvider.create(result=mock_data, use_taskrunner=False)
+    DataHandler.get_factory_by_name("average")(
+        data_provider, job.cells, 1
+    ).process_results()
+    np.testing.assert_equal(job.cells[0].data("first"), [[0, 3, 4], [0, -3, -4]])
+    np.testing.assert_equal(job.cells[0].data("second"), [[1, 2], [-1, -2]])
+    # Consecutive recordings are returned as views of the result data
+    assert np.shares_memory(job.cells[0].data("second")[0], mock_data[0][0])
+
+
+def test_iqcloud_handler_taskrunner(iqcloud_handler_factory):
+    with QiJob() as job:
+        q = QiCells(1)
+        Recording(q[0], duration=1e-6, save_to="first")
+        Recording(q[0], duration=1e-6, save_to="second")
+
+    job._build_program()
+
+    # One databox per recording with interleaved I and Q values
+    mock_data = [[1, -1, 2, -2, 3, -3], [4, -4, 5, -5, 6, -6]]
+    data_provider = DataProvider.create(result=mock_data, use_taskrunner=True)
+    iqcloud_handler = iqcloud_handler_factory(data_provider, job.cells, 3)
+    iqcloud_handler.process_results()
+    np.testing.assert_equal(job.cells[0].data("first"), [[1, 2, 3], [-1, -2, -3]])
+    np.testing.assert_equal(job.cells[0].data("second"), [[4, 5, 6], [-4, -5, -6]])
+
+
+def test_state_counts_handler():
+    with QiJob() as job:
+        q = QiCells(1)
+        Recording(q[0], duration=1e-6, save_to="result")
+
+    job._build_program()
+
+    # Ten states of 3 bits each per word, the second word is only partially used
+    packed = sum(
+        state << (3 * i) for i, state in enumerate([1, 0, 1, 2, 0, 1, 0, 0, 1, 3])
+    )
+    data_provider = DataProvider.create(result=[[packed, 1]], use_taskrunner=False)
+    handler = DataHandler.get_factory_by_name("state_counts")(
+        data_provider, job.cells, 12
+    )
+    handler.process_results()
+    np.testing.assert_equal(
+        job.cells[0].data("result"),
+        np.array([5, 5, 1, 1, 0, 0, 0, 0]),
+    )
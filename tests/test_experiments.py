@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import warnings
+from unittest import mock
 
 import mocks
 import pytest
@@ -33,7 +34,7 @@ from numpy.testing import assert_array_equal
 
 from qiclib import QiController
 from qiclib.code import *
-from qiclib.experiment.qicode.base import _TaskrunnerSettings
+from qiclib.experiment.qicode.base import CellConfigurationError, _TaskrunnerSettings
 from qiclib.hardware.taskrunner import TaskRunner
 
 
@@ -98,3 +99,256 @@ def test_taskrunner_setting_updates():
     assert settings == _TaskrunnerSettings(
         "new_file.c", "Task", (1, 2), TaskRunner.DataMode.UINT8, None
     )
+
+
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestSubmitMany:
+    @staticmethod
+    def _jobs(count: int):
+        jobs = []
+        for index in range(count):
+            with QiJob() as job:
+                q = QiCells(1)
+                PlayReadout(q[0], QiPulse(100e-9 * (index + 1), frequency=60e6))
+                Recording(q[0], duration=400e-9, offset=0, save_to="result")
+            jobs.append(job)
+        return jobs
+
+    def test_yields_all_jobs_with_their_results(self):
+        controller = QiController("IP")
+        jobs = self._jobs(5)
+        finished = list(QiJob.submit_many(jobs, controller, max_in_flight=2))
+        assert finished == jobs
+        for job_id, job in enumerate(jobs):
+            assert_array_equal(job.cells[0].data("result")[0], [job_id])
+
+    def test_limits_jobs_in_flight(self):
+        controller = QiController("IP")
+        stub = controller.cell._stub
+        for _ in QiJob.submit_many(self._jobs(6), controller, max_in_flight=3):
+            assert len(stub.queued_jobs) <= 3
+        assert len(stub.submitted_jobs) == 6
+        assert stub.max_queued == 3
+        assert not stub.queued_jobs
+
+    def test_submit_batch_sets_parameters(self):
+        controller = QiController("IP")
+        experiments = [
+            job.create_experiment(controller, averages=10, data_collection="iqcloud")
+            for job in self._jobs(2)
+        ]
+        batch = controller.cell.submit_batch(
+            [exp.prepare_submission() for exp in experiments]
+        )
+        assert [(index, job_id) for index, job_id, _ in batch] == [(0, 0), (1, 1)]
+        for job in controller.cell._stub.submitted_jobs.values():
+            assert job.parameters.shots == 10
+            assert list(job.parameters.recordings) == [1]
+
+    def test_invalid_max_in_flight(self):
+        controller = QiController("IP")
+        with pytest.raises(ValueError):
+            list(controller.cell.submit_batch([], max_in_flight=0))
+
+
+@mock.patch.object(unit_cell.MockUnitCellServiceStub, "cell_count", 4)
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestParallelConfiguration:
+    @staticmethod
+    def _experiment(controller, cell_count: int, failing_cells=(), **kwargs):
+        with QiJob() as job:
+            q = QiCells(cell_count)
+            for cell in range(cell_count):
+                PlayReadout(q[cell], QiPulse(4e-9 * (cell + 1), frequency=60e6))
+        experiment = job.create_experiment(controller, **kwargs)
+        for cell in failing_cells:
+            # Exceed the number of available trigger sets after compilation
+            job.cells[cell].readout_pulses.extend([QiPulse(4e-9)] * 13)
+        return experiment
+
+    def test_configures_all_cells(self):
+        controller = QiController("IP")
+        experiment = self._experiment(controller, 4, cell_map=[3, 2, 1, 0])
+        experiment.parallel_configuration = 4
+        with mock.patch.object(
+            sequencer.MockSequencer, "LoadProgram", autospec=True
+        ) as load_program:
+            experiment.configure()
+        loaded = sorted(
+            list(call.args[1].program_data) for call in load_program.call_args_list
+        )
+        assert loaded == sorted(experiment._seq_instructions)
+
+    def test_reports_failed_cells_in_order(self):
+        controller = QiController("IP")
+        experiment = self._experiment(
+            controller, 4, failing_cells=[2, 0], cell_map=[3, 2, 1, 0]
+        )
+        experiment.parallel_configuration = 4
+        with pytest.raises(CellConfigurationError) as error:
+            experiment.configure()
+        assert [(cell, step) for cell, step, _ in error.value.errors] == [
+            (3, "readout"),
+            (1, "readout"),
+        ]
+        assert "Cell 1 (readout)" in str(error.value)
+        assert isinstance(error.value.__cause__, RuntimeError)
+
+    def test_serial_configuration_raises_original_error(self):
+        controller = QiController("IP")
+        experiment = self._experiment(controller, 2, failing_cells=[1])
+        with pytest.raises(RuntimeError, match="Number of readouts exceeded 13"):
+            experiment.configure()
+
+
+def _iq_chunks(*chunks):
+    def experiment_results():
+        for progress, chunk in enumerate(chunks):
+            yield unit_cell.ExperimentResults(
+                progress=progress,
+                results=[
+                    unit_cell.ExperimentResults.SingleCellResults(
+                        data_sint32_1=chunk, data_sint32_2=[-x for x in chunk]
+                    )
+                ],
+            )
+
+    return staticmethod(experiment_results)
+
+
+@mocks.patch(
+    pimc,
+    rfdc,
+    unit_cell,
+    sequencer,
+    servicehub_control,
+    storage,
+    recording,
+    pulse_gen,
+    taskrunner,
+    digital_trigger,
+)
+class TestStreaming:
+    @staticmethod
+    def _iq_job():
+        with QiJob() as job:
+            q = QiCells(1)
+            Recording(q[0], duration=400e-9, offset=0, save_to="first")
+            Recording(q[0], duration=400e-9, offset=0, save_to="second")
+        return job
+
+    def test_run_streamed_demultiplexes_chunks(self):
+        controller = QiController("IP")
+        job = self._iq_job()
+        with mock.patch.object(
+            unit_cell.MockUnitCellServiceStub,
+            "experiment_results",
+            _iq_chunks([0, 1, 2], [], [3, 4, 5]),
+        ):
+            updates = list(
+                job.run_streamed(controller, averages=3, data_collection="iqcloud")
+            )
+        first = job.cells[0]._result_container["first"]
+        second = job.cells[0]._result_container["second"]
+        assert len(updates) == 2
+        assert_array_equal(updates[0][first], [[0, 2], [0, -2]])
+        assert_array_equal(updates[0][second], [[1], [-1]])
+        assert_array_equal(updates[1][first], [[4], [-4]])
+        assert_array_equal(updates[1][second], [[3, 5], [-3, -5]])
+        # Streamed data is not accumulated
+        assert len(first.data) == 0
+
+    def test_closing_the_stream_cancels_the_experiment(self):
+        controller = QiController("IP")
+        streams = []
+        run_experiment = unit_cell.MockUnitCellServiceStub.RunExperiment
+
+        def record_stream(stub, request):
+            streams.append(run_experiment(stub, request))
+            return streams[-1]
+
+        with (
+            mock.patch.object(
+                unit_cell.MockUnitCellServiceStub,
+                "experiment_results",
+                _iq_chunks([0, 1], [2, 3]),
+            ),
+            mock.patch.object(
+                unit_cell.MockUnitCellServiceStub, "RunExperiment", record_stream
+            ),
+        ):
+            updates = self._iq_job().run_streamed(
+                controller, averages=2, data_collection="iqcloud"
+            )
+            next(updates)
+            updates.close()
+        assert streams[0].cancelled
+
+    def test_states_are_unpacked_per_chunk(self):
+        controller = QiController("IP")
+        with QiJob() as job:
+            q = QiCells(1)
+            Recording(q[0], duration=400e-9, offset=0, save_to="state")
+        packed = sum(state << (3 * i) for i, state in enumerate([1, 0, 1] * 3 + [1]))
+
+        def experiment_results():
+            for chunk in [[packed], [packed]]:
+                yield unit_cell.ExperimentResults(
+                    results=[
+                        unit_cell.ExperimentResults.SingleCellResults(data_uint32=chunk)
+                    ]
+                )
+
+        with mock.patch.object(
+            unit_cell.MockUnitCellServiceStub,
+            "experiment_results",
+            staticmethod(experiment_results),
+        ):
+            updates = list(
+                job.run_streamed(controller, averages=12, data_collection="states")
+            )
+        state = job.cells[0]._result_container["state"]
+        assert_array_equal(updates[0][state], [1, 0, 1] * 3 + [1])
+        assert_array_equal(updates[1][state], [1, 0])
+
+    def test_run_with_data_callback(self):
+        controller = QiController("IP")
+        job = self._iq_job()
+        received = []
+        with mock.patch.object(
+            unit_cell.MockUnitCellServiceStub,
+            "experiment_results",
+            _iq_chunks([0, 1], [2, 3]),
+        ):
+            future = job.run_with_data_callback(
+                received.append, controller, averages=2, data_collection="iqcloud"
+            )
+            future.result(timeout=10)
+        assert len(received) == 2
+
+    def test_unsupported_data_collection(self):
+        controller = QiController("IP")
+        with pytest.raises(NotImplementedError, match="Streaming is not supported"):
+            next(self._iq_job().run_streamed(controller))
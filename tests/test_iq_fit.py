@@ -19,7 +19,7 @@ import pickle
 import numpy as np
 import pytest
 
-from qiclib.measurement.iq_fit import IQFit
+from qiclib.measurement.iq_fit import IQFit, StateClassifier
 from qiclib.measurement.iq_plot import IQData, IQPlot
 
 
@@ -101,3 +101,58 @@ def test_fit_multiple_states():
     print(popt[0])
     print(popt[1])
     assert counts[0] / counts[1] == pytest.approx(100, abs=1)
+
+
+def test_state_classifier_assigns_nearest_center():
+    rand = np.random.RandomState(561876584)
+    centers = np.array([[0, 0], [10, 0], [0, 10]])
+    i_values, q_values = rand.uniform(-5, 15, size=(2, 1000))
+    classifier = StateClassifier(centers)
+    classifier.chunk_size = 64
+
+    distances = (i_values[:, None] - centers[:, 0]) ** 2 + (
+        q_values[:, None] - centers[:, 1]
+    ) ** 2
+    labels = classifier.classify(i_values, q_values)
+    np.testing.assert_array_equal(labels, np.argmin(distances, axis=1))
+    np.testing.assert_array_equal(
+        classifier.count(i_values, q_values), np.bincount(labels, minlength=3)
+    )
+
+
+def test_state_classifier_with_covariance():
+    # The second blob is wide along I: the point is closer to the first center, but
+    # much more likely to belong to the second blob
+    popts = [(1, 0, 1, 1, 1, 0), (1, 4, 1, 1, 10, np.pi / 2)]
+    point = ([1.5], [1])
+    assert StateClassifier.from_blobs(popts).classify(*point)[0] == 0
+    classifier = StateClassifier.from_blobs(popts, use_covariance=True)
+    assert classifier.classify(*point)[0] == 1
+
+
+def test_plane_segmentation_reuses_classifier():
+    rand = np.random.RandomState(561876584)
+    cov = [[45, 0], [0, 22]]
+    centers = [(-100, 80), (30, 55)]
+    dist = np.concatenate(
+        (
+            rand.multivariate_normal(centers[0], cov, size=30000),
+            rand.multivariate_normal(centers[1], cov, size=10000),
+        )
+    )
+    fit = IQFit(IQData(dist[:, 0], dist[:, 1]), bins=80)
+    classifier = StateClassifier(centers)
+    counts, labels, used = fit.get_plane_segmentation(classifier)
+    assert used is classifier
+    assert len(labels) == 40000
+    np.testing.assert_array_equal(counts, [30000, 10000])
+
+    other = IQFit(IQData(dist[::2, 0], dist[::2, 1]), bins=80)
+    other_counts, other_labels, _ = other.get_plane_segmentation(classifier)
+    np.testing.assert_array_equal(other_labels, labels[::2])
+    assert np.sum(other_counts) == 20000
+
+    count_list, center_list = fit.get_plane_segmentation_count(centers)
+    assert count_list.dtype == np.float64
+    np.testing.assert_array_equal(count_list, [30000, 10000])
+    np.testing.assert_array_equal(center_list, centers)
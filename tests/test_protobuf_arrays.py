@@ -0,0 +1,115 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+import qiclib.packages.grpc.qic_unitcell_pb2 as proto
+import qiclib.packages.grpc.taskrunner_pb2 as taskrunner_proto
+from qiclib.hardware.taskrunner import TaskRunner, _assemble_databoxes
+from qiclib.hardware.unitcell import _ResultCollector, _results_from_arrays
+from qiclib.packages.protobuf_arrays import decode_varints, packed_arrays
+
+SingleCellResults = proto.ExperimentResults.SingleCellResults
+
+
+def test_packed_arrays_match_repeated_fields():
+    rng = np.random.default_rng(1234)
+    message = SingleCellResults(
+        data_double_1=rng.normal(size=1000),
+        data_double_2=[-0.0, np.inf, 1e-300],
+        data_sint32_1=rng.integers(-(2**31), 2**31, size=1000),
+        data_sint32_2=[0, -1, 1, -64, 64, 2**31 - 1, -(2**31)],
+        data_uint32=rng.integers(0, 2**32, size=1000),
+    )
+    arrays = packed_arrays(message)
+    for name in ["data_double_1", "data_double_2"]:
+        assert arrays[name].dtype == np.float64
+        assert_array_equal(arrays[name], np.array(getattr(message, name)))
+    for name in ["data_sint32_1", "data_sint32_2"]:
+        assert arrays[name].dtype == np.int32
+        assert_array_equal(arrays[name], np.array(getattr(message, name)))
+    assert arrays["data_uint32"].dtype == np.uint32
+    assert_array_equal(arrays["data_uint32"], np.array(message.data_uint32))
+    assert arrays["data_uint32"].flags.writeable
+
+
+def test_packed_arrays_of_empty_message():
+    arrays = packed_arrays(SingleCellResults())
+    assert {name: len(values) for name, values in arrays.items()} == {
+        "data_double_1": 0,
+        "data_double_2": 0,
+        "data_sint32_1": 0,
+        "data_sint32_2": 0,
+        "data_uint32": 0,
+    }
+    assert arrays["data_sint32_1"].dtype == np.int32
+
+
+def test_packed_arrays_of_sign_extended_varints():
+    values = [0, -1, 1, -300, 2**31 - 1, -(2**31)]
+    data = packed_arrays(taskrunner_proto.DataboxReplyINT32(data=values))["data"]
+    assert data.dtype == np.int32
+    assert_array_equal(data, values)
+
+    values = [0, -1, 2**40, 2**63 - 1, -(2**63)]
+    data = packed_arrays(taskrunner_proto.DataboxReplyINT64(data=values))["data"]
+    assert data.dtype == np.int64
+    assert_array_equal(data, values)
+
+
+def test_assemble_databoxes_joins_replies_of_same_index():
+    replies = [
+        taskrunner_proto.DataboxReplyINT32(index=0, data=[1, -2]),
+        taskrunner_proto.DataboxReplyINT32(index=0, data=[3]),
+        taskrunner_proto.DataboxReplyINT32(index=1, data=[-4]),
+        taskrunner_proto.DataboxReplyINT32(index=2),
+    ]
+    first, second, third = _assemble_databoxes(replies, TaskRunner.DataMode.INT16.dtype)
+    assert_array_equal(first, [1, -2, 3])
+    assert_array_equal(second, [-4])
+    assert len(third) == 0
+    assert first.dtype == second.dtype == third.dtype == np.int16
+    assert _assemble_databoxes([], np.dtype(np.int32)) == []
+
+
+def test_decode_varints():
+    assert_array_equal(decode_varints(bytes([0, 1, 127])), [0, 1, 127])
+    assert_array_equal(decode_varints(bytes([0xAC, 0x02, 0x05])), [300, 5])
+    assert_array_equal(
+        decode_varints(bytes([0xFF] * 9 + [0x01])), [np.iinfo(np.uint64).max]
+    )
+    with pytest.raises(ValueError):
+        decode_varints(bytes([0x80]))
+
+
+def test_result_collector_concatenates_chunks():
+    collector = _ResultCollector()
+    for chunk in [[1, 2], [], [3]]:
+        collector.add(
+            proto.ExperimentResults(
+                results=[
+                    SingleCellResults(data_sint32_1=chunk, data_sint32_2=chunk),
+                    SingleCellResults(data_sint32_1=[-x for x in chunk]),
+                ]
+            )
+        )
+    (i0, q0), (i1, q1) = _results_from_arrays(proto.IQCLOUD, collector.arrays())
+    assert_array_equal(i0, [1, 2, 3])
+    assert_array_equal(q0, [1, 2, 3])
+    assert_array_equal(i1, [-1, -2, -3])
+    assert q1.dtype == np.int32
+    assert len(q1) == 0
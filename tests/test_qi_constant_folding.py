@@ -0,0 +1,126 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import warnings
+
+from qiclib.code.analysis.qi_constant_folding import fold_constants
+from qiclib.code.qi_command import AssignCommand, IfCommand, WaitCommand
+from qiclib.code.qi_jobs import (
+    Assign,
+    ForRange,
+    If,
+    QiCells,
+    QiJob,
+    QiTimeVariable,
+    QiVariable,
+    Wait,
+)
+from qiclib.code.qi_seq_instructions import SeqWaitImm, SeqWaitRegister
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_var_definitions import _QiCalcBase, _QiConstValue
+
+
+def test_fold_assignment():
+    with QiJob() as job:
+        x = QiVariable(int, 5)
+        y = QiVariable(int)
+        Assign(y, x * 3 + 1)
+
+    statistics = fold_constants(job)
+
+    assign = job.commands[3]
+    assert isinstance(assign, AssignCommand)
+    assert isinstance(assign.value, _QiConstValue)
+    assert assign.value.value == 16
+
+    assert statistics.folded_expressions == 1
+    assert statistics.saved_instructions == 2
+    assert statistics.saved_cycles == Sequencer.MULTIPLICATION_LENGTH + 1
+
+
+def test_unknown_values_are_not_folded():
+    with QiJob() as job:
+        x = QiVariable(int, 5)
+        named = QiVariable(int, 5, name="named")
+        y = QiVariable(int)
+        with If(y == 0):
+            Assign(x, 6)
+        Assign(y, x + 1)
+        Assign(y, named + 1)
+        with ForRange(x, 0, 10):
+            Assign(y, x + 1)
+
+    statistics = fold_constants(job)
+
+    assert statistics.folded_expressions == 0
+    for command in [*job.commands[6:8], job.commands[8].body[0]]:
+        assert isinstance(command.value, _QiCalcBase)
+
+
+def test_fold_wait_and_condition():
+    with QiJob() as job:
+        q = QiCells(1)
+        length = QiTimeVariable(20e-9)
+        x = QiVariable(int, 2)
+        Wait(q[0], length + 8e-9)
+        with If(x * 2 == 4):
+            Wait(q[0], length)
+
+    statistics = fold_constants(job)
+
+    wait = job.commands[4]
+    assert isinstance(wait, WaitCommand)
+    assert wait._length.value == 7
+
+    if_cm = job.commands[5]
+    assert isinstance(if_cm, IfCommand)
+    assert if_cm.condition.val1.value == 4
+    assert if_cm.body[0]._length.value == 5
+
+    assert statistics.folded_expressions == 3
+    assert statistics.saved_instructions == 2
+
+
+def test_build_program_reports_statistics():
+    with QiJob(skip_nco_sync=True) as job:
+        q = QiCells(1)
+        length = QiTimeVariable(20e-9)
+        Wait(q[0], 2 * length)
+
+    job._build_program()
+
+    assert job.constant_folding_statistics.folded_expressions == 1
+    assert job.constant_folding_statistics.saved_instructions == 1
+
+
+def test_folded_wait_is_built_like_a_constant_wait():
+    with QiJob(skip_nco_sync=True) as job:
+        q = QiCells(1)
+        length = QiTimeVariable(20e-9)
+        Wait(q[0], 2 * length)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        job._build_program()
+
+    instructions = job.cell_seq_dict[job.cells[0]].instruction_list
+    waits = [
+        instruction
+        for instruction in instructions
+        if isinstance(instruction, SeqWaitImm | SeqWaitRegister)
+    ]
+    assert len(waits) == 1
+    assert isinstance(waits[0], SeqWaitImm)
+    assert waits[0].immediate == 10
@@ -0,0 +1,83 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from copy import copy
+
+from qiclib.code.qi_dataflow import (
+    _CFG,
+    CellValues,
+    DataflowVisitor,
+    FlatLatticeValue,
+    _CFGNode,
+    forward_dataflow,
+)
+from qiclib.code.qi_jobs import ForRange, Play, QiCells, QiJob, QiVariable
+from qiclib.code.qi_pulse import QiPulse
+
+
+class _PlayedVisitor(DataflowVisitor):
+    """Marks every cell that played a pulse with `no_const`."""
+
+    def visit_cell_command(self, cell_cmd, input, node):
+        output = copy(input)
+        for cell in cell_cmd._relevant_cells:
+            output.set_cell_value(cell, FlatLatticeValue.no_const())
+        return output
+
+
+def _loop_job():
+    with QiJob() as job:
+        q = QiCells(1)
+        x = QiVariable(int)
+        with ForRange(x, 0, 10):
+            with ForRange(x, 0, 10):
+                Play(q[0], QiPulse(20e-9))
+        Play(q[0], QiPulse(20e-9))
+    return job, q
+
+
+def test_postorder():
+    job, _ = _loop_job()
+    cfg = _CFG(job)
+
+    order = cfg.postorder()
+    position = {node: idx for idx, node in enumerate(order)}
+
+    assert order[-1] is cfg.start
+    assert set(order) == cfg.nodes | {cfg.start, cfg.end}
+
+    # Apart from loop back edges, every edge goes backwards in postorder
+    for node in order:
+        for successor in node.successors:
+            if successor.dest_edge_type != _CFGNode.DestEdgeType.FOR_BODY_RETURN:
+                assert position[node] > position[successor.node]
+
+
+def test_worklist_statistics():
+    job, q = _loop_job()
+    cfg = _CFG(job)
+    changes = []
+
+    statistics = forward_dataflow(
+        cfg,
+        "played",
+        _PlayedVisitor(),
+        CellValues(),
+        trace=lambda node, value: changes.append(node),
+    )
+
+    assert cfg.end.value_map["played"][q[0]] == FlatLatticeValue.no_const()
+    assert statistics.updates == len(changes)
+    assert len(cfg.nodes) <= statistics.iterations <= 3 * len(cfg.nodes)
@@ -13,11 +13,15 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from unittest import mock
+
 import pytest
 
+from qiclib.code.analysis import qi_insert_mem_parameters
 from qiclib.code.analysis.qi_insert_mem_parameters import (
     MANIPULATION_PULSE_FREQUENCY_ADDRESS,
     READOUT_PULSE_FREQUENCY_ADDRESS,
+    RECORDING_OFFSET_ADDRESS,
     replace_variable_assignment_with_store_commands,
 )
 from qiclib.code.qi_command import (
@@ -636,6 +640,39 @@ class TestPlayFrequency:
 
         assert isinstance(job.commands[10], PlayReadoutCommand)
 
+    def test_frequency_and_offset_before_loop(self):
+        with QiJob() as job:
+            cells = QiCells(1)
+
+            a = QiTimeVariable(name="A")
+            b = QiTimeVariable(name="B")
+            f = QiVariable(name="F")
+
+            # MemStoreCommand for Play
+            # MemStoreCommand for Recording
+
+            with ForRange(a, 0, 100e-9):
+                Play(cells[0], QiPulse(20e-9, frequency=f))
+                Recording(cells[0], 12e-9, offset=b)
+
+        with mock.patch.object(
+            qi_insert_mem_parameters, "_CFG", wraps=qi_insert_mem_parameters._CFG
+        ) as cfg:
+            replace_variable_assignment_with_store_commands(job)
+
+        # All memory parameters are analysed on the same CFG
+        cfg.assert_called_once_with(job)
+
+        stores = {
+            cmd.addr: cmd for cmd in job.commands if isinstance(cmd, MemStoreCommand)
+        }
+        assert len(stores) == 2
+        assert stores[MANIPULATION_PULSE_FREQUENCY_ADDRESS].value is f
+        assert stores[RECORDING_OFFSET_ADDRESS].value is b
+
+        assert isinstance(job.commands[-1], ForRangeCommand)
+        assert len(job.commands[-1].body) == 2
+
     def test_variable_manipulation_frequency(self):
         with QiJob() as job:
             cells = QiCells(1)
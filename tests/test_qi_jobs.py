@@ -1262,6 +1262,68 @@ class TestQiRecordingOrder:
         calib_offset._build_program()
         assert calib_offset.cells[0].get_number_of_recordings() == 256
 
+    def test_loops_are_not_iterated(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            a = QiVariable(int)
+            b = QiVariable(int)
+            with ForRange(a, 0, 10**9):
+                with ForRange(b, 0, 10**9):
+                    Play(q[0], QiPulse(20e-9))
+            Recording(q[0], 20e-9, save_to="result")
+
+        order = job._simulate_recordings()[q[0]]
+        assert len(order) == 1
+        assert order[0].result_box.name == "result"
+
+    def test_strided_patterns(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            a = QiVariable(int)
+            b = QiVariable(int)
+            with ForRange(a, 0, 4):
+                Recording(q[0], 20e-9, save_to="result_a")
+                with ForRange(b, 0, 3):
+                    Recording(q[0], 20e-9, save_to="result_b")
+                Recording(q[0], 20e-9)
+
+        job._build_program()
+
+        order = q[0]._result_recording_order
+        assert [p.levels for p in order.patterns] == [((4, 4),), ((4, 4), (1, 3))]
+        assert [x.name for x in order] == (["result_a"] + ["result_b"] * 3) * 4
+
+        indices = {
+            box.name: list(idx) for box, idx in order.indices_per_item(10).items()
+        }
+        assert indices == {"result_a": [0, 4, 8], "result_b": [1, 2, 3, 5, 6, 7, 9]}
+
+    def test_limit_with_repeated_patterns(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            a = QiVariable(int)
+            with ForRange(a, 0, 600):
+                Recording(q[0], 20e-9, save_to="result")
+                Recording(q[0], 20e-9)
+
+        with pytest.raises(RuntimeError, match="More than 1024 recordings"):
+            job._simulate_recordings()
+
+    def test_assigned_loop_bound(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            a = QiVariable(int)
+            b = QiVariable(int)
+            end = QiVariable(int, 0)
+            with ForRange(a, 0, 4):
+                Assign(end, end + 2)
+                with ForRange(b, 0, end):
+                    Recording(q[0], 20e-9, save_to="result")
+
+        job._build_program()
+
+        assert len(q[0]._result_recording_order) == 2 + 4 + 6 + 8
+
 
 def test_calculation_with_sample_value_and_variable():
     with QiJob() as job:
@@ -1356,3 +1418,149 @@ def test_for_within_if():
         "j -0x4",
         "end",
     ]
+
+
+class TestCompileCache:
+    @staticmethod
+    def _job(cache_size=8):
+        with QiJob(compile_cache_size=cache_size) as job:
+            q = QiCells(1)
+            a = QiVariable(int)
+            with ForRange(a, 0, 3):
+                PlayReadout(q[0], QiPulse(length=100e-9, frequency=60e6))
+                Recording(q[0], q[0]["rec_length"], save_to="result")
+                Wait(q[0], q[0]["t1"])
+        return job
+
+    @staticmethod
+    def _sample(t1=1e-6):
+        sample = QiSample(1)
+        sample[0]["rec_length"] = 400e-9
+        sample[0]["t1"] = t1
+        return sample
+
+    def test_identical_build_hits(self):
+        job = self._job()
+        job._build_program(self._sample())
+        seq_dict = job.cell_seq_dict
+        codes = job._get_sequencer_codes()
+
+        job._build_program(self._sample())
+
+        assert job.compile_cache.info() == {
+            "hits": 1,
+            "misses": 1,
+            "patches": 0,
+            "size": 1,
+            "maxsize": 8,
+        }
+        assert job.cell_seq_dict is seq_dict
+        assert job._get_sequencer_codes() is codes
+        assert [x.name for x in job.cells[0]._result_recording_order] == ["result"] * 3
+
+    def test_changed_property_misses(self):
+        job = self._job()
+        job._build_program(self._sample(1e-6))
+        first = job._get_sequencer_codes()
+        job._build_program(self._sample(2e-6))
+
+        assert job.compile_cache.misses == 2
+        assert job._get_sequencer_codes() != first
+
+        job._build_program(self._sample(1e-6))
+        assert job.compile_cache.hits == 1
+        assert job._get_sequencer_codes() == first
+
+    def test_cell_map_part_of_key(self):
+        sample = QiSample(2)
+        for cell in range(2):
+            sample[cell]["rec_length"] = 400e-9
+            sample[cell]["t1"] = 1e-6
+
+        job = self._job()
+        job._build_program(sample, [0])
+        job._build_program(sample, [1])
+
+        assert job.compile_cache.misses == 2
+
+    def test_lru_eviction(self):
+        job = self._job(cache_size=1)
+        job._build_program(self._sample(1e-6))
+        job._build_program(self._sample(2e-6))
+        job._build_program(self._sample(1e-6))
+
+        assert job.compile_cache.info()["size"] == 1
+        assert job.compile_cache.hits == 0
+        assert job.compile_cache.misses == 3
+
+    def test_cache_disabled(self):
+        job = self._job(cache_size=0)
+        job._build_program(self._sample())
+        seq_dict = job.cell_seq_dict
+        job._build_program(self._sample())
+
+        assert len(job.compile_cache) == 0
+        assert job.cell_seq_dict is not seq_dict
+
+    @staticmethod
+    def _rebuilt_codes(job, sample):
+        job.compile_cache.clear()
+        job._compiled = None
+        job._build_program(sample)
+        return job._get_sequencer_codes()
+
+    def test_patch_property_immediates(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            PlayReadout(q[0], QiPulse(length=100e-9, frequency=q[0]["f1"]))
+            Wait(q[0], q[0]["t"])
+            PlayReadout(q[0], QiPulse(length=100e-9, frequency=q[0]["f2"]))
+            Wait(q[0], q[0]["t"])
+
+        def sample(f2, t):
+            sample = QiSample(1)
+            sample[0].update(f1=60e6, f2=f2, t=t)
+            return sample
+
+        job._build_program(sample(70e6, 1e-6))
+        job._get_sequencer_codes()
+        job._build_program(sample(80e6, 2e-6))
+
+        assert job.compile_cache.patches == 1
+        assert job._get_sequencer_codes() == self._rebuilt_codes(
+            job, sample(80e6, 2e-6)
+        )
+
+        # Changes of the instruction layout fall back to a rebuild
+        for f2, t in [(-30e6, 2e-6), (80e6, 1e-9), (80e6, 10.0)]:
+            job._build_program(sample(f2, t))
+            assert job._get_sequencer_codes() == self._rebuilt_codes(job, sample(f2, t))
+
+    def test_patch_not_possible_after_sync(self):
+        with QiJob() as job:
+            q = QiCells(2)
+            Wait(q[0], q[0]["t"])
+            Sync(q[0], q[1])
+            Play(q[1], QiPulse(length=100e-9, frequency=60e6))
+
+        sample = QiSample(2)
+        sample[0]["t"] = 1e-6
+        job._build_program(sample)
+        sample[0]["t"] = 2e-6
+        job._build_program(sample)
+
+        assert job.compile_cache.patches == 0
+        assert job.compile_cache.misses == 2
+
+    def test_patch_not_possible_for_pulse_length(self):
+        with QiJob() as job:
+            q = QiCells(1)
+            Play(q[0], QiPulse(length=q[0]["pi"], frequency=60e6))
+
+        sample = QiSample(1)
+        sample[0]["pi"] = 20e-9
+        job._build_program(sample)
+        sample[0]["pi"] = 40e-9
+        job._build_program(sample)
+
+        assert job.compile_cache.patches == 0
@@ -0,0 +1,143 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from qiclib.code.qi_jobs import Play, QiCells, QiJob, Wait
+from qiclib.code.qi_peephole import optimize_instructions
+from qiclib.code.qi_pulse import QiPulse
+from qiclib.code.qi_seq_instructions import (
+    SeqBranch,
+    SeqEnd,
+    SeqLoad,
+    SeqRegImmediateInst,
+    SeqRegRegInst,
+    SeqWaitImm,
+)
+from qiclib.code.qi_sequencer import Sequencer
+from qiclib.code.qi_var_definitions import QiOp, QiOpCond
+
+
+def _cycles(instructions):
+    """Length of a program without branches."""
+    return sum(
+        instruction.immediate
+        if isinstance(instruction, SeqWaitImm)
+        else Sequencer.LOAD_STORE_LENGTH
+        if isinstance(instruction, SeqLoad)
+        else 1
+        for instruction in instructions
+    )
+
+
+def test_merge_waits_and_fix_branch():
+    instructions = [
+        SeqWaitImm(5),
+        SeqWaitImm(7),
+        SeqBranch(QiOpCond.EQ, 1, 0, 3),
+        SeqWaitImm(2),
+        SeqWaitImm(3),
+        SeqWaitImm(4),  # branch target, must not be merged with the previous waits
+        SeqEnd(),
+    ]
+
+    optimized, index_map, statistics = optimize_instructions(instructions)
+
+    assert optimized == [
+        SeqWaitImm(12),
+        SeqBranch(QiOpCond.EQ, 1, 0, 2),
+        SeqWaitImm(5),
+        SeqWaitImm(4),
+        SeqEnd(),
+    ]
+    assert index_map == [0, 0, 1, 2, 2, 3, 4, 5]
+    assert statistics.merged_waits == 2
+    # The original instructions are not changed
+    assert instructions[2].immediate == 3
+
+
+def test_fixed_instructions_are_kept():
+    instructions = [SeqWaitImm(5), SeqWaitImm(7), SeqEnd()]
+
+    optimized, _, statistics = optimize_instructions(instructions, fixed={1})
+
+    assert optimized == instructions
+    assert statistics.removed_instructions == 0
+
+
+def test_remove_redundant_immediate_and_load():
+    address = Sequencer()._encode_immediate(Sequencer.MEMORY_ADDRESS, 4)
+    instructions = [
+        *address,
+        SeqLoad(6, 4),
+        SeqWaitImm(20),
+        *address,
+        SeqLoad(7, 4),
+        SeqWaitImm(20),
+        SeqEnd(),
+    ]
+
+    optimized, _, statistics = optimize_instructions(instructions, live_at_end=[6, 7])
+
+    assert optimized == [
+        *address,
+        SeqLoad(6, 4),
+        SeqRegImmediateInst(QiOp.PLUS, 7, 6, 0),
+        SeqWaitImm(49),
+        SeqEnd(),
+    ]
+    assert _cycles(optimized) == _cycles(instructions)
+    assert statistics.removed_immediates == 2
+    assert statistics.removed_loads == 1
+    assert statistics.merged_waits == 1
+
+
+def test_remove_dead_instructions_in_loop():
+    instructions = [
+        SeqRegRegInst(QiOp.PLUS, 5, 1, 2),
+        SeqRegImmediateInst(QiOp.PLUS, 3, 5, 0),  # move of the temporary result
+        SeqWaitImm(4),
+        SeqRegImmediateInst(QiOp.PLUS, 8, 0, 7),  # never read
+        SeqBranch(QiOpCond.NE, 3, 0, -4),
+        SeqEnd(),
+    ]
+
+    optimized, _, statistics = optimize_instructions(instructions, live_at_end=[3])
+
+    assert optimized == [
+        SeqRegRegInst(QiOp.PLUS, 3, 1, 2),
+        SeqWaitImm(6),
+        SeqBranch(QiOpCond.NE, 3, 0, -2),
+        SeqEnd(),
+    ]
+    assert statistics.removed_moves == 1
+    assert statistics.removed_dead_instructions == 1
+
+
+def test_job_timing_is_kept():
+    def build(optimize_program):
+        with QiJob(skip_nco_sync=True, optimize_program=optimize_program) as job:
+            q = QiCells(1)
+            Play(q[0], QiPulse(length=100e-9))
+            Wait(q[0], 40e-9)
+            Play(q[0], QiPulse(length=100e-9))
+        job._build_program()
+        return job.cell_seq_dict[job.cells[0]]
+
+    plain = build(False)
+    optimized = build(True)
+
+    assert plain.peephole_statistics is None
+    assert optimized.peephole_statistics.merged_waits >= 1
+    assert len(optimized.instruction_list) < len(plain.instruction_list)
+    assert _cycles(optimized.instruction_list) == _cycles(plain.instruction_list)
@@ -13,11 +13,20 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import random
+
 import pytest
 
 import qiclib.code.qi_visitor as qv
 import qiclib.packages.utility as util
-from qiclib.code.qi_command import ForRangeCommand, IfCommand, WaitCommand
+from qiclib.code.qi_command import (
+    ForRangeCommand,
+    IfCommand,
+    ParallelCommand,
+    PlayCommand,
+    PlayReadoutCommand,
+    WaitCommand,
+)
 from qiclib.code.qi_jobs import (
     ASM,
     Assign,
@@ -2639,3 +2648,94 @@ class TestRecordingOffset:
         assert isinstance(instructions[4], SeqStore)
         assert instructions[4].src_reg == instructions[1].dst_reg
         assert isinstance(instructions[5], SeqTrigger)
+
+
+def _reference_time_slots(parallel: ParallelCommand, annotated_bodies, max_end):
+    """Former implementation of `ParallelCommand._create_time_slots`, iterating over every cycle."""
+    time_slots = []
+    for start in range(max_end):
+        time_slot = ParallelCommand.TimeSlot([], start, start)
+        for cmd_list in annotated_bodies:
+            for cmd_tuple in cmd_list:
+                if cmd_tuple.start == start:
+                    time_slot.cmd_tuples.append(cmd_tuple)
+                    time_slot.end = max(cmd_tuple.end, time_slot.end)
+                    cmd_list.remove(cmd_tuple)
+                    break
+        if len(time_slot.cmd_tuples) == 0:
+            continue
+        time_slot.cmd_tuples = parallel._clear_wait_commands(time_slot.cmd_tuples)
+        time_slot.cmd_tuples = parallel._clear_choke_commands(time_slot.cmd_tuples)
+        if time_slots and time_slots[-1].end < start:
+            prev_end = time_slots[-1].end
+            wait = ParallelCommand.CmdTuple(
+                WaitCommand(next(iter(parallel._relevant_cells)), 0), prev_end, start
+            )
+            time_slots.append(ParallelCommand.TimeSlot([wait], prev_end, start))
+        if time_slots:
+            time_slots[-1].end = min(time_slots[-1].end, start)
+        time_slots.append(time_slot)
+    if time_slots and time_slots[-1].end < max_end:
+        prev_end = time_slots[-1].end
+        wait = ParallelCommand.CmdTuple(
+            WaitCommand(next(iter(parallel._relevant_cells)), 0), prev_end, max_end
+        )
+        time_slots.append(ParallelCommand.TimeSlot([wait], prev_end, max_end))
+    for slot in time_slots:
+        slot.duration = util.conv_cycles_to_time(slot.end - slot.start)
+    return time_slots
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parallel_time_slots_match_cycle_iteration(seed):
+    rng = random.Random(seed)
+    with QiJob():
+        cell = QiCells(1)[0]
+        commands = [
+            PlayCommand(cell, QiPulse(length=8e-9)),
+            PlayCommand(cell, QiPulse(length=12e-9)),
+            PlayReadoutCommand(cell, QiPulse(length=8e-9)),
+            WaitCommand(cell, 8e-9),
+        ]
+
+    parallel = ParallelCommand()
+    parallel._relevant_cells.add(cell)
+
+    bodies = []
+    for _ in range(rng.randint(1, 4)):
+        body = []
+        end = rng.choice([0, rng.randint(1, 30)])
+        for _ in range(rng.randint(0, 8)):
+            start, end = end, end + rng.randint(1, 40)
+            cmd = rng.choice(commands)
+            body.append(ParallelCommand.CmdTuple(cmd, start, end))
+            if rng.random() < 0.2 and not isinstance(cmd, WaitCommand):
+                bodies.append([ParallelCommand.CmdTuple(cmd, end, end + 1, True)])
+        bodies.append(body)
+    max_end = max((t.end for body in bodies for t in body), default=0)
+
+    def normalize(time_slots):
+        return [
+            (
+                slot.start,
+                slot.end,
+                slot.duration,
+                [
+                    (
+                        id(t.cmd) if t.cmd in commands else "wait",
+                        t.start,
+                        t.end,
+                        t.choke_cmd,
+                    )
+                    for t in slot.cmd_tuples
+                ],
+            )
+            for slot in time_slots
+        ]
+
+    expected = _reference_time_slots(parallel, [list(body) for body in bodies], max_end)
+    actual = parallel._create_time_slots(bodies, max_end)
+    assert normalize(actual) == normalize(expected)
+    for slot in actual:
+        if slot.cmd_tuples[0].cmd not in commands:
+            assert slot.cmd_tuples[0].cmd.length == slot.duration
@@ -13,6 +13,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
 import pytest
 
 import qiclib.packages.utility as util
@@ -25,7 +26,7 @@ from qiclib.code.qi_jobs import (
     QiStateVariable,
     QiVariable,
 )
-from qiclib.code.qi_pulse import QiPulse, ShapeLib
+from qiclib.code.qi_pulse import QiPulse, Shape, ShapeLib, _Envelope, _EnvelopeCache
 from qiclib.code.qi_var_definitions import _QiVariableBase
 from qiclib.packages.constants import CONTROLLER_SAMPLE_FREQUENCY_IN_HZ as samplerate
 
@@ -175,3 +176,103 @@ def test_two_pulses_with_parameterized_length_and_same_constant_are_same():
         Play(q[0], QiPulse(frequency=100e6, length=100e-6))
 
     assert len(job.cells[0].manipulation_pulses) == 1
+
+
+class TestEnvelopeCache:
+    @pytest.fixture(autouse=True)
+    def cache(self):
+        QiPulse.envelope_cache.clear()
+        yield QiPulse.envelope_cache
+        QiPulse.envelope_cache.clear()
+
+    def test_identical_pulses_share_envelope(self, cache):
+        first = QiPulse(length=42e-9, shape=ShapeLib.gauss, amplitude=0.5)
+        second = QiPulse(length=42e-9, shape=ShapeLib.gauss, amplitude=0.5)
+
+        envelope = first(samplerate)
+
+        assert second(samplerate) is envelope
+        assert not envelope.flags.writeable
+        assert cache.info() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 256}
+
+    def test_different_parameters_miss(self, cache):
+        QiPulse(length=42e-9, amplitude=0.5)(samplerate)
+        QiPulse(length=42e-9, amplitude=0.4)(samplerate)
+        QiPulse(length=42e-9, amplitude=0.5, hold=True)(samplerate)
+        QiPulse(length=42e-9, shape=ShapeLib.gauss, amplitude=0.5)(samplerate)
+
+        assert cache.info()["misses"] == 4
+
+    def test_padded_iq_envelope(self):
+        held = QiPulse(length=42e-9, amplitude=0.5, hold=True)
+        pulseform_i, pulseform_q = held._iq_envelope(samplerate)
+
+        assert len(pulseform_i) % 4 == 0
+        assert len(pulseform_i) > len(held(samplerate))
+        assert np.all(pulseform_i == 0.5)
+        assert len(pulseform_q) == 0
+
+        not_held = QiPulse(length=42e-9, amplitude=0.5)
+        assert not_held._padded_envelope(samplerate)[-1] == 0
+
+    def test_lru_eviction(self):
+        cache = _EnvelopeCache(maxsize=2)
+        for value in range(3):
+            cache.get_or_create(value, lambda: _Envelope(np.zeros(4), False))
+
+        assert cache.get_or_create(1, lambda: None) is not None
+        assert cache.info() == {"hits": 1, "misses": 3, "size": 2, "maxsize": 2}
+
+
+class TestShape:
+    @pytest.mark.parametrize(
+        "name",
+        [
+            "zero",
+            "rect",
+            "gauss",
+            "ramp",
+            "sqrfct",
+            "l_sphere",
+            "r_sphere",
+            "gauss_up",
+            "gauss_down",
+        ],
+    )
+    def test_builtin_shapes_match_per_sample_evaluation(self, name):
+        shape = getattr(ShapeLib, name)
+        x = np.arange(0, 1, 1 / 97)
+
+        assert shape.vectorized
+        np.testing.assert_allclose(shape(x), [float(shape.pyfunc(t)) for t in x])
+
+    def test_rect_outside_interval(self):
+        assert list(ShapeLib.rect(np.array([-0.5, 0, 0.5, 1, 1.5]))) == [0, 1, 1, 0, 0]
+
+    def test_legacy_shape_is_evaluated_per_sample(self):
+        # Only works for scalars
+        step = Shape("step", lambda x: 1.0 if x < 0.5 else 0.5)
+        x = np.array([0, 0.25, 0.5, 0.75])
+
+        assert not step.vectorized
+        assert list(step(x)) == [1, 1, 0.5, 0.5]
+
+        product = step * ShapeLib.rect
+        assert not product.vectorized
+        assert list(product(x)) == [1, 1, 0.5, 0.5]
+
+    def test_vectorized_user_shape(self, job):
+        calls = []
+
+        def triangle(x):
+            calls.append(x)
+            return 1 - np.abs(2 * x - 1)
+
+        shape = Shape("triangle", triangle, vectorized=True) * ShapeLib.rect
+        pulse = QiPulse(length=8e-9, shape=shape)
+
+        np.testing.assert_allclose(pulse(1e9), [0, 0.25, 0.5, 0.75, 1, 0.75, 0.5, 0.25])
+        assert len(calls) == 1
+
+    def test_vectorized_constant_shape(self):
+        assert ShapeLib.zero(np.zeros(5)).shape == (5,)
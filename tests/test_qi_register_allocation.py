@@ -0,0 +1,152 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import pytest
+
+from qiclib.code.analysis.qi_register_allocation import (
+    TEMPORARY_REGISTERS,
+    allocate_registers,
+)
+from qiclib.code.qi_jobs import (
+    Assign,
+    Else,
+    ForRange,
+    If,
+    QiCells,
+    QiJob,
+    QiVariable,
+    Wait,
+)
+from qiclib.code.qi_seq_instructions import SeqLoad, SeqStore
+from qiclib.code.qi_sequencer import Sequencer
+
+
+def _build(job):
+    job._build_program()
+    return job.cell_seq_dict[job.cells[0]]
+
+
+def test_few_variables_are_not_allocated():
+    with QiJob() as job:
+        q = QiCells(1)
+        x = QiVariable(int, 5)
+        with If(x == 5):
+            Wait(q[0], 12e-9)
+
+    _build(job)
+
+    assert allocate_registers(job.commands, job.cells) == {}
+
+
+def test_sequential_variables_share_registers():
+    with QiJob() as job:
+        q = QiCells(1)
+        for i in range(2 * Sequencer.AVAILABLE_REGISTERS):
+            x = QiVariable(int, i)
+            with If(x == 1):
+                Wait(q[0], 12e-9)
+
+    sequencer = _build(job)
+
+    allocation = allocate_registers(job.commands, job.cells)[job.cells[0]]
+    assert allocation.spilled == []
+    assert not any(
+        isinstance(instruction, SeqLoad | SeqStore)
+        for instruction in sequencer.instruction_list
+    )
+
+
+def test_cold_variables_are_spilled():
+    with QiJob() as job:
+        q = QiCells(1)
+        cold = [QiVariable(int, i) for i in range(Sequencer.AVAILABLE_REGISTERS)]
+        hot = QiVariable(int, 0)
+        i = QiVariable(int)
+        with ForRange(i, 0, 10):
+            Assign(hot, hot + i)
+            with If(hot == 0):
+                Wait(q[0], 12e-9)
+        for x in cold:
+            with If(x == hot):
+                Wait(q[0], 12e-9)
+
+    sequencer = _build(job)
+
+    allocation = allocate_registers(job.commands, job.cells)[job.cells[0]]
+    spilled = {var.id for var in allocation.spilled}
+    assert hot.id not in spilled
+    assert i.id not in spilled
+    # All variables are live within the loop, only the registers not kept for temporary values are used
+    assert allocation.reserved >= TEMPORARY_REGISTERS
+    assert len(spilled) == len(allocation.intervals) - (
+        Sequencer.AVAILABLE_REGISTERS - allocation.reserved
+    )
+    assert spilled <= {x.id for x in cold}
+    assert any(
+        isinstance(instruction, SeqLoad) for instruction in sequencer.instruction_list
+    )
+
+
+@pytest.mark.parametrize(
+    "count", [Sequencer.AVAILABLE_REGISTERS - 1, Sequencer.AVAILABLE_REGISTERS]
+)
+def test_variables_without_registers_for_temporaries_are_allocated(count):
+    with QiJob() as job:
+        q = QiCells(1)
+        variables = [QiVariable(int, i) for i in range(count)]
+        for x in variables:
+            with If(x == 1):
+                Wait(q[0], 12e-9)
+        with If(variables[0] * variables[1] + variables[2] == 5):
+            Wait(q[0], 12e-9)
+
+    _build(job)
+
+    assert job.cells[0] in allocate_registers(job.commands, job.cells)
+
+
+def test_spilled_assign_in_nested_ifs():
+    with QiJob() as job:
+        q = QiCells(1)
+        a, b, c, d, e = (QiVariable(int, i) for i in range(5))
+        hot = [QiVariable(int, i) for i in range(25)]
+        # The values are not known at compile time, so the conditions are not folded
+        with If(hot[0] == 1):
+            for x in (a, b, c, d, e):
+                Assign(x, x + 1)
+        i = QiVariable(int)
+        with ForRange(i, 0, 10):
+            for x in hot:
+                with If(x == 1):
+                    Wait(q[0], 12e-9)
+        with If(a + b == c * d):
+            with If(b - c == d + e):
+                Assign(a, b * c + d - e)
+                Wait(q[0], 12e-9)
+            with Else():
+                Assign(e, a * b - c + d)
+                Wait(q[0], 12e-9)
+        for x in hot:
+            with If(x == 2):
+                Wait(q[0], 12e-9)
+
+    sequencer = _build(job)
+
+    allocation = allocate_registers(job.commands, job.cells)[job.cells[0]]
+    spilled = {var.id for var in allocation.spilled}
+    assert {var.id for var in (a, b, c, d, e)} <= spilled
+    assert any(
+        isinstance(instruction, SeqStore) for instruction in sequencer.instruction_list
+    )
@@ -641,6 +641,40 @@ class TestQiCalcToSeq:
         assert len(test_sequencer.instruction_list) == 3
         assert dst_reg not in test_sequencer._register_stack
 
+    def test_qi_calc_subtract_lower_immediate(self, test_sequencer):
+        x = QiVariable(int)
+        test_sequencer.add_variable(x)
+        reg = test_sequencer.get_var_register(x)
+        reg.value = 0
+
+        dst_reg = test_sequencer.add_qi_calc(x - 5)
+
+        assert len(test_sequencer.instruction_list) == 1
+        instr = test_sequencer.instruction_list[0]
+        assert isinstance(instr, SeqRegImmediateInst)
+        assert instr.immediate == -5
+        assert instr.register == reg.adr
+        assert instr.dst_reg == dst_reg.adr
+
+    def test_qi_calc_multiply_registers(self, test_sequencer):
+        x = QiVariable(int)
+        y = QiVariable(int)
+        test_sequencer.add_variable(x)
+        test_sequencer.add_variable(y)
+        reg_x = test_sequencer.get_var_register(x)
+        reg_x.value = 0
+        reg_y = test_sequencer.get_var_register(y)
+        reg_y.value = 0
+
+        dst_reg = test_sequencer.add_qi_calc(x * y)
+
+        assert len(test_sequencer.instruction_list) == 1
+        instr = test_sequencer.instruction_list[0]
+        assert isinstance(instr, SeqRegRegInst)
+        assert instr.funct7 == SeqRegRegFunct7.MUL
+        assert instr.dst_reg == dst_reg.adr
+        assert dst_reg not in (reg_x, reg_y)
+
     def test_qi_calc_time_variables(self, test_sequencer, qi_time_variables):
         x, y = qi_time_variables
 
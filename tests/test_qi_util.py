@@ -13,6 +13,9 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+
 import qiclib.packages.utility as util
 from qiclib.code.qi_jobs import (
     ForRange,
@@ -53,3 +56,63 @@ def test_iterations():
         iterations = _get_for_range_iterations(fr_cm.start, fr_cm.end, fr_cm.step)
 
         assert iterations == 6
+
+
+def _reference_states(values, dense=False):
+    if dense:
+        return [(value >> i) & 0x1 for value in values for i in range(32)]
+    return [(value >> (3 * i)) & 0x7 for value in values for i in range(10)]
+
+
+def test_unpack_states():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 2**32, size=50, dtype=np.uint32)
+
+    for dense in (False, True):
+        states = util.unpack_states(values, dense)
+        assert states.dtype == np.uint8
+        np.testing.assert_array_equal(states, _reference_states(values, dense))
+
+    np.testing.assert_array_equal(
+        util.unpack_states(values, count=493), _reference_states(values)[:493]
+    )
+
+
+def test_count_states():
+    rng = np.random.default_rng(1)
+    values = rng.integers(0, 2**32, size=50, dtype=np.uint32)
+
+    for dense, count in [(False, None), (False, 493), (True, 1000), (True, 0)]:
+        reference = _reference_states(values, dense)[:count]
+        np.testing.assert_array_equal(
+            util.count_states(values, dense, count),
+            np.bincount(reference, minlength=2 if dense else 8),
+        )
+
+
+def test_wait_until_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(util.time, "sleep", delays.append)
+    polls = iter([False] * 8 + [True])
+    progress = []
+
+    util.wait_until(
+        lambda: next(polls),
+        on_poll=lambda: progress.append(len(progress)),
+        initial_delay=0.01,
+        max_delay=0.1,
+    )
+
+    assert delays == pytest.approx([0.01, 0.02, 0.04, 0.08, 0.1, 0.1, 0.1, 0.1])
+    assert len(progress) == 8
+
+
+def test_wait_until_returns_without_sleeping(monkeypatch):
+    monkeypatch.setattr(util.time, "sleep", pytest.fail)
+
+    util.wait_until(lambda: True, timeout=0)
+
+
+def test_wait_until_timeout():
+    with pytest.raises(TimeoutError):
+        util.wait_until(lambda: False, timeout=0.05, max_delay=0.01)
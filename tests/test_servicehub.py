@@ -0,0 +1,154 @@
+# Copyright © 2017-2023 Quantum Interface (quantuminterface@ipe.kit.edu)
+# Richard Gebauer, IPE, Karlsruhe Institute of Technology
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from types import SimpleNamespace
+from unittest import mock
+
+import grpc
+import pytest
+
+from qiclib.packages import servicehub
+from qiclib.packages.servicehub import ServiceHubCall, retry_metrics
+
+
+class _RpcError(grpc.RpcError):
+    def __init__(self, code=grpc.StatusCode.UNAVAILABLE):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return "Mock error"
+
+
+class _Component:
+    def __init__(self, failures=0, code=grpc.StatusCode.UNAVAILABLE):
+        self._conn = SimpleNamespace(is_open=True)
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+        self.timeouts = []
+
+    def _rpc(self):
+        self.calls += 1
+        self.timeouts.append(servicehub._remaining_timeout(None))
+        if self.calls <= self.failures:
+            raise _RpcError(self.code)
+        return self.calls
+
+    @ServiceHubCall(errormsg="Idempotent call failed")
+    def idempotent(self):
+        return self._rpc()
+
+    @ServiceHubCall(idempotent=False)
+    def not_idempotent(self):
+        return self._rpc()
+
+    @ServiceHubCall(timeout=1.0)
+    def bounded(self):
+        return self._rpc()
+
+    @ServiceHubCall(timeout=10.0)
+    def nested(self):
+        return self.bounded()
+
+
+@pytest.fixture(autouse=True)
+def _sleep():
+    retry_metrics.reset()
+    with mock.patch.object(servicehub.time, "sleep") as sleep:
+        yield sleep
+
+
+def test_retries_with_exponential_backoff(_sleep):
+    component = _Component(failures=3)
+    assert component.idempotent() == 4
+    delays = [call.args[0] for call in _sleep.call_args_list]
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0 <= delay <= servicehub._INITIAL_BACKOFF * 2**attempt
+
+    statistics = retry_metrics.snapshot()["_Component.idempotent"]
+    assert (statistics.calls, statistics.retries, statistics.failures) == (1, 3, 0)
+    assert statistics.last_error == grpc.StatusCode.UNAVAILABLE
+
+
+def test_raises_after_all_tries():
+    component = _Component(failures=10)
+    with pytest.raises(RuntimeError, match="Idempotent call failed"):
+        component.idempotent()
+    assert component.calls == 5
+    assert retry_metrics.snapshot()["_Component.idempotent"].failures == 1
+
+
+def test_does_not_retry_non_idempotent_calls(_sleep):
+    component = _Component(failures=1)
+    with pytest.raises(RuntimeError):
+        component.not_idempotent()
+    assert component.calls == 1
+    _sleep.assert_not_called()
+
+
+def test_does_not_retry_invalid_arguments():
+    component = _Component(failures=1, code=grpc.StatusCode.INVALID_ARGUMENT)
+    with pytest.raises(ValueError, match="Mock error"):
+        component.idempotent()
+    assert component.calls == 1
+
+
+def test_deadline_is_passed_to_rpcs():
+    component = _Component()
+    component.idempotent()
+    component.bounded()
+    component.nested()
+    unbounded, bounded, nested = component.timeouts
+    assert unbounded is None
+    assert 0 < bounded <= 1.0
+    assert 0 < nested <= 1.0
+    assert servicehub._remaining_timeout(None) is None
+
+
+def test_does_not_retry_beyond_deadline():
+    component = _Component(failures=10)
+    with (
+        mock.patch.object(servicehub, "_INITIAL_BACKOFF", 10.0),
+        mock.patch.object(
+            servicehub.random, "uniform", side_effect=lambda _, high: high
+        ),
+    ):
+        with pytest.raises(RuntimeError):
+            component.bounded()
+    assert component.calls == 1
+
+
+def test_interceptor_sets_timeout():
+    details = servicehub._ClientCallDetails(
+        "/Service/Method", None, None, None, None, None
+    )
+    continuation = mock.Mock()
+    interceptor = servicehub._DeadlineInterceptor()
+
+    interceptor.intercept_unary_unary(continuation, details, "request")
+    assert continuation.call_args.args[0] is details
+
+    token = servicehub._deadline.set(servicehub.time.monotonic() + 5)
+    try:
+        interceptor.intercept_unary_stream(continuation, details, "request")
+    finally:
+        servicehub._deadline.reset(token)
+    passed = continuation.call_args.args[0]
+    assert passed.method == "/Service/Method"
+    assert 0 < passed.timeout <= 5